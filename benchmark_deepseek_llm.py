@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+DeepSeek LLM Benchmark - 客户端单次调用开销基准
+
+针对本地桩服务测量，排除模型生成时间，只比较客户端侧的开销:
+    python benchmark_deepseek_llm.py            运行全部对比
+    python benchmark_deepseek_llm.py --calls 500
+"""
+
+import json
+import time
+import argparse
+import statistics
+from typing import Callable, Dict, List
+
+import requests
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from deepseek_llm import DeepSeekLLM, serialize_messages
+from deepseek_stub_server import DeepSeekStubServer
+
+MESSAGES = [
+    SystemMessage(content="You are a certified health and wellness coach. " * 40),
+    HumanMessage(content="我想减肥，有什么建议吗？"),
+    AIMessage(content="建议控制热量摄入并保持规律运动。"),
+    HumanMessage(content="每周运动几次比较合适？"),
+]
+
+
+def _measure(fn: Callable[[], object], calls: int) -> Dict[str, float]:
+    """逐次计时，返回单次调用的延迟统计（微秒）"""
+    fn()  # 预热
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def _legacy_serialize(messages) -> List[Dict[str, str]]:
+    """原实现：每个方法内各自的 isinstance 分支循环"""
+    deepseek_messages = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            deepseek_messages.append({"role": "user", "content": message.content})
+        elif isinstance(message, AIMessage):
+            deepseek_messages.append({"role": "assistant", "content": message.content})
+        elif isinstance(message, SystemMessage):
+            deepseek_messages.append({"role": "system", "content": message.content})
+    return deepseek_messages
+
+
+def _legacy_invoke(llm: DeepSeekLLM, messages) -> AIMessage:
+    """原实现：模块级 requests.post，每次调用新建连接并重建请求头"""
+    headers = {
+        "Authorization": f"Bearer {llm.api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": llm.model,
+        "messages": _legacy_serialize(messages),
+        "temperature": llm.temperature,
+        "max_tokens": llm.max_tokens
+    }
+    response = requests.post(f"{llm.base_url}/chat/completions", headers=headers, json=data, timeout=30)
+    response.raise_for_status()
+    return AIMessage(content=response.json()["choices"][0]["message"]["content"])
+
+
+def bench_serialize(calls: int = 20000) -> Dict[str, Dict[str, float]]:
+    """对比原有消息转换循环与共享的 serialize_messages"""
+    assert _legacy_serialize(MESSAGES) == serialize_messages(MESSAGES)
+    results = {
+        "legacy": _measure(lambda: _legacy_serialize(MESSAGES), calls),
+        "shared": _measure(lambda: serialize_messages(MESSAGES), calls),
+    }
+    print("🧪 消息转换：isinstance 分支 vs 类型查表")
+    print("=" * 50)
+    for name, stats in results.items():
+        print(f"   {name:<8} mean={stats['mean_us']:7.2f}µs  p50={stats['p50_us']:7.2f}µs")
+    return results
+
+
+def bench_invoke(calls: int = 200) -> Dict[str, Dict[str, float]]:
+    """对比每次新建连接的 requests.post 与实例级 keep-alive 会话"""
+    results = {}
+    print("\n🧪 同步调用开销：requests.post vs keep-alive 会话（本地桩服务）")
+    print("=" * 50)
+    for name in ("legacy", "session"):
+        with DeepSeekStubServer() as server:
+            llm = DeepSeekLLM(api_key="bench-key", base_url=server.base_url)
+            if name == "legacy":
+                fn = lambda: _legacy_invoke(llm, MESSAGES)
+            else:
+                fn = lambda: llm.invoke(MESSAGES)
+            stats = _measure(fn, calls)
+            llm.close()
+        stats["connections"] = server.connection_count
+        results[name] = stats
+        print(f"   {name:<8} mean={stats['mean_us']:8.1f}µs  p50={stats['p50_us']:8.1f}µs  "
+              f"p99={stats['p99_us']:8.1f}µs  连接数={server.connection_count}")
+    saved = results["legacy"]["mean_us"] - results["session"]["mean_us"]
+    print(f"   🚀 每次调用节省 {saved:.1f}µs（{results['legacy']['mean_us'] / results['session']['mean_us']:.1f}x）")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DeepSeek 客户端开销基准")
+    parser.add_argument("--calls", type=int, default=200, help="每种方式的调用次数")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    results = {"serialize": bench_serialize(), "invoke": bench_invoke(args.calls)}
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
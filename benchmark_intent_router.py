@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Intent Router Benchmark - 意图路由器性能与准确率基准
+
+用法:
+    python benchmark_intent_router.py                   运行基准套件并打印报告
+    python benchmark_intent_router.py --save-baseline   运行并保存为基线
+    python benchmark_intent_router.py --check           与基线对比，出现回归时以非0状态退出
+    python benchmark_intent_router.py --comparisons     运行各项优化前后的对比实验
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from intent_router import (
+    CascadeConfig,
+    IntentRouter,
+    IntentRouterRegistry,
+    InvertedBM25Index,
+    MultiPatternMatcher,
+    RouteCache,
+    TOKENIZERS,
+    create_tokenizer,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LABELED_QUERIES_PATH = os.path.join(BASE_DIR, "intent_queries.json")
+BASELINE_PATH = os.path.join(BASE_DIR, "intent_router_baseline.json")
+
+# 基准套件的规模维度
+SUITE_INTENT_COUNTS = (4, 40, 400)
+SUITE_KEYWORDS_PER_INTENT = 9
+SUITE_INPUT_LENGTHS = (16, 64, 256)
+
+SAMPLE_QUERIES = [
+    "我想减肥，有什么建议吗？",
+    "我需要运动指导，包括适合我的运动类型",
+    "我最近感觉很焦虑，睡眠质量不好",
+    "我想了解如何改善整体健康状况",
+    "帮我制定一个健康的饮食计划",
+    "我想练习瑜伽来放松身心",
+]
+
+
+def _measure(fn: Callable[[str], object], queries: List[str], rounds: int) -> Dict[str, float]:
+    """逐次计时，返回单次调用的延迟统计（微秒）"""
+    samples = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            fn(query)
+            samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def bench_per_request_vs_shared(rounds: int = 50) -> Dict[str, Dict[str, float]]:
+    """对比旧的每请求构建 IntentRouter 与进程级共享路由器"""
+    registry = IntentRouterRegistry()
+    registry.warm_up()  # 排除jieba词典一次性加载的影响
+    shared = registry.get()
+
+    results = {
+        "per_request": _measure(lambda q: IntentRouter().route_intent(q), SAMPLE_QUERIES, rounds),
+        "shared": _measure(shared.route_intent, SAMPLE_QUERIES, rounds),
+    }
+
+    print("🧪 意图路由开销：每请求重建 vs 共享路由器")
+    print("=" * 50)
+    for name, stats in results.items():
+        print(f"   {name:<12} mean={stats['mean_us']:9.1f}µs  "
+              f"p50={stats['p50_us']:9.1f}µs  p99={stats['p99_us']:9.1f}µs")
+    speedup = results["per_request"]["mean_us"] / results["shared"]["mean_us"]
+    print(f"   🚀 加速比: {speedup:.1f}x")
+    return results
+
+
+def _synthetic_catalog(num_intents: int, keywords_per_intent: int, seed: int = 0) -> Dict[str, Dict[str, List[str]]]:
+    """生成合成意图目录：每个意图若干随机中文关键词，每3个关键词组成一个正则选择式"""
+    rng = random.Random(seed)
+    chars = [chr(code) for code in range(0x4E00, 0x4E00 + 3000)]
+    catalog = {}
+    for i in range(num_intents):
+        keywords = ["".join(rng.choice(chars) for _ in range(rng.randint(2, 4)))
+                    for _ in range(keywords_per_intent)]
+        regex_patterns = ["|".join(keywords[j:j + 3]) for j in range(0, len(keywords), 3)]
+        catalog[f"intent_{i}"] = {"keywords": keywords, "regex_patterns": regex_patterns}
+    return catalog
+
+
+def _legacy_scores(intent_patterns: Dict[str, Dict[str, List[str]]], text: str):
+    """原实现：逐个关键词 in + 逐个模板 re.findall"""
+    text_lower = text.lower()
+    keyword_scores = {}
+    regex_scores = {}
+    for intent, patterns in intent_patterns.items():
+        keyword_scores[intent] = float(sum(1 for kw in patterns["keywords"] if kw in text_lower))
+        regex_scores[intent] = float(sum(
+            len(re.findall(pattern, text, re.IGNORECASE)) for pattern in patterns["regex_patterns"]
+        ))
+    return keyword_scores, regex_scores
+
+
+def bench_matcher_scaling(rounds: int = 3) -> Dict[int, Dict[str, float]]:
+    """对比原有逐个匹配与单次扫描匹配器在不同关键词规模下的开销"""
+    results = {}
+    print("\n🧪 关键词/正则匹配：逐个匹配 vs 单次扫描自动机")
+    print("=" * 50)
+    for total_keywords in (36, 360, 3600):
+        num_intents = max(4, total_keywords // 90)
+        catalog = _synthetic_catalog(num_intents, keywords_per_intent=total_keywords // num_intents)
+        matcher = MultiPatternMatcher(catalog)
+        legacy = _measure(lambda q: _legacy_scores(catalog, q), SAMPLE_QUERIES, rounds)
+        single_pass = _measure(matcher.score, SAMPLE_QUERIES, rounds)
+        results[total_keywords] = {"legacy_us": legacy["mean_us"], "single_pass_us": single_pass["mean_us"]}
+        print(f"   {total_keywords:>5} 关键词  逐个={legacy['mean_us']:9.1f}µs  "
+              f"单次扫描={single_pass['mean_us']:7.1f}µs")
+    return results
+
+
+def bench_batch_routing(batch_size: int = 2000) -> Dict[str, float]:
+    """对比逐条 route_intent 与批量 route_intents 的吞吐（条/秒）"""
+    router = IntentRouterRegistry().warm_up()
+    texts = (SAMPLE_QUERIES * (batch_size // len(SAMPLE_QUERIES) + 1))[:batch_size]
+    # 加上字符级扰动，模拟历史会话中大量但不完全重复的问题
+    texts = [f"{text}{i % 97}" for i, text in enumerate(texts)]
+
+    start = time.perf_counter()
+    for text in texts:
+        router.route_intent(text)
+    single_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    router.route_intents(texts)
+    batch_elapsed = time.perf_counter() - start
+
+    results = {
+        "single_per_sec": batch_size / single_elapsed,
+        "batch_per_sec": batch_size / batch_elapsed,
+    }
+    print("\n🧪 批量路由吞吐：逐条 vs route_intents")
+    print("=" * 50)
+    print(f"   逐条  {results['single_per_sec']:10.0f} 条/秒")
+    print(f"   批量  {results['batch_per_sec']:10.0f} 条/秒")
+    return results
+
+
+def load_labeled_queries(path: str = LABELED_QUERIES_PATH) -> List[Dict[str, str]]:
+    """加载带标注的查询集：[{"text": ..., "label": ...}, ...]"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_COLD_START_SCRIPT = """
+import json, resource, time
+start = time.perf_counter()
+from intent_router import IntentRouter, create_tokenizer, load_intent_catalog
+router = IntentRouter(*load_intent_catalog(), tokenizer=create_tokenizer({name!r}))
+router.route_intent("我想减肥，有什么建议吗？")
+elapsed = time.perf_counter() - start
+# ru_maxrss 在 exec 后会继承父进程的峰值，优先读取本进程的 VmHWM
+try:
+    with open("/proc/self/status") as f:
+        peak_kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+except OSError:
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "max_rss_mb": peak_kb / 1024}}))
+"""
+
+
+def _cold_start(tokenizer_name: str, catalog_path: str = "") -> Dict[str, float]:
+    """在全新进程中测量 导入 + 建索引 + 首次路由 的耗时与常驻内存峰值"""
+    env = dict(os.environ)
+    if catalog_path:
+        env["INTENT_CATALOG_PATH"] = catalog_path
+    output = subprocess.run(
+        [sys.executable, "-c", _COLD_START_SCRIPT.format(name=tokenizer_name)],
+        capture_output=True, text=True, check=True, cwd=BASE_DIR, env=env,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_tokenizers(rounds: int = 5) -> Dict[str, Dict[str, float]]:
+    """对比各分词器的路由准确率、单次路由延迟、冷启动耗时与内存"""
+    queries = load_labeled_queries()
+    texts = [row["text"] for row in queries]
+    results = {}
+    print("\n🧪 分词器对比：准确率与速度")
+    print("=" * 50)
+    for name in TOKENIZERS:
+        router = IntentRouter(tokenizer=create_tokenizer(name))
+        correct = sum(router.route_intent(row["text"])[0] == row["label"] for row in queries)
+        latency = _measure(router.route_intent, texts, rounds)
+        cold = _cold_start(name)
+        results[name] = {
+            "accuracy": correct / len(queries),
+            "mean_us": latency["mean_us"],
+            "cold_start_s": cold["seconds"],
+            "max_rss_mb": cold["max_rss_mb"],
+        }
+        print(f"   {name:<6} 准确率={results[name]['accuracy']:.3f}  路由={latency['mean_us']:7.1f}µs  "
+              f"冷启动={cold['seconds']:.2f}s  内存={cold['max_rss_mb']:.0f}MB")
+    return results
+
+
+def bench_cascade(rounds: int = 5) -> Dict[str, Dict[str, float]]:
+    """对比完整三阶段路由与级联提前退出路由的准确率、延迟及各阶段退出占比"""
+    queries = load_labeled_queries()
+    texts = [row["text"] for row in queries]
+    routers = {
+        "full": IntentRouter(cascade=None),
+        "cascade": IntentRouter(cascade=CascadeConfig()),
+    }
+    results = {}
+    print("\n🧪 级联路由：完整路由 vs 提前退出")
+    print("=" * 50)
+    for name, router in routers.items():
+        correct = sum(router.route_intent(row["text"])[0] == row["label"] for row in queries)
+        latency = _measure(router.route_intent, texts, rounds)
+        results[name] = {"accuracy": correct / len(queries), "mean_us": latency["mean_us"]}
+        print(f"   {name:<8} 准确率={results[name]['accuracy']:.3f}  路由={latency['mean_us']:7.1f}µs")
+    stats = routers["cascade"].cascade_stats()
+    print("   各阶段退出占比: " + "  ".join(f"{stage}={item['ratio']:.1%}" for stage, item in stats.items()))
+    results["cascade_exits"] = {stage: item["ratio"] for stage, item in stats.items()}
+    return results
+
+
+def bench_route_cache(requests: int = 5000, seed: int = 0) -> Dict[str, float]:
+    """模拟头部集中的流量（少量问题的标点/空白变体占多数），对比有无路由缓存"""
+    rng = random.Random(seed)
+    head = SAMPLE_QUERIES[:3]
+    variants = ["", " ", "！", "?", "。", "  "]
+    tail = [row["text"] for row in load_labeled_queries()]
+    traffic = [
+        rng.choice(variants) + rng.choice(head) + rng.choice(variants) if rng.random() < 0.7 else rng.choice(tail)
+        for _ in range(requests)
+    ]
+
+    router = IntentRouter(cascade=None)
+    router.route_cache = RouteCache()
+    uncached = _measure(router.route_intent, traffic, 1)
+    cached = _measure(router.route_intent_cached, traffic, 1)
+    stats = router.route_cache.stats()
+
+    print("\n🧪 路由缓存：头部集中流量")
+    print("=" * 50)
+    print(f"   无缓存 mean={uncached['mean_us']:7.1f}µs   有缓存 mean={cached['mean_us']:7.1f}µs")
+    print(f"   命中率={stats['hit_rate']:.1%}  条目={stats['entries']}  内存≈{stats['bytes'] / 1024:.0f}KB")
+    return {"uncached_us": uncached["mean_us"], "cached_us": cached["mean_us"], "hit_rate": stats["hit_rate"]}
+
+
+def bench_bm25_corpus_sizes(rounds: int = 3, seed: int = 0) -> Dict[int, Dict[str, float]]:
+    """对比 rank_bm25.BM25Okapi（对全部文档打分后按意图汇总）与倒排BM25在不同语料规模下的单次查询开销"""
+    from rank_bm25 import BM25Okapi
+
+    rng = random.Random(seed)
+    chars = [chr(code) for code in range(0x4E00, 0x4E00 + 3000)]
+    vocabulary = ["".join(rng.choice(chars) for _ in range(2)) for _ in range(5000)]
+    queries = [[rng.choice(vocabulary) for _ in range(8)] for _ in range(50)]
+
+    results = {}
+    print("\n🧪 BM25：全量打分 vs 倒排索引（每意图20篇示例文档）")
+    print("=" * 50)
+    for num_intents in (4, 50, 200, 500):
+        labels = [f"intent_{i}" for i in range(num_intents) for _ in range(20)]
+        docs = [[rng.choice(vocabulary) for _ in range(rng.randint(5, 30))] for _ in labels]
+        intents = list(dict.fromkeys(labels))
+
+        okapi = BM25Okapi(docs)
+
+        def okapi_score(query):
+            scores = defaultdict(float)
+            for doc_idx, score in enumerate(okapi.get_scores(query)):
+                scores[labels[doc_idx]] += score
+            return scores
+
+        inverted = InvertedBM25Index(docs, labels, intents)
+        full = _measure(okapi_score, queries, rounds)
+        sparse = _measure(inverted.score, queries, rounds)
+        results[len(docs)] = {"bm25okapi_us": full["mean_us"], "inverted_us": sparse["mean_us"]}
+        print(f"   {len(docs):>6} 篇文档  BM25Okapi={full['mean_us']:10.1f}µs  倒排={sparse['mean_us']:7.1f}µs")
+    return results
+
+
+def _synthetic_queries(catalog: Dict[str, Dict[str, List[str]]], length: int, count: int,
+                       seed: int = 0) -> List[str]:
+    """生成指定长度的查询：随机填充字符中夹杂少量目录关键词"""
+    rng = random.Random(seed)
+    keywords = [kw for patterns in catalog.values() for kw in patterns["keywords"]]
+    filler = "我想了解一下最近的情况应该怎么办有什么建议吗，。？"
+    queries = []
+    for _ in range(count):
+        parts = []
+        size = 0
+        while size < length:
+            piece = rng.choice(keywords) if rng.random() < 0.2 else rng.choice(filler)
+            parts.append(piece)
+            size += len(piece)
+        queries.append("".join(parts)[:length])
+    return queries
+
+
+def _best_of(fn: Callable[[str], object], queries: List[str], rounds: int, repeats: int = 3) -> Dict[str, float]:
+    """重复测量取各统计量的最小值，降低共享机器上的噪声（尤其是尾延迟）"""
+    runs = [_measure(fn, queries, rounds) for _ in range(repeats)]
+    return {key: min(run[key] for run in runs) for key in runs[0]}
+
+
+def evaluate_accuracy(router: IntentRouter, queries: List[Dict[str, str]]) -> Dict:
+    """在标注集上评估路由准确率与混淆矩阵（行：真实标签，列：预测意图）"""
+    labels = list(dict.fromkeys([row["label"] for row in queries] + list(router.intent_patterns)))
+    confusion = {label: {predicted: 0 for predicted in labels} for label in labels}
+    correct = 0
+    for row in queries:
+        predicted = router.route_intent(row["text"])[0]
+        confusion[row["label"]][predicted] += 1
+        correct += predicted == row["label"]
+    return {"accuracy": correct / len(queries), "confusion": confusion}
+
+
+def run_suite(rounds: int = 5, queries_per_length: int = 50) -> Dict:
+    """运行基准套件：各语料规模 x 输入长度的吞吐/延迟、建索引耗时与内存、冷启动、准确率"""
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tokenizer": create_tokenizer().name,
+            "intent_counts": list(SUITE_INTENT_COUNTS),
+            "input_lengths": list(SUITE_INPUT_LENGTHS),
+        },
+        "routing": {},
+        "build": {},
+        "cold_start": {},
+        "accuracy": {},
+    }
+
+    # 分词器词典的一次性加载计入冷启动，不计入建索引
+    create_tokenizer().cut("预热")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for num_intents in SUITE_INTENT_COUNTS:
+            size_key = f"intents={num_intents}"
+            catalog = _synthetic_catalog(num_intents, SUITE_KEYWORDS_PER_INTENT, seed=num_intents)
+            weights = dict.fromkeys(catalog, 1.0)
+
+            # 建索引耗时；内存（峰值 / 建成后保留）单独在 tracemalloc 下再建一次测量
+            start = time.perf_counter()
+            router = IntentRouter(catalog, weights, cascade=None)
+            build_ms = (time.perf_counter() - start) * 1e3
+            tracemalloc.start()
+            measured = IntentRouter(catalog, weights, cascade=None)
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del measured
+            report["build"][size_key] = {"build_ms": build_ms, "peak_kb": peak / 1024, "retained_kb": retained / 1024}
+
+            report["routing"][size_key] = {}
+            for length in SUITE_INPUT_LENGTHS:
+                queries = _synthetic_queries(catalog, length, queries_per_length, seed=length)
+                router.route_intent(queries[0])
+                stats = _best_of(router.route_intent, queries, rounds)
+                report["routing"][size_key][f"len={length}"] = {
+                    "qps": 1e6 / stats["mean_us"],
+                    "p50_us": stats["p50_us"],
+                    "p99_us": stats["p99_us"],
+                }
+
+            catalog_path = os.path.join(directory, f"catalog_{num_intents}.json")
+            with open(catalog_path, "w", encoding="utf-8") as f:
+                json.dump({"intent_patterns": catalog, "intent_weights": weights}, f, ensure_ascii=False)
+            report["cold_start"][size_key] = _cold_start(create_tokenizer().name, catalog_path)
+
+    labeled = load_labeled_queries()
+    for name in TOKENIZERS:
+        router = IntentRouter(tokenizer=create_tokenizer(name), cascade=None)
+        report["accuracy"][name] = evaluate_accuracy(router, labeled)
+    return report
+
+
+def print_report(report: Dict):
+    """打印基准套件报告"""
+    print("🧪 意图路由器基准套件")
+    print("=" * 60)
+    print(f"   Python {report['meta']['python']}  分词器: {report['meta']['tokenizer']}")
+    print("\n📈 路由吞吐与延迟")
+    for size_key, by_length in report["routing"].items():
+        for length_key, stats in by_length.items():
+            print(f"   {size_key:<12} {length_key:<8} {stats['qps']:9.0f} 条/秒  "
+                  f"p50={stats['p50_us']:8.1f}µs  p99={stats['p99_us']:8.1f}µs")
+    print("\n🧱 建索引与冷启动")
+    for size_key, stats in report["build"].items():
+        cold = report["cold_start"][size_key]
+        print(f"   {size_key:<12} 建索引={stats['build_ms']:8.1f}ms  峰值内存={stats['peak_kb']:8.0f}KB  "
+              f"常驻={stats['retained_kb']:8.0f}KB  冷启动={cold['seconds']:.2f}s ({cold['max_rss_mb']:.0f}MB)")
+    print("\n🎯 标注集准确率")
+    for name, result in report["accuracy"].items():
+        print(f"   {name:<6} 准确率={result['accuracy']:.3f}")
+        labels = list(result["confusion"])
+        corner = "label/pred"
+        print(f"   {corner:<18}" + "".join(f"{label[:10]:>12}" for label in labels))
+        for label in labels:
+            row = result["confusion"][label]
+            print(f"   {label[:18]:<18}" + "".join(f"{row[predicted]:>12}" for predicted in labels))
+
+
+def _flatten(report: Dict, prefix: str = "") -> Dict[str, float]:
+    """把报告展开为 路径 -> 数值，跳过元数据与混淆矩阵"""
+    flat = {}
+    for key, value in report.items():
+        if key in ("meta", "confusion"):
+            continue
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)):
+            flat[path] = float(value)
+    return flat
+
+
+def compare_to_baseline(report: Dict, baseline: Dict, tolerance: float = 0.5,
+                        accuracy_tolerance: float = 0.005) -> List[str]:
+    """与基线对比，返回回归项列表
+
+    速度与内存指标受机器影响较大，超出基线 ``tolerance`` 比例才算回归（p99 等尾延迟
+    噪声更大，放宽到两倍）；准确率下降超过 ``accuracy_tolerance`` 即算回归。
+    """
+    current = _flatten(report)
+    regressions = []
+    for path, base in _flatten(baseline).items():
+        value = current.get(path)
+        if value is None:
+            continue
+        metric = path.rsplit(".", 1)[-1]
+        if metric == "accuracy":
+            regressed = value < base - accuracy_tolerance
+        elif metric == "qps":
+            regressed = value < base / (1 + tolerance)
+        elif metric.startswith("p99"):
+            regressed = value > base * (1 + 2 * tolerance)
+        else:
+            regressed = value > base * (1 + tolerance)
+        if regressed:
+            regressions.append(f"{path}: 基线 {base:.4g} -> 当前 {value:.4g}")
+    return regressions
+
+
+def run_comparisons():
+    """运行各项优化前后的对比实验"""
+    bench_per_request_vs_shared()
+    bench_matcher_scaling()
+    bench_batch_routing()
+    bench_tokenizers()
+    bench_cascade()
+    bench_route_cache()
+    bench_bm25_corpus_sizes()
+
+
+def main():
+    """Main benchmark function."""
+    parser = argparse.ArgumentParser(description="意图路由器性能与准确率基准")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--check", action="store_true", help="与基线对比，出现回归时以非0状态退出")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件路径")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="速度/内存指标允许的相对退化比例")
+    parser.add_argument("--comparisons", action="store_true", help="运行各项优化前后的对比实验")
+    parser.add_argument("--rounds", type=int, default=5, help="每组查询重复次数")
+    args = parser.parse_args()
+
+    if args.comparisons:
+        run_comparisons()
+        return
+
+    report = run_suite(rounds=args.rounds)
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\n💾 基线已保存: {args.baseline}")
+
+    if args.check:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, tolerance=args.tolerance)
+        if regressions:
+            print("\n❌ 检测到回归:")
+            for item in regressions:
+                print(f"   {item}")
+            sys.exit(1)
+        print("\n✅ 未检测到回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+SSE Parser Benchmark - 流式响应解析吞吐
+
+在录制的流式响应上重放网络读到的原始字节块，比较原实现（iter_lines 切行 + 逐行 decode +
+json.loads）与增量字节解析器（标准库 json / orjson）的解析吞吐。
+
+用法:
+    python benchmark_sse_parser.py                              从本地桩服务录制后测试
+    python benchmark_sse_parser.py --record captures.jsonl      只录制，保存到文件
+    python benchmark_sse_parser.py --capture captures.jsonl     在已录制的文件上测试
+
+设置 DEEPSEEK_API_KEY 与 --base-url 时可以从真实接口录制。
+"""
+
+import os
+import json
+import time
+import base64
+import argparse
+import statistics
+from typing import Callable, Dict, Iterable, Iterator, List
+
+import requests
+
+import sse_parser
+from sse_parser import DeltaDecoder
+from deepseek_stub_server import DeepSeekStubServer
+
+ADVICE = (
+    "建议您每周进行至少150分钟的中等强度有氧运动，例如快走、游泳或骑自行车，并搭配每周两次的力量训练。"
+    "饮食上注意控制总热量，多吃蔬菜水果和全谷物，适量摄入优质蛋白质，减少精制糖和油炸食品。"
+    "保证每晚7到8小时的睡眠，避免熬夜；每天饮水1500到2000毫升。循序渐进，长期坚持比短期节食更有效。"
+)
+
+
+def _tokens(text: str, repeat: int) -> List[str]:
+    """把文本切成 1-3 个字的分块，近似模型逐 token 输出"""
+    text = text * repeat
+    tokens, index, step = [], 0, 0
+    while index < len(text):
+        size = 1 + step % 3
+        tokens.append(text[index:index + size])
+        index += size
+        step += 1
+    return tokens
+
+
+def record(base_url: str, api_key: str, streams: int) -> List[List[bytes]]:
+    """发起流式请求，按到达顺序记录每次网络读取得到的原始字节块"""
+    captures = []
+    with requests.Session() as session:
+        for _ in range(streams):
+            response = session.post(
+                f"{base_url}/chat/completions",
+                json={"model": "deepseek-chat", "stream": True, "temperature": 0.7,
+                      "messages": [{"role": "user", "content": "我想减肥，有什么建议吗？"}]},
+                headers={"Authorization": f"Bearer {api_key}"},
+                stream=True,
+                timeout=60,
+            )
+            response.raise_for_status()
+            with response:
+                captures.append([raw for raw in response.iter_content(chunk_size=None) if raw])
+    return captures
+
+
+def save(captures: List[List[bytes]], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for reads in captures:
+            f.write(json.dumps([base64.b64encode(raw).decode("ascii") for raw in reads]) + "\n")
+
+
+def load(path: str) -> List[List[bytes]]:
+    with open(path, encoding="utf-8") as f:
+        return [[base64.b64decode(raw) for raw in json.loads(line)] for line in f if line.strip()]
+
+
+def _iter_lines(reads: Iterable[bytes]) -> Iterator[bytes]:
+    """requests.Response.iter_lines 的切行算法"""
+    pending = None
+    for chunk in reads:
+        if pending is not None:
+            chunk = pending + chunk
+        lines = chunk.splitlines()
+        if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
+            pending = lines.pop()
+        else:
+            pending = None
+        yield from lines
+    if pending is not None:
+        yield pending
+
+
+def legacy_parse(reads: List[bytes]) -> List[str]:
+    """原实现：逐行 decode 为 str，检查前缀后 json.loads"""
+    contents = []
+    done = False
+    for line in _iter_lines(reads):
+        if line:
+            line_str = line.decode('utf-8')
+            if line_str == "data: [DONE]":
+                done = True
+            if done:
+                continue
+            if line_str.startswith("data: "):
+                try:
+                    data_str = line_str[6:]
+                    if data_str.strip():
+                        chunk_data = json.loads(data_str)
+                        if "choices" in chunk_data and len(chunk_data["choices"]) > 0:
+                            choice = chunk_data["choices"][0]
+                            if "delta" in choice and "content" in choice["delta"]:
+                                content = choice["delta"]["content"]
+                                if content:
+                                    contents.append(content)
+                except json.JSONDecodeError:
+                    continue
+    return contents
+
+
+def incremental_parse(reads: List[bytes]) -> List[str]:
+    decoder = DeltaDecoder()
+    contents = []
+    for raw in reads:
+        contents.extend(decoder.feed(raw))
+    return contents
+
+
+def _with_loads(loads: Callable, parse: Callable[[List[bytes]], List[str]]) -> Callable[[List[bytes]], List[str]]:
+    def run(reads: List[bytes]) -> List[str]:
+        previous = sse_parser.loads
+        sse_parser.loads = loads
+        try:
+            return parse(reads)
+        finally:
+            sse_parser.loads = previous
+    return run
+
+
+def bench(captures: List[List[bytes]], repeats: int = 5) -> Dict[str, Dict[str, float]]:
+    total_bytes = sum(len(raw) for reads in captures for raw in reads)
+    total_reads = sum(len(reads) for reads in captures)
+    expected = [legacy_parse(reads) for reads in captures]
+    tokens = sum(len(contents) for contents in expected)
+
+    parsers = {
+        "legacy iter_lines + json": legacy_parse,
+        "incremental + json": _with_loads(sse_parser._json_loads, incremental_parse),
+    }
+    if sse_parser.orjson is not None:
+        parsers["incremental + orjson"] = _with_loads(sse_parser.orjson.loads, incremental_parse)
+
+    print("🧪 SSE 流式响应解析吞吐")
+    print(f"   {len(captures)} 个流，{total_reads} 次网络读取，{tokens} 个分块，{total_bytes / 1024:.0f} KiB")
+    print("=" * 50)
+    results = {}
+    for name, parse in parsers.items():
+        assert [parse(reads) for reads in captures] == expected, f"{name} output differs"
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for reads in captures:
+                parse(reads)
+            samples.append(time.perf_counter() - start)
+        best = min(samples)
+        results[name] = {
+            "mb_per_s": total_bytes / best / 1e6,
+            "tokens_per_s": tokens / best,
+            "us_per_token": best / tokens * 1e6,
+            "median_ms": statistics.median(samples) * 1000,
+        }
+        print(f"   {name:<26} {results[name]['mb_per_s']:7.1f} MB/s  "
+              f"{results[name]['tokens_per_s'] / 1e6:5.2f}M 分块/秒  {results[name]['us_per_token']:5.2f}µs/分块")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE 解析吞吐基准")
+    parser.add_argument("--capture", help="已录制的流式响应文件（JSON Lines）")
+    parser.add_argument("--record", help="录制流式响应并保存到该文件")
+    parser.add_argument("--base-url", help="录制用的接口地址，默认使用本地桩服务")
+    parser.add_argument("--streams", type=int, default=20, help="录制的流数量")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.capture:
+        captures = load(args.capture)
+    elif args.base_url:
+        captures = record(args.base_url, os.getenv("DEEPSEEK_API_KEY", ""), args.streams)
+    else:
+        # 分块之间稍作等待，使每次网络读取大致对应一个事件，与真实的逐 token 输出一致
+        with DeepSeekStubServer(chunks=_tokens(ADVICE, 4), chunk_delay=0.0002) as server:
+            captures = record(server.base_url, "stub", args.streams)
+
+    if args.record:
+        save(captures, args.record)
+        print(f"💾 已保存 {len(captures)} 个流到 {args.record}")
+        return
+    bench(captures, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Build Intent Index - 构建预编译意图索引产物，供各 worker 启动时直接加载
+
+用法:
+    python build_intent_index.py [输出目录]
+
+输出目录默认取 INTENT_INDEX_PATH 环境变量，未设置时为 ./intent_index。
+意图目录读取 INTENT_CATALOG_PATH（默认 ./intent_catalog.json）。
+"""
+
+import os
+import sys
+import time
+
+from intent_router import build_intent_index
+
+
+def main():
+    """Main build function."""
+    path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("INTENT_INDEX_PATH", "intent_index")
+
+    start = time.perf_counter()
+    router = build_intent_index(path)
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ 意图索引已写入: {path}")
+    print(f"   指纹: {router.fingerprint[:16]}")
+    print(f"   意图数: {len(router.intent_patterns)}  文档数: {len(router.intent_docs)}  词项数: {len(router.bm25.vocab)}")
+    print(f"   耗时: {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
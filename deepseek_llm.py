@@ -4,13 +4,104 @@ DeepSeek LLM Integration for LangGraph Agent
 """
 
 import os
-import json
+import asyncio
+import aiohttp
+from contextlib import aclosing, nullcontext
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 import requests
-from typing import List, Dict, Any, Optional, AsyncGenerator, Generator
+from typing import List, Dict, Any, Optional, AsyncGenerator, Generator, Set
+from threading import Lock
+from pydantic import PrivateAttr
+from requests.adapters import HTTPAdapter
 from langchain_core.language_models.llms import LLM
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.outputs import LLMResult, Generation
 
+from llm_cache import ResponseCache, cache_key
+from single_flight import SingleFlight
+from rate_limiter import AdaptiveConcurrencyLimiter, Permit
+from retry_policy import RetryPolicy
+from sse_parser import DeltaDecoder
+
+# 上游过载的状态码：据此减小并发窗口并遵守 Retry-After
+OVERLOAD_STATUSES = (429, 503)
+
+# 消息类型到 DeepSeek role 的映射，按精确类型查表，子类首次出现时再按继承关系补充
+_BASE_MESSAGE_ROLES = ((HumanMessage, "user"), (AIMessage, "assistant"), (SystemMessage, "system"))
+_MESSAGE_ROLES = dict(_BASE_MESSAGE_ROLES)
+
+
+def _message_role(message_type: type) -> Optional[str]:
+    for base, role in _BASE_MESSAGE_ROLES:
+        if issubclass(message_type, base):
+            break
+    else:
+        role = None
+    _MESSAGE_ROLES[message_type] = role
+    return role
+
+
+def serialize_messages(messages: List[BaseMessage]) -> List[Dict[str, str]]:
+    """Convert LangChain messages to DeepSeek format, skipping unsupported types."""
+    serialized = []
+    for message in messages:
+        message_type = type(message)
+        role = _MESSAGE_ROLES[message_type] if message_type in _MESSAGE_ROLES else _message_role(message_type)
+        if role is not None:
+            serialized.append({"role": role, "content": message.content})
+    return serialized
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Connection failures, timeouts and 5xx responses are worth retrying; other errors are not."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          requests.exceptions.ChunkedEncodingError, aiohttp.ClientConnectionError,
+                          aiohttp.ClientPayloadError, asyncio.TimeoutError)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status", None)
+    return isinstance(status, int) and status >= 500
+
+
+class DeepSeekAPIError(Exception):
+    """A failed DeepSeek request; retryable marks transient failures safe to send again."""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class DeepSeekRateLimitError(DeepSeekAPIError):
+    """DeepSeek answered 429/503; retry_after is the server-requested delay in seconds, if any."""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"DeepSeek API overloaded (HTTP {status}), retry after {retry_after}s", retryable=True)
+        self.status = status
+        self.retry_after = retry_after
+
+
+# Pending closes of sessions left behind by finished event loops (keeps the tasks referenced)
+_stale_session_closes: Set[asyncio.Task] = set()
+
+
 class DeepSeekLLM(LLM):
     """DeepSeek LLM wrapper for LangChain."""
     
@@ -19,197 +110,422 @@ class DeepSeekLLM(LLM):
     model: str = "deepseek-chat"
     temperature: float = 0.0
     max_tokens: int = 4096
+    # 连接池配置：同步与异步客户端各自在实例内复用keep-alive连接
+    pool_size: int = 100
+    keepalive_timeout: float = 30.0
+    timeout: float = 30.0
+    # 可选的响应缓存（llm_cache.ResponseCache），None 表示不缓存
+    cache: Optional[ResponseCache] = None
+    # 合并相同的并发异步请求：只发一次上游请求，流式分块分发给所有调用方
+    coalesce: bool = True
+    # 可选的上游并发/速率限制（rate_limiter.AdaptiveConcurrencyLimiter），None 表示不限流
+    limiter: Optional[AdaptiveConcurrencyLimiter] = None
+    # 可选的重试与对冲策略（retry_policy.RetryPolicy），None 表示失败即返回
+    retry: Optional[RetryPolicy] = None
+    
+    _session: Optional[requests.Session] = PrivateAttr(default=None)
+    _session_lock: Lock = PrivateAttr(default_factory=Lock)
+    _async_session: Optional[aiohttp.ClientSession] = PrivateAttr(default=None)
+    _async_session_loop: Optional[asyncio.AbstractEventLoop] = PrivateAttr(default=None)
+    _flights: SingleFlight = PrivateAttr(default_factory=SingleFlight)
+    # Guards _stream_stats: sync streams are consumed from several threads
+    _stream_stats_lock: Lock = PrivateAttr(default_factory=Lock)
+    _stream_stats: Dict[str, float] = PrivateAttr(default_factory=lambda: {
+        "completed": 0, "completed_chunks": 0, "cancelled": 0, "cancelled_chunks": 0, "est_tokens_saved": 0.0
+    })
     
     @property
     def _llm_type(self) -> str:
         return "deepseek"
     
+    def _get_session(self) -> requests.Session:
+        """Return the per-instance keep-alive session, creating it on first use."""
+        session = self._session
+        if session is None:
+            with self._session_lock:
+                session = self._session
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update({
+                        "Authorization": f"Bearer {self.api_key}",
+                        "Content-Type": "application/json"
+                    })
+                    self._session = session
+        return session
+
+    def close(self) -> None:
+        """Close the keep-alive session."""
+        session = self._session
+        self._session = None
+        if session is not None:
+            session.close()
+
     def _call(self, prompt: str, stop: Optional[List[str]] = None, **kwargs) -> str:
         """Call the DeepSeek API."""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": self.model,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens
-        }
+        data = self._payload([HumanMessage(content=prompt)], stream=False)
         
         if stop:
             data["stop"] = stop
         
-        try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-            
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"DeepSeek API request failed: {str(e)}")
-        except (KeyError, IndexError) as e:
-            raise Exception(f"Failed to parse DeepSeek API response: {str(e)}")
+        return self._complete_cached(data)
     
     def invoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
         """Invoke the LLM with a list of messages."""
-        # Convert messages to DeepSeek format
-        deepseek_messages = []
-        
-        for message in messages:
-            if isinstance(message, HumanMessage):
-                deepseek_messages.append({
-                    "role": "user",
-                    "content": message.content
-                })
-            elif isinstance(message, AIMessage):
-                deepseek_messages.append({
-                    "role": "assistant",
-                    "content": message.content
-                })
-            elif isinstance(message, SystemMessage):
-                deepseek_messages.append({
-                    "role": "system",
-                    "content": message.content
-                })
+        data = self._payload(messages, stream=False)
+        return AIMessage(content=self._complete_cached(data))
+
+    def _complete_cached(self, data: Dict[str, Any]) -> str:
+        key = self._cache_key(data)
+        if key is not None:
+            chunks = self.cache.get(key)
+            if chunks is not None:
+                return "".join(chunks)
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        if self.retry is None:
+            content = self._complete(data)
+        else:
+            content = self.retry.call_sync(lambda: self._complete(data))
+        if key is not None:
+            self.cache.put(key, [content])
+        return content
+
+    def _complete(self, data: Dict[str, Any]) -> str:
+        """Send one non-streaming request upstream."""
+        with self._slot_sync() as permit:
+            try:
+                response = self._get_session().post(
+                    f"{self.base_url}/chat/completions",
+                    json=data,
+                    timeout=self.timeout
+                )
+                self._check_overload(response.status_code, response.headers, permit)
+                response.raise_for_status()
+                
+                result = response.json()
+                return result["choices"][0]["message"]["content"]
+                
+            except DeepSeekAPIError:
+                raise
+            except requests.exceptions.RequestException as e:
+                raise DeepSeekAPIError(f"DeepSeek API request failed: {str(e)}", _is_transient(e))
+            except (KeyError, IndexError) as e:
+                raise DeepSeekAPIError(f"Failed to parse DeepSeek API response: {str(e)}")
+
+    def invoke_stream(self, messages: List[BaseMessage], **kwargs) -> Generator[str, None, None]:
+        """Stream invoke the DeepSeek API."""
+        data = self._payload(messages, stream=True)
+        key = self._cache_key(data)
+        if key is not None:
+            chunks = self.cache.get(key)
+            if chunks is not None:
+                # 命中缓存时按原始分块回放
+                yield from chunks
+                return
         
+        stream = self._stream(data) if self.retry is None else self.retry.stream_sync(lambda: self._stream(data))
+        chunks = []
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            # 调用方提前结束：立即关闭上游响应，不再读取剩余 token
+            stream.close()
+            self._record_stream(len(chunks), cancelled=True)
+            raise
+        self._record_stream(len(chunks), cancelled=False)
+        # 只缓存完整读完的流，调用方提前结束时不会走到这里
+        if key is not None:
+            self.cache.put(key, chunks)
+
+    def _stream(self, data: Dict[str, Any]) -> Generator[str, None, None]:
+        """Send one streaming request upstream and yield content deltas."""
+        with self._slot_sync() as permit:
+            try:
+                response = self._get_session().post(
+                    f"{self.base_url}/chat/completions",
+                    json=data,
+                    stream=True,  # requests 的流式参数
+                    timeout=self.timeout
+                )
+                if response.status_code in OVERLOAD_STATUSES:
+                    response.close()
+                self._check_overload(response.status_code, response.headers, permit)
+                response.raise_for_status()
+                
+                # with 保证提前结束时连接也能归还连接池
+                with response:
+                    decoder = DeltaDecoder()
+                    # 分块传输时按到达的网络块读取；否则与 iter_lines 一样按 512 字节读取
+                    chunk_size = None if getattr(response.raw, "chunked", False) else 512
+                    # 收到 [DONE] 后继续读到响应结束，连接才会归还连接池
+                    for raw in response.iter_content(chunk_size=chunk_size):
+                        for content in decoder.feed(raw):
+                            yield content
+
+            except DeepSeekAPIError:
+                raise
+            except requests.exceptions.RequestException as e:
+                raise DeepSeekAPIError(f"DeepSeek API streaming request failed: {str(e)}", _is_transient(e))
+            except Exception as e:
+                raise DeepSeekAPIError(f"Failed to process streaming response: {str(e)}")
+
+    def _slot_sync(self):
+        """Upstream call permit for the sync client; a no-op permit without a limiter."""
+        if self.limiter is None:
+            return nullcontext(Permit())
+        return self.limiter.slot_sync()
+
+    def _slot(self):
+        """Upstream call permit for the async client; a no-op permit without a limiter."""
+        if self.limiter is None:
+            return nullcontext(Permit())
+        return self.limiter.slot()
+
+    @staticmethod
+    def _check_overload(status: int, headers, permit: Permit) -> None:
+        """Report 429/503 to the limiter and raise with the server's Retry-After."""
+        if status in OVERLOAD_STATUSES:
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            permit.overload(retry_after)
+            raise DeepSeekRateLimitError(status, retry_after)
+
+    def _payload(self, messages: List[BaseMessage], stream: bool) -> Dict[str, Any]:
+        """Build the request body shared by the sync and async clients."""
         data = {
             "model": self.model,
-            "messages": deepseek_messages,
+            "messages": serialize_messages(messages),
             "temperature": self.temperature,
             "max_tokens": self.max_tokens
         }
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
+        if stream:
+            data["stream"] = True
+        return data
+
+    def coalesce_stats(self) -> Dict[str, float]:
+        """Single-flight counters: upstream calls (leaders) and callers that joined one."""
+        return self._flights.stats()
+
+    def _record_stream(self, received: int, cancelled: bool) -> None:
+        """Count finished and abandoned upstream streams.
+
+        Tokens saved by an abandoned stream are estimated as the average length of
+        completed streams minus what was already received (DeepSeek sends about one
+        token per chunk).
+        """
+        stats = self._stream_stats
+        with self._stream_stats_lock:
+            if not cancelled:
+                stats["completed"] += 1
+                stats["completed_chunks"] += received
+                return
+            stats["cancelled"] += 1
+            stats["cancelled_chunks"] += received
+            if stats["completed"]:
+                stats["est_tokens_saved"] += max(0.0, stats["completed_chunks"] / stats["completed"] - received)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Counters of the cache, request coalescing, upstream limiter, retry and stream layers."""
+        with self._stream_stats_lock:
+            streams = dict(self._stream_stats)
+        metrics = {"coalesce": self.coalesce_stats(), "streams": streams}
+        if self.cache is not None:
+            metrics["cache"] = self.cache.stats()
+        if self.limiter is not None:
+            metrics["limiter"] = self.limiter.stats()
+        if self.retry is not None:
+            metrics["retry"] = self.retry.stats()
+        return metrics
+
+    def _cache_key(self, data: Dict[str, Any]) -> Optional[str]:
+        """Cache key for the request, or None when caching does not apply."""
+        if self.cache is None or not self.cache.cacheable(data):
+            return None
+        return cache_key(data)
+
+    def _get_async_session(self) -> aiohttp.ClientSession:
+        """Return the pooled aiohttp session bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        session = self._async_session
+        # aiohttp 会话绑定创建它的事件循环，循环变化（如多次 asyncio.run）时重建
+        if session is None or session.closed or self._async_session_loop is not loop:
+            self._close_stale_session(session, self._async_session_loop)
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout
             )
-            response.raise_for_status()
-            
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            
-            return AIMessage(content=content)
-            
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"DeepSeek API request failed: {str(e)}")
-        except (KeyError, IndexError) as e:
-            raise Exception(f"Failed to parse DeepSeek API response: {str(e)}")
+            session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                # 与同步客户端的 timeout 语义一致：限制连接与单次读取，不限制整个流的时长
+                timeout=aiohttp.ClientTimeout(total=None, connect=self.timeout, sock_read=self.timeout)
+            )
+            self._async_session = session
+            self._async_session_loop = loop
+        return session
 
-    def invoke_stream(self, messages: List[BaseMessage], **kwargs) -> Generator[str, None, None]:
-        """Stream invoke the DeepSeek API."""
-        # Convert messages to DeepSeek format
-        deepseek_messages = []
-        
-        for message in messages:
-            if isinstance(message, HumanMessage):
-                deepseek_messages.append({
-                    "role": "user",
-                    "content": message.content
-                })
-            elif isinstance(message, AIMessage):
-                deepseek_messages.append({
-                    "role": "assistant",
-                    "content": message.content
-                })
-            elif isinstance(message, SystemMessage):
-                deepseek_messages.append({
-                    "role": "system",
-                    "content": message.content
-                })
+    @staticmethod
+    def _close_stale_session(session: Optional[aiohttp.ClientSession],
+                             loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Close a session left behind by a previous event loop."""
+        if session is None or session.closed:
+            return
+        if loop is not None and loop.is_running():
+            # The old loop still runs (in another thread): close the session there
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        # The old loop has stopped (e.g. a finished asyncio.run): close from the current loop.
+        # Connections of a closed loop cannot be shut down gracefully; the session and
+        # connector are marked closed and the sockets are released with their transports.
+        task = asyncio.get_running_loop().create_task(session.close())
+        _stale_session_closes.add(task)
+        task.add_done_callback(_stale_session_closes.discard)
+
+    async def aclose(self) -> None:
+        """Close the pooled async session."""
+        session = self._async_session
+        self._async_session = None
+        self._async_session_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def ainvoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
+        """Async invoke the LLM with a list of messages."""
+        data = self._payload(messages, stream=False)
+        key = self._cache_key(data)
+        if key is not None:
+            chunks = await self.cache.aget(key)
+            if chunks is not None:
+                return AIMessage(content="".join(chunks))
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        if self.coalesce:
+            content = await self._flights.call(
+                f"invoke:{key or cache_key(data)}", lambda: self._acomplete_and_store(data, key)
+            )
+        else:
+            content = await self._acomplete_and_store(data, key)
+        return AIMessage(content=content)
+
+    async def _acomplete_and_store(self, data: Dict[str, Any], key: Optional[str]) -> str:
+        if self.retry is None:
+            content = await self._acomplete(data)
+        else:
+            content = await self.retry.call(lambda: self._acomplete(data))
+        if key is not None:
+            await self.cache.aput(key, [content])
+        return content
+
+    async def _acomplete(self, data: Dict[str, Any]) -> str:
+        """Send one non-streaming request upstream on the pooled async session."""
+        session = self._get_async_session()
         
-        data = {
-            "model": self.model,
-            "messages": deepseek_messages,
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens,
-            "stream": True  # 启用流式输出
-        }
+        async with self._slot() as permit:
+            try:
+                async with session.post(f"{self.base_url}/chat/completions", json=data) as response:
+                    self._check_overload(response.status, response.headers, permit)
+                    response.raise_for_status()
+                    result = await response.json()
+                return result["choices"][0]["message"]["content"]
+                
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise DeepSeekAPIError(f"DeepSeek API request failed: {str(e)}", _is_transient(e))
+            except (KeyError, IndexError) as e:
+                raise DeepSeekAPIError(f"Failed to parse DeepSeek API response: {str(e)}")
+
+    async def ainvoke_stream(self, messages: List[BaseMessage], **kwargs) -> AsyncGenerator[str, None]:
+        """Async stream invoke the DeepSeek API."""
+        data = self._payload(messages, stream=True)
+        key = self._cache_key(data)
+        if key is not None:
+            chunks = await self.cache.aget(key)
+            if chunks is not None:
+                # 命中缓存时按原始分块回放
+                for chunk in chunks:
+                    yield chunk
+                return
         
-        try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data,
-                stream=True,  # requests 的流式参数
-                timeout=30
+        if self.coalesce:
+            stream = self._flights.stream(
+                f"stream:{key or cache_key(data)}", lambda: self._astream_and_store(data, key)
             )
-            response.raise_for_status()
-            
-            # 处理流式响应
-            for line in response.iter_lines():
-                if line:
-                    line_str = line.decode('utf-8')
-                    
-                    # 跳过 "data: [DONE]" 行
-                    if line_str == "data: [DONE]":
-                        break
+        else:
+            stream = self._astream_and_store(data, key)
+        # aclosing：调用方提前结束时立即关闭内层生成器，释放上游连接
+        async with aclosing(stream):
+            async for chunk in stream:
+                yield chunk
+
+    async def _astream_and_store(self, data: Dict[str, Any], key: Optional[str]) -> AsyncGenerator[str, None]:
+        chunks = []
+        stream = self._astream(data) if self.retry is None else self.retry.stream(lambda: self._astream(data))
+        try:
+            async with aclosing(stream):
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            # 所有调用方都已离开（如客户端断开）：aclosing 已关闭上游响应，不再生成剩余 token
+            self._record_stream(len(chunks), cancelled=True)
+            raise
+        self._record_stream(len(chunks), cancelled=False)
+        # 只缓存完整读完的流，提前结束时不会走到这里
+        if key is not None:
+            await self.cache.aput(key, chunks)
+
+    async def _astream(self, data: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        """Send one streaming request upstream and yield content deltas."""
+        session = self._get_async_session()
+        
+        async with self._slot() as permit:
+            try:
+                async with session.post(f"{self.base_url}/chat/completions", json=data) as response:
+                    self._check_overload(response.status, response.headers, permit)
+                    response.raise_for_status()
                     
-                    # 解析 SSE 格式的数据
-                    if line_str.startswith("data: "):
-                        try:
-                            data_str = line_str[6:]  # 移除 "data: " 前缀
-                            if data_str.strip():
-                                chunk_data = json.loads(data_str)
-                                
-                                # 提取 delta content
-                                if "choices" in chunk_data and len(chunk_data["choices"]) > 0:
-                                    choice = chunk_data["choices"][0]
-                                    if "delta" in choice and "content" in choice["delta"]:
-                                        content = choice["delta"]["content"]
-                                        if content:
-                                            yield content
-                                            
-                        except json.JSONDecodeError:
-                            # 忽略无效的 JSON 行
-                            continue
-                            
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"DeepSeek API streaming request failed: {str(e)}")
-        except Exception as e:
-            raise Exception(f"Failed to process streaming response: {str(e)}")
+                    # 按到达的网络块增量解析 SSE，等待网络数据时让出事件循环
+                    decoder = DeltaDecoder()
+                    # 收到 [DONE] 后继续读到响应结束，连接才会归还连接池而不是被关闭
+                    async for raw in response.content.iter_any():
+                        for content in decoder.feed(raw):
+                            yield content
 
-    async def ainvoke_stream(self, messages: List[BaseMessage], **kwargs) -> AsyncGenerator[str, None]:
-        """Async stream invoke the DeepSeek API."""
-        # 将同步流式调用包装为异步
-        for chunk in self.invoke_stream(messages, **kwargs):
-            yield chunk
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise DeepSeekAPIError(f"DeepSeek API streaming request failed: {str(e)}", _is_transient(e))
+
+def create_deepseek_llm(model: Optional[str] = None,
+                        limiter: Optional[AdaptiveConcurrencyLimiter] = None) -> DeepSeekLLM:
+    """Create a DeepSeek LLM instance with environment configuration.
 
-def create_deepseek_llm() -> DeepSeekLLM:
-    """Create a DeepSeek LLM instance with environment configuration."""
+    model overrides DEEPSEEK_MODEL; limiter shares an existing client's upstream concurrency budget.
+    """
     api_key = os.getenv("DEEPSEEK_API_KEY")
     if not api_key:
         raise ValueError("DEEPSEEK_API_KEY environment variable is required")
     
     base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
-    model = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+    model = model or os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
     temperature = float(os.getenv("DEEPSEEK_TEMPERATURE", "0.0"))
+    pool_size = int(os.getenv("DEEPSEEK_POOL_SIZE", "100"))
+    keepalive_timeout = float(os.getenv("DEEPSEEK_KEEPALIVE_TIMEOUT", "30"))
     
     return DeepSeekLLM(
         api_key=api_key,
         base_url=base_url,
         model=model,
-        temperature=temperature
+        temperature=temperature,
+        pool_size=pool_size,
+        keepalive_timeout=keepalive_timeout,
+        cache=ResponseCache.from_env(),
+        coalesce=os.getenv("DEEPSEEK_COALESCE", "true").lower() in ("1", "true", "yes"),
+        limiter=limiter if limiter is not None else AdaptiveConcurrencyLimiter.from_env(),
+        retry=RetryPolicy.from_env()
     )
 
 def create_fallback_llm():
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+DeepSeek Stub Server - 本地模拟 /chat/completions 接口
+用于测试与基准测试，无需真实的 API Key 和网络
+"""
+
+import asyncio
+import json
+import threading
+from typing import List, Optional
+
+from aiohttp import web
+
+
+class DeepSeekStubServer:
+    """在后台线程中运行的 OpenAI 兼容接口桩服务
+
+    - 非流式请求返回完整的 chat.completion
+    - 流式请求按 SSE 格式逐块返回 chunks，每块之间等待 chunk_delay 秒
+    - 记录请求数与建立过的TCP连接数，便于验证连接复用
+    - 前 failures 个请求返回 failure_status（默认429）并带 Retry-After，用于验证限流处理
+    - 记录同时处理中的请求数峰值，便于验证并发限制
+    - response_delays 按请求顺序指定各请求的响应延迟（之后的请求使用 response_delay），用于模拟慢请求
+    """
+
+    def __init__(self, chunks: Optional[List[str]] = None, chunk_delay: float = 0.0,
+                 response_delay: float = 0.0, failures: int = 0, failure_status: int = 429,
+                 retry_after: Optional[str] = None, response_delays: Optional[List[float]] = None):
+        self.chunks = chunks or ["保持", "规律", "运动", "，", "均衡", "饮食", "。"]
+        self.chunk_delay = chunk_delay
+        self.response_delay = response_delay
+        self.failures = failures
+        self.failure_status = failure_status
+        self.retry_after = retry_after
+        self.response_delays = list(response_delays or [])
+        self.cancelled = 0
+        self.active = 0
+        self.max_active = 0
+        self.request_count = 0
+        self.last_payload = None
+        self._connections = set()
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+        self.base_url = ""
+
+    @property
+    def connection_count(self) -> int:
+        """服务端累计接受的TCP连接数"""
+        return len(self._connections)
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        self.request_count += 1
+        self.last_payload = payload
+        self._connections.add(request.transport.get_extra_info("peername"))
+
+        if self.request_count <= self.failures:
+            headers = {"Retry-After": self.retry_after} if self.retry_after is not None else None
+            return web.json_response({"error": {"message": "Rate limit reached"}},
+                                     status=self.failure_status, headers=headers)
+
+        index = self.request_count - self.failures - 1
+        delay = self.response_delays[index] if index < len(self.response_delays) else self.response_delay
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            return await self._respond(request, payload, delay)
+        except asyncio.CancelledError:
+            # 客户端提前断开连接（如对冲请求中落败的一方）
+            self.cancelled += 1
+            raise
+        finally:
+            self.active -= 1
+
+    async def _respond(self, request: web.Request, payload: dict, delay: float) -> web.StreamResponse:
+        if delay:
+            await asyncio.sleep(delay)
+
+        if not payload.get("stream"):
+            return web.json_response({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(self.chunks)},
+                    "finish_reason": "stop"
+                }]
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for chunk in self.chunks:
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            # 字段与 DeepSeek 实际返回的分块一致
+            event = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": 1718345013,
+                "model": payload.get("model"),
+                "system_fingerprint": "fp_stub",
+                "choices": [{"index": 0, "delta": {"content": chunk}, "logprobs": None, "finish_reason": None}]
+            }
+            await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        app = web.Application()
+        app.router.add_post("/chat/completions", self._handle)
+        # 客户端断开时取消处理函数，便于统计被提前关闭的请求
+        self._runner = web.AppRunner(app, handler_cancellation=True)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def start(self) -> "DeepSeekStubServer":
+        self._thread = threading.Thread(target=self._run, name="deepseek-stub", daemon=True)
+        self._thread.start()
+        self._started.wait(timeout=10)
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+
+    def __enter__(self) -> "DeepSeekStubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
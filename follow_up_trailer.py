@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Follow-up Trailer - 单次调用同时生成建议与后续问题
+
+建议提示词要求模型在正文之后输出一行分隔符，再输出后续问题的 JSON 数组：
+
+    ……建议正文……
+    <<<FOLLOW_UP>>>
+    ["问题一？", "问题二？"]
+
+TrailerSplitter 在流式分块上增量切分：分隔符之前的内容立即交给客户端，分块末尾可能是
+分隔符开头的几个字符先扣住，等下一块再决定；分隔符之后的内容只收集不输出。
+"""
+
+import json
+from typing import List, Optional
+
+FOLLOW_UP_MARKER = "<<<FOLLOW_UP>>>"
+
+
+class TrailerSplitter:
+    """把流式输出拆成建议正文与分隔符之后的尾部"""
+
+    __slots__ = ("marker", "found", "_pending", "_trailer")
+
+    def __init__(self, marker: str = FOLLOW_UP_MARKER):
+        self.marker = marker
+        self.found = False
+        # 可能是分隔符前缀、暂未输出的正文
+        self._pending = ""
+        self._trailer: List[str] = []
+
+    def feed(self, chunk: str) -> str:
+        """输入一个分块，返回其中可以立即输出的正文（可能为空串）"""
+        if self.found:
+            self._trailer.append(chunk)
+            return ""
+        text = self._pending + chunk if self._pending else chunk
+        index = text.find(self.marker)
+        if index >= 0:
+            self.found = True
+            self._pending = ""
+            self._trailer.append(text[index + len(self.marker):])
+            return text[:index]
+        keep = self._partial_marker_length(text)
+        if keep:
+            self._pending = text[-keep:]
+            return text[:-keep]
+        self._pending = ""
+        return text
+
+    def _partial_marker_length(self, text: str) -> int:
+        """text 末尾与分隔符开头重合的最长长度"""
+        first = self.marker[0]
+        start = max(len(text) - len(self.marker) + 1, 0)
+        index = text.find(first, start)
+        while index >= 0:
+            if self.marker.startswith(text[index:]):
+                return len(text) - index
+            index = text.find(first, index + 1)
+        return 0
+
+    def finish(self) -> str:
+        """流结束：返回仍扣住的正文（没有出现分隔符时它只是正文的结尾）"""
+        rest, self._pending = self._pending, ""
+        return rest
+
+    @property
+    def trailer(self) -> str:
+        return "".join(self._trailer)
+
+
+def parse_follow_up_questions(text: str) -> Optional[List[str]]:
+    """从模型输出中取出后续问题的 JSON 数组，容忍 ```json 代码块与前后多余文字；无法解析时返回 None"""
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        return None
+    try:
+        questions = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(questions, list):
+        return None
+    questions = [question.strip() for question in questions if isinstance(question, str) and question.strip()]
+    return questions or None
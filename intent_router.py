@@ -3,53 +3,760 @@
 Intent Router - 基于关键词/正则 + BM25稀疏检索的快速基线路由系统
 """
 
+import os
 import re
+import copy
 import json
+import marshal
+import sys
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from dataclasses import dataclass
 from typing import Dict, List, Tuple, Optional
-from collections import defaultdict
-import jieba
-from rank_bm25 import BM25Okapi
+from collections import OrderedDict, defaultdict, deque
+import math
+import numpy as np
+
+
+class MultiPatternMatcher:
+    """Aho-Corasick 多模式匹配器
+
+    将所有意图的关键词与正则模板编译进同一个自动机，对输入只扫描一次即可得到
+    每个意图的关键词得分和正则得分，结果与逐个关键词 ``in`` / 逐个模板
+    ``re.findall`` 完全一致。只有由无大小写字符组成的字面量选择式（如
+    ``减肥|减重|瘦身``）会编入自动机，其余正则仍按原方式单独执行。
+    """
+
+    def __init__(self, intent_patterns: Dict[str, Dict[str, List[str]]]):
+        self.intents = list(intent_patterns.keys())
+        self._literal_ids: Dict[str, int] = {}
+        self._literals: List[str] = []
+        # 字面量 -> 拥有该关键词的意图下标（保留重复，与逐个计数一致）
+        self._keyword_owners: List[List[int]] = []
+        # 字面量 -> [(正则模板下标, 选择支下标)]
+        self._regex_owners: List[List[Tuple[int, int]]] = []
+        # 空关键词总是命中
+        self._empty_keyword_counts = [0] * len(self.intents)
+        # 正则模板下标 -> (意图下标, 各选择支长度, 编译后的正则)
+        self._literal_regexes: List[Tuple[int, List[int], "re.Pattern"]] = []
+        # 无法编入自动机的正则：(意图下标, 编译后的正则)
+        self._fallback_regexes: List[Tuple[int, "re.Pattern"]] = []
+
+        for intent_idx, intent in enumerate(self.intents):
+            patterns = intent_patterns[intent]
+            for keyword in patterns.get("keywords", []):
+                if not keyword:
+                    self._empty_keyword_counts[intent_idx] += 1
+                    continue
+                self._keyword_owners[self._add_literal(keyword)].append(intent_idx)
+            for pattern in patterns.get("regex_patterns", []):
+                alternatives = self._split_literal_alternation(pattern)
+                if alternatives is None:
+                    self._fallback_regexes.append((intent_idx, re.compile(pattern, re.IGNORECASE)))
+                    continue
+                regex_idx = len(self._literal_regexes)
+                self._literal_regexes.append(
+                    (intent_idx, [len(alt) for alt in alternatives], re.compile(pattern, re.IGNORECASE))
+                )
+                for alt_idx, alt in enumerate(alternatives):
+                    self._regex_owners[self._add_literal(alt)].append((regex_idx, alt_idx))
+
+        self._build_automaton()
+
+    @staticmethod
+    def _split_literal_alternation(pattern: str) -> Optional[List[str]]:
+        """若正则是由无大小写字符组成的字面量选择式，返回各选择支，否则返回None"""
+        alternatives = pattern.split("|")
+        for alt in alternatives:
+            if not alt or re.escape(alt) != alt:
+                return None
+            # 含大小写字符时 IGNORECASE 语义较复杂，交给 re 处理
+            if any(ch.lower() != ch.upper() for ch in alt):
+                return None
+        return alternatives
+
+    def _add_literal(self, literal: str) -> int:
+        literal_id = self._literal_ids.get(literal)
+        if literal_id is None:
+            literal_id = len(self._literals)
+            self._literal_ids[literal] = literal_id
+            self._literals.append(literal)
+            self._keyword_owners.append([])
+            self._regex_owners.append([])
+        return literal_id
+
+    def _build_automaton(self):
+        """构建 goto / fail / output 表"""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        outputs: List[List[int]] = [[]]
+
+        for literal_id, literal in enumerate(self._literals):
+            state = 0
+            for ch in literal:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(literal_id)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                outputs[nxt].extend(outputs[self._fail[nxt]])
+
+        self._outputs: List[Tuple[int, ...]] = [tuple(out) for out in outputs]
+
+    def to_dict(self) -> Dict:
+        """导出已编译的自动机与匹配表（可JSON序列化）"""
+        return {
+            "intents": self.intents,
+            "literals": self._literals,
+            "keyword_owners": self._keyword_owners,
+            "regex_owners": self._regex_owners,
+            "empty_keyword_counts": self._empty_keyword_counts,
+            "literal_regexes": [
+                [intent_idx, alt_lengths, compiled.pattern]
+                for intent_idx, alt_lengths, compiled in self._literal_regexes
+            ],
+            "fallback_regexes": [[intent_idx, compiled.pattern] for intent_idx, compiled in self._fallback_regexes],
+            "goto": self._goto,
+            "fail": self._fail,
+            "outputs": self._outputs,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MultiPatternMatcher":
+        """从 ``to_dict`` 的结果恢复匹配器，无需重新构建自动机"""
+        matcher = cls.__new__(cls)
+        matcher.intents = list(data["intents"])
+        matcher._literals = list(data["literals"])
+        matcher._literal_ids = {literal: i for i, literal in enumerate(matcher._literals)}
+        matcher._keyword_owners = [list(owners) for owners in data["keyword_owners"]]
+        matcher._regex_owners = [[tuple(owner) for owner in owners] for owners in data["regex_owners"]]
+        matcher._empty_keyword_counts = list(data["empty_keyword_counts"])
+        matcher._literal_regexes = [
+            (intent_idx, list(alt_lengths), re.compile(pattern, re.IGNORECASE))
+            for intent_idx, alt_lengths, pattern in data["literal_regexes"]
+        ]
+        matcher._fallback_regexes = [
+            (intent_idx, re.compile(pattern, re.IGNORECASE)) for intent_idx, pattern in data["fallback_regexes"]
+        ]
+        matcher._goto = [dict(transitions) for transitions in data["goto"]]
+        matcher._fail = list(data["fail"])
+        matcher._outputs = [tuple(out) for out in data["outputs"]]
+        return matcher
+
+    def _scan(self, text: str) -> List[Tuple[int, int]]:
+        """扫描文本，返回所有（可重叠的）命中 (字面量下标, 结束位置)"""
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        hits = []
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                for literal_id in outputs[state]:
+                    hits.append((literal_id, pos + 1))
+        return hits
+
+    def score(self, text: str) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """单次扫描计算 (关键词得分, 正则得分)"""
+        keyword_counts, regex_counts = self.count(text)
+        keyword_scores = {intent: float(keyword_counts[i]) for i, intent in enumerate(self.intents)}
+        regex_scores = {intent: float(regex_counts[i]) for i, intent in enumerate(self.intents)}
+        return keyword_scores, regex_scores
+
+    def count(self, text: str) -> Tuple[List[int], List[int]]:
+        """单次扫描计算按意图顺序排列的 (关键词命中数, 正则匹配数)"""
+        text_lower = text.lower()
+        keyword_counts = list(self._empty_keyword_counts)
+        regex_counts = [0] * len(self.intents)
+
+        hits = self._scan(text_lower)
+        # lower() 改变长度时位置无法与原文对齐，正则退回逐个执行
+        literal_regex_ok = len(text_lower) == len(text)
+
+        seen = set()
+        # 正则模板下标 -> {起始位置: 最靠前的选择支}
+        starts: Dict[int, Dict[int, int]] = defaultdict(dict)
+        literals = self._literals
+        for literal_id, end in hits:
+            if literal_id not in seen:
+                seen.add(literal_id)
+                for intent_idx in self._keyword_owners[literal_id]:
+                    keyword_counts[intent_idx] += 1
+            if literal_regex_ok:
+                start = end - len(literals[literal_id])
+                for regex_idx, alt_idx in self._regex_owners[literal_id]:
+                    best = starts[regex_idx].get(start)
+                    if best is None or alt_idx < best:
+                        starts[regex_idx][start] = alt_idx
+
+        if literal_regex_ok:
+            # 模拟 re.findall 的从左到右、不重叠、按选择支顺序优先的匹配
+            for regex_idx, alt_at in starts.items():
+                intent_idx, alt_lengths, _ = self._literal_regexes[regex_idx]
+                pos = 0
+                for start in sorted(alt_at):
+                    if start >= pos:
+                        regex_counts[intent_idx] += 1
+                        pos = start + alt_lengths[alt_at[start]]
+            fallback_regexes = self._fallback_regexes
+        else:
+            fallback_regexes = self._fallback_regexes + [
+                (intent_idx, compiled) for intent_idx, _, compiled in self._literal_regexes
+            ]
+
+        for intent_idx, compiled in fallback_regexes:
+            regex_counts[intent_idx] += len(compiled.findall(text))
+
+        return keyword_counts, regex_counts
+
+
+class InvertedBM25Index:
+    """按意图聚合的倒排索引 BM25（Okapi 变体，公式与 rank_bm25.BM25Okapi 一致）
+
+    每个词项对某文档的贡献只取决于该词项与文档本身，因此建索引时即可把同一意图
+    下所有文档的贡献合并：倒排表为 词项 -> ((意图下标, 贡献), ...)。查询时只访问
+    查询词的倒排项并直接按意图累加，开销与语料规模无关，只与命中的倒排项数量有关。
+    """
+
+    def __init__(self, tokenized_docs: List[List[str]], doc_labels: List[str], intents: List[str],
+                 k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.intents = list(intents)
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.doc_len = [len(tokens) for tokens in tokenized_docs]
+        self.avgdl = sum(self.doc_len) / len(tokenized_docs)
+        
+        doc_freqs = []
+        doc_count: Dict[str, int] = {}
+        for tokens in tokenized_docs:
+            freqs: Dict[str, int] = {}
+            for token in tokens:
+                freqs[token] = freqs.get(token, 0) + 1
+            doc_freqs.append(freqs)
+            for token in freqs:
+                doc_count[token] = doc_count.get(token, 0) + 1
+        
+        # IDF：log((N - n + 0.5) / (n + 0.5))，负值以 epsilon * 平均IDF 兜底
+        corpus_size = len(tokenized_docs)
+        self.idf: Dict[str, float] = {}
+        negative = []
+        for term, count in doc_count.items():
+            idf = math.log(corpus_size - count + 0.5) - math.log(count + 0.5)
+            self.idf[term] = idf
+            if idf < 0:
+                negative.append(term)
+        self.average_idf = sum(self.idf.values()) / len(self.idf) if self.idf else 0.0
+        for term in negative:
+            self.idf[term] = self.epsilon * self.average_idf
+        
+        self._build_postings(doc_freqs, doc_labels)
+
+    def _build_postings(self, doc_freqs: List[Dict[str, int]], doc_labels: List[str]):
+        intent_index = {intent: i for i, intent in enumerate(self.intents)}
+        k1, b, avgdl = self.k1, self.b, self.avgdl
+        per_term: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for doc_idx, freqs in enumerate(doc_freqs):
+            intent_idx = intent_index[doc_labels[doc_idx]]
+            norm = k1 * (1 - b + b * self.doc_len[doc_idx] / avgdl)
+            for term, freq in freqs.items():
+                weight = self.idf[term] * (freq * (k1 + 1) / (freq + norm))
+                per_term[term][intent_idx] = per_term[term].get(intent_idx, 0.0) + weight
+        
+        self.vocab: Dict[str, int] = {term: i for i, term in enumerate(self.idf)}
+        self.postings: Dict[str, Tuple[Tuple[int, float], ...]] = {
+            term: tuple(sorted(per_term[term].items())) for term in self.vocab
+        }
+        
+        # 稠密 词项 x 意图 权重矩阵，供批量路由使用
+        matrix = np.zeros((len(self.vocab), len(self.intents)))
+        for term, term_idx in self.vocab.items():
+            for intent_idx, weight in self.postings[term]:
+                matrix[term_idx, intent_idx] = weight
+        self.term_intent_matrix = matrix
+
+    def score(self, tokens: List[str]) -> List[float]:
+        """按意图顺序返回BM25分数，只访问查询词的倒排项（重复词按出现次数累加）"""
+        scores = [0.0] * len(self.intents)
+        postings = self.postings
+        for token in tokens:
+            posting = postings.get(token)
+            if posting:
+                for intent_idx, weight in posting:
+                    scores[intent_idx] += weight
+        return scores
+
+    def to_dict(self) -> Dict:
+        """导出倒排表（可JSON序列化）；权重矩阵单独保存以便内存映射"""
+        return {
+            "intents": self.intents,
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+            "avgdl": self.avgdl,
+            "average_idf": self.average_idf,
+            "doc_len": self.doc_len,
+            "idf": self.idf,
+            "postings": [[term, [list(item) for item in self.postings[term]]] for term in self.vocab],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, term_intent_matrix=None) -> "InvertedBM25Index":
+        """从 ``to_dict`` 的结果恢复索引，无需重新计算IDF与倒排表"""
+        index = cls.__new__(cls)
+        index.intents = list(data["intents"])
+        index.k1 = data["k1"]
+        index.b = data["b"]
+        index.epsilon = data["epsilon"]
+        index.avgdl = data["avgdl"]
+        index.average_idf = data["average_idf"]
+        index.doc_len = list(data["doc_len"])
+        index.idf = dict(data["idf"])
+        index.vocab = {}
+        index.postings = {}
+        for term, posting in data["postings"]:
+            index.vocab[term] = len(index.vocab)
+            index.postings[term] = tuple((intent_idx, weight) for intent_idx, weight in posting)
+        if term_intent_matrix is None:
+            term_intent_matrix = np.zeros((len(index.vocab), len(index.intents)))
+            for term, term_idx in index.vocab.items():
+                for intent_idx, weight in index.postings[term]:
+                    term_intent_matrix[term_idx, intent_idx] = weight
+        index.term_intent_matrix = term_intent_matrix
+        return index
+
+
+_END = ""  # 字典树中的词尾标记（单个字符永远不会是空串）
+
+
+def _jieba():
+    """按需导入 jieba，使用其他分词器时不承担其导入与词典内存开销"""
+    import jieba
+    return jieba
+
+
+class JiebaTokenizer:
+    """jieba 精确模式分词（默认）"""
+
+    name = "jieba"
+    # 分词结果与意图目录无关，目录更新时可复用已有文档的分词结果
+    catalog_dependent = False
+
+    @property
+    def fingerprint(self) -> str:
+        return f"jieba-{_jieba().__version__}"
+
+    def fit(self, intent_patterns: Dict[str, Dict[str, List[str]]]):
+        """jieba 使用通用词典，无需根据意图目录训练"""
+
+    def cut(self, text: str) -> List[str]:
+        return _jieba().lcut(text)
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "JiebaTokenizer":
+        return cls()
+
+
+class TrieTokenizer:
+    """基于意图词表的字典树前向最大匹配分词，无需加载 jieba 词典
+
+    词表取自意图关键词与正则中的字面量选择支。词表外的字符逐字输出，它们不在
+    BM25 词表中，不影响打分。
+    """
+
+    name = "trie"
+    VERSION = 1
+    # 词表来自意图目录，目录更新后需重新分词
+    catalog_dependent = True
+
+    def __init__(self, vocabulary: Optional[List[str]] = None):
+        self.vocabulary: List[str] = []
+        self._root: Dict = {}
+        if vocabulary:
+            self._build(vocabulary)
+
+    @property
+    def fingerprint(self) -> str:
+        return f"trie-{self.VERSION}"
+
+    def fit(self, intent_patterns: Dict[str, Dict[str, List[str]]]):
+        """从意图目录收集词表并构建字典树"""
+        words = set()
+        for patterns in intent_patterns.values():
+            words.update(keyword for keyword in patterns.get("keywords", []) if keyword)
+            for pattern in patterns.get("regex_patterns", []):
+                words.update(alt for alt in pattern.split("|") if alt and re.escape(alt) == alt)
+        self._build(sorted(words))
+
+    def _build(self, vocabulary: List[str]):
+        self.vocabulary = list(vocabulary)
+        self._root = {}
+        for word in self.vocabulary:
+            node = self._root
+            for ch in word:
+                node = node.setdefault(ch, {})
+            node[_END] = True
+
+    def cut(self, text: str) -> List[str]:
+        root = self._root
+        tokens = []
+        pos = 0
+        length = len(text)
+        while pos < length:
+            node = root
+            end = -1
+            i = pos
+            while i < length:
+                node = node.get(text[i])
+                if node is None:
+                    break
+                i += 1
+                if _END in node:
+                    end = i
+            if end < 0:
+                tokens.append(text[pos])
+                pos += 1
+            else:
+                tokens.append(text[pos:end])
+                pos = end
+        return tokens
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "vocabulary": self.vocabulary}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TrieTokenizer":
+        return cls(data.get("vocabulary"))
+
+
+TOKENIZERS = {
+    JiebaTokenizer.name: JiebaTokenizer,
+    TrieTokenizer.name: TrieTokenizer,
+}
+
+
+def create_tokenizer(name: Optional[str] = None):
+    """按名称创建分词器，未指定时读取 INTENT_TOKENIZER 环境变量（默认 jieba）"""
+    name = name or os.getenv("INTENT_TOKENIZER", JiebaTokenizer.name)
+    if name not in TOKENIZERS:
+        raise ValueError(f"未知的分词器: {name}（可选: {', '.join(TOKENIZERS)}）")
+    return TOKENIZERS[name]()
+
+
+# 默认意图模板和关键词
+DEFAULT_INTENT_PATTERNS = {
+    "diet": {
+        "keywords": ["减肥", "减重", "瘦身", "饮食", "营养", "食物", "吃饭", "餐", "卡路里", "热量"],
+        "regex_patterns": [r"减肥|减重|瘦身", r"饮食|营养|食物", r"卡路里|热量"]
+    },
+    "exercise": {
+        "keywords": ["运动", "健身", "锻炼", "跑步", "游泳", "骑行", "瑜伽", "力量训练", "有氧"],
+        "regex_patterns": [r"运动|健身|锻炼", r"跑步|游泳|骑行", r"力量训练|有氧"]
+    },
+    "mental_health": {
+        "keywords": ["心理", "情绪", "压力", "焦虑", "抑郁", "失眠", "睡眠", "放松", "冥想"],
+        "regex_patterns": [r"心理|情绪|压力", r"焦虑|抑郁", r"失眠|睡眠"]
+    },
+    "general_wellness": {
+        "keywords": ["健康", "养生", "保健", "预防", "体检", "医生", "医院", "症状", "疾病"],
+        "regex_patterns": [r"健康|养生|保健", r"预防|体检", r"症状|疾病"]
+    }
+}
+
+# 默认意图优先级权重
+DEFAULT_INTENT_WEIGHTS = {
+    "diet": 1.0,
+    "exercise": 1.0,
+    "mental_health": 1.2,
+    "general_wellness": 0.8
+}
+
+# 综合评分中各匹配方式的默认权重
+DEFAULT_SCORE_WEIGHTS = {"keyword": 0.4, "regex": 0.3, "bm25": 0.3}
+
+# 默认意图目录配置文件，可通过 INTENT_CATALOG_PATH 指定其他文件
+DEFAULT_INTENT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_catalog.json")
+
+
+def validate_intent_catalog(intent_patterns: Dict[str, Dict[str, List[str]]],
+                            intent_weights: Dict[str, float]):
+    """校验意图目录结构，非法时抛出 ValueError（热更新时保留旧路由器）"""
+    if not isinstance(intent_patterns, dict) or not intent_patterns:
+        raise ValueError("意图目录不能为空")
+    for intent, patterns in intent_patterns.items():
+        if not isinstance(patterns, dict):
+            raise ValueError(f"意图 {intent} 的配置必须是对象")
+        for field in ("keywords", "regex_patterns"):
+            values = patterns.get(field)
+            if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+                raise ValueError(f"意图 {intent} 的 {field} 必须是字符串列表")
+        for pattern in patterns["regex_patterns"]:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"意图 {intent} 的正则 {pattern!r} 无效: {e}")
+    if not isinstance(intent_weights, dict):
+        raise ValueError("intent_weights 必须是对象")
+    for intent, weight in intent_weights.items():
+        if not isinstance(weight, (int, float)):
+            raise ValueError(f"意图 {intent} 的权重必须是数字")
+
+
+def load_intent_catalog(path: Optional[str] = None) -> Tuple[Dict[str, Dict[str, List[str]]], Dict[str, float]]:
+    """从JSON配置文件加载意图目录，返回 (intent_patterns, intent_weights)
+
+    文件格式: {"intent_patterns": {...}, "intent_weights": {...}}。未指定路径时读取
+    INTENT_CATALOG_PATH，文件不存在时使用内置默认目录。intent_weights 缺失或为空时在这里
+    换成默认权重，返回的权重即路由器实际使用的权重，指纹与预编译产物、热更新比较一致。
+    """
+    path = path or os.getenv("INTENT_CATALOG_PATH", DEFAULT_INTENT_CATALOG_PATH)
+    if not os.path.isfile(path):
+        return copy.deepcopy(DEFAULT_INTENT_PATTERNS), dict(DEFAULT_INTENT_WEIGHTS)
+    
+    with open(path, encoding="utf-8") as f:
+        catalog = json.load(f)
+    if not isinstance(catalog, dict):
+        raise ValueError("意图目录文件顶层必须是对象")
+    intent_patterns = catalog.get("intent_patterns")
+    intent_weights = catalog.get("intent_weights")
+    if intent_weights is None or intent_weights == {}:
+        intent_weights = dict(DEFAULT_INTENT_WEIGHTS)
+    validate_intent_catalog(intent_patterns, intent_weights)
+    return intent_patterns, intent_weights
+
+
+# 预编译索引产物格式版本，产物结构变化时递增
+INDEX_FORMAT_VERSION = 2
+INDEX_MANIFEST_FILE = "manifest.json"
+INDEX_BM25_MATRIX_FILE = "term_intent_bm25.npy"
+INDEX_JIEBA_CACHE_FILE = "jieba.cache"
+
+
+def intent_catalog_fingerprint(intent_patterns: Dict[str, Dict[str, List[str]]],
+                               intent_weights: Dict[str, float],
+                               score_weights: Dict[str, float],
+                               tokenizer_fingerprint: str) -> str:
+    """意图目录指纹：目录、权重或分词器变化时预编译索引即失效"""
+    payload = json.dumps({
+        "format_version": INDEX_FORMAT_VERSION,
+        "intent_patterns": intent_patterns,
+        "intent_weights": intent_weights,
+        "score_weights": score_weights,
+        "tokenizer": tokenizer_fingerprint,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CascadeConfig:
+    """级联路由配置
+
+    按 关键词 -> 正则 -> BM25 的顺序逐级累加分数。某一级结束后，若领先意图的
+    （部分）综合分数比第二名高出至少 ``margin``，且占全部分数的比例不低于
+    ``min_confidence``，则直接返回，不再执行后续阶段（尤其是需要分词的BM25）。
+    """
+
+    keyword_margin: float = 0.4
+    keyword_min_confidence: float = 0.9
+    regex_margin: float = 0.3
+    regex_min_confidence: float = 0.9
+
+    @classmethod
+    def from_env(cls) -> Optional["CascadeConfig"]:
+        """读取 INTENT_CASCADE* 环境变量，未开启时返回None"""
+        if os.getenv("INTENT_CASCADE", "").lower() not in ("1", "true", "yes"):
+            return None
+        defaults = cls()
+        return cls(
+            keyword_margin=float(os.getenv("INTENT_CASCADE_KEYWORD_MARGIN", defaults.keyword_margin)),
+            keyword_min_confidence=float(os.getenv("INTENT_CASCADE_KEYWORD_CONFIDENCE",
+                                                   defaults.keyword_min_confidence)),
+            regex_margin=float(os.getenv("INTENT_CASCADE_REGEX_MARGIN", defaults.regex_margin)),
+            regex_min_confidence=float(os.getenv("INTENT_CASCADE_REGEX_CONFIDENCE",
+                                                 defaults.regex_min_confidence)),
+        )
+
+
+CASCADE_STAGES = ("keyword", "regex", "bm25")
+
+
+def normalize_query(text: str) -> str:
+    """归一化用户文本作为路由缓存键：全角/半角折叠（NFKC）、小写、去除空白与标点"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] not in "PZC")
+
+
+class RouteCache:
+    """路由结果的有界LRU缓存（同时限制条目数与估算内存），线程安全"""
+
+    # 每个条目在 OrderedDict 与结果元组上的大致固定开销（字节）
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Tuple[str, float, Dict[str, float]], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["RouteCache"]:
+        """读取 INTENT_ROUTE_CACHE_SIZE / INTENT_ROUTE_CACHE_MAX_BYTES，条目数为0时关闭缓存"""
+        max_entries = int(os.getenv("INTENT_ROUTE_CACHE_SIZE", "4096"))
+        if max_entries <= 0:
+            return None
+        return cls(max_entries, int(os.getenv("INTENT_ROUTE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))))
+
+    def get(self, key: str) -> Optional[Tuple[str, float, Dict[str, float]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, result: Tuple[str, float, Dict[str, float]]):
+        size = sys.getsizeof(key) + sys.getsizeof(result[2]) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
 
 class IntentRouter:
     """意图识别路由系统"""
     
-    def __init__(self):
+    def __init__(self, intent_patterns: Optional[Dict[str, Dict[str, List[str]]]] = None,
+                 intent_weights: Optional[Dict[str, float]] = None,
+                 tokenizer=None,
+                 cascade: Optional[CascadeConfig] = None):
+        self._setup(intent_patterns, intent_weights, tokenizer or create_tokenizer(),
+                    cascade if cascade is not None else CascadeConfig.from_env())
+    
+    def _setup(self, intent_patterns, intent_weights, tokenizer, cascade,
+               token_cache: Optional[Dict[str, List[str]]] = None):
         # 意图模板和关键词
-        self.intent_patterns = {
-            "diet": {
-                "keywords": ["减肥", "减重", "瘦身", "饮食", "营养", "食物", "吃饭", "餐", "卡路里", "热量"],
-                "regex_patterns": [r"减肥|减重|瘦身", r"饮食|营养|食物", r"卡路里|热量"]
-            },
-            "exercise": {
-                "keywords": ["运动", "健身", "锻炼", "跑步", "游泳", "骑行", "瑜伽", "力量训练", "有氧"],
-                "regex_patterns": [r"运动|健身|锻炼", r"跑步|游泳|骑行", r"力量训练|有氧"]
-            },
-            "mental_health": {
-                "keywords": ["心理", "情绪", "压力", "焦虑", "抑郁", "失眠", "睡眠", "放松", "冥想"],
-                "regex_patterns": [r"心理|情绪|压力", r"焦虑|抑郁", r"失眠|睡眠"]
-            },
-            "general_wellness": {
-                "keywords": ["健康", "养生", "保健", "预防", "体检", "医生", "医院", "症状", "疾病"],
-                "regex_patterns": [r"健康|养生|保健", r"预防|体检", r"症状|疾病"]
-            }
-        }
+        self.intent_patterns = copy.deepcopy(intent_patterns or DEFAULT_INTENT_PATTERNS)
+        
+        # 分词器（jieba 或基于意图词表的字典树），用于BM25建索引与查询
+        self.tokenizer = tokenizer
+        self.tokenizer.fit(self.intent_patterns)
+        
+        # 编译关键词/正则多模式匹配器
+        self.matcher = MultiPatternMatcher(self.intent_patterns)
         
         # 初始化BM25
         self.bm25 = None
         self.intent_docs = []
         self.intent_labels = []
-        self._build_bm25_index()
+        self.tokenized_docs = []
+        self._build_bm25_index(token_cache)
         
         # 意图优先级权重
-        self.intent_weights = {
-            "diet": 1.0,
-            "exercise": 1.0,
-            "mental_health": 1.2,
-            "general_wellness": 0.8
+        self.intent_weights = dict(intent_weights or DEFAULT_INTENT_WEIGHTS)
+        
+        # 综合评分中各匹配方式的权重
+        self.score_weights = dict(DEFAULT_SCORE_WEIGHTS)
+        
+        # 级联路由（可选）及各阶段命中计数
+        self._init_cascade(cascade)
+        
+        # 按归一化文本缓存路由结果；缓存挂在路由器实例上，目录热更新换新路由器即失效
+        self.route_cache = RouteCache.from_env()
+    
+    def with_catalog(self, intent_patterns: Dict[str, Dict[str, List[str]]],
+                     intent_weights: Dict[str, float]) -> "IntentRouter":
+        """基于新意图目录增量构建一个新路由器，当前路由器保持不变
+
+        分词是建索引中最昂贵的部分：若分词器与目录无关（jieba），未变化的文档直接
+        复用已有分词结果，只对新增/修改的文档分词；BM25统计量、权重矩阵和自动机
+        的重建开销很小，直接重算。
+        """
+        token_cache = None
+        tokenizer = type(self.tokenizer)()
+        if not self.tokenizer.catalog_dependent:
+            tokenizer = self.tokenizer
+            token_cache = dict(zip(self.intent_docs, self.tokenized_docs))
+        router = type(self).__new__(type(self))
+        router._setup(intent_patterns, intent_weights, tokenizer, self.cascade, token_cache)
+        return router
+    
+    def _init_cascade(self, cascade: Optional[CascadeConfig]):
+        self.cascade = cascade
+        self._cascade_lock = threading.Lock()
+        self._cascade_exits = {stage: 0 for stage in CASCADE_STAGES}
+    
+    def cascade_stats(self) -> Dict[str, Dict[str, float]]:
+        """各阶段结束路由的次数与占比，可据此判断BM25（及其分词）实际被需要的频率"""
+        with self._cascade_lock:
+            exits = dict(self._cascade_exits)
+        total = sum(exits.values())
+        return {
+            stage: {"count": count, "ratio": count / total if total else 0.0}
+            for stage, count in exits.items()
         }
     
-    def _build_bm25_index(self):
-        """构建BM25索引"""
+    @property
+    def fingerprint(self) -> str:
+        """当前意图目录的指纹"""
+        return intent_catalog_fingerprint(self.intent_patterns, self.intent_weights, self.score_weights,
+                                          self.tokenizer.fingerprint)
+    
+    def _build_bm25_index(self, token_cache: Optional[Dict[str, List[str]]] = None):
+        """构建BM25索引（可复用 token_cache 中已分词的文档）"""
         for intent, patterns in self.intent_patterns.items():
             keywords_text = " ".join(patterns["keywords"])
             regex_text = " ".join(patterns["regex_patterns"])
@@ -58,71 +765,131 @@ class IntentRouter:
             self.intent_labels.extend([intent, intent])
         
         # 分词处理
-        tokenized_docs = []
+        token_cache = token_cache or {}
         for doc in self.intent_docs:
-            tokens = list(jieba.cut(doc))
-            tokenized_docs.append(tokens)
+            tokens = token_cache.get(doc)
+            self.tokenized_docs.append(list(tokens) if tokens is not None else self.tokenizer.cut(doc))
         
-        # 构建BM25索引
-        self.bm25 = BM25Okapi(tokenized_docs)
+        # 构建按意图聚合的倒排BM25索引
+        self.bm25 = InvertedBM25Index(self.tokenized_docs, self.intent_labels, list(self.intent_patterns))
     
-    def _keyword_match(self, text: str) -> Dict[str, float]:
-        """关键词匹配"""
-        scores = defaultdict(float)
-        text_lower = text.lower()
+    def save_index(self, path: str):
+        """将分词后的语料、IDF表、BM25权重矩阵和已编译匹配器写成预编译索引产物
+
+        产物目录包含 manifest.json（JSON元数据，含倒排表与已编译的自动机）、
+        term_intent_bm25.npy（批量路由 route_intents 使用的稠密权重矩阵，可内存映射），
+        使用 jieba 分词时还包含其前缀词典缓存。manifest 最后写入，读者只会看到完整产物。
+        """
+        os.makedirs(path, exist_ok=True)
+        _atomic_write(path, INDEX_BM25_MATRIX_FILE,
+                      lambda f: np.save(f, np.ascontiguousarray(self.bm25.term_intent_matrix)))
         
-        for intent, patterns in self.intent_patterns.items():
-            score = 0.0
-            for keyword in patterns["keywords"]:
-                if keyword in text_lower:
-                    score += 1.0
-            scores[intent] = score
+        # 随产物分发 jieba 前缀词典缓存，省去每个新容器首次分词时的词典构建
+        if self.tokenizer.name == JiebaTokenizer.name:
+            jieba = _jieba()
+            jieba.initialize()
+            _atomic_write(path, INDEX_JIEBA_CACHE_FILE, lambda f: marshal.dump((jieba.dt.FREQ, jieba.dt.total), f))
         
-        return dict(scores)
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "fingerprint": self.fingerprint,
+            "intent_patterns": self.intent_patterns,
+            "intent_weights": self.intent_weights,
+            "score_weights": self.score_weights,
+            "tokenizer": self.tokenizer.to_dict(),
+            "intent_docs": self.intent_docs,
+            "intent_labels": self.intent_labels,
+            "tokenized_docs": self.tokenized_docs,
+            "bm25": self.bm25.to_dict(),
+            "matcher": self.matcher.to_dict(),
+        }
+        _atomic_write(path, INDEX_MANIFEST_FILE,
+                      lambda f: f.write(json.dumps(manifest, ensure_ascii=False).encode("utf-8")))
     
-    def _regex_match(self, text: str) -> Dict[str, float]:
-        """正则表达式匹配"""
-        scores = defaultdict(float)
+    @classmethod
+    def load_index(cls, path: str, expected_fingerprint: Optional[str] = None,
+                   mmap: bool = True) -> "IntentRouter":
+        """从预编译索引产物加载路由器，跳过语料分词、IDF计算、倒排表与自动机构建
+
+        单条 route_intent 使用的倒排表与自动机从 manifest 解析到各进程自己的内存中；
+        只有 route_intents 使用的稠密权重矩阵以内存映射方式在 worker 进程间共享。
+
+        Args:
+            path: 产物目录
+            expected_fingerprint: 期望的意图目录指纹，不一致时视为过期产物
+            mmap: 是否以只读内存映射方式加载 route_intents 的权重矩阵（多个worker进程共享同一份页缓存）
         
-        for intent, patterns in self.intent_patterns.items():
-            score = 0.0
-            for pattern in patterns["regex_patterns"]:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                score += len(matches)
-            scores[intent] = score
+        Raises:
+            ValueError: 产物格式版本或指纹不匹配
+        """
+        with open(os.path.join(path, INDEX_MANIFEST_FILE), "rb") as f:
+            manifest = json.loads(f.read().decode("utf-8"))
+        if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"意图索引格式版本不匹配: {manifest.get('format_version')} != {INDEX_FORMAT_VERSION}")
+        if expected_fingerprint is not None and manifest["fingerprint"] != expected_fingerprint:
+            raise ValueError("意图索引已过期：意图目录或分词器版本已变化")
         
-        return dict(scores)
+        router = cls.__new__(cls)
+        router.intent_patterns = manifest["intent_patterns"]
+        router.intent_weights = manifest["intent_weights"]
+        router.score_weights = manifest["score_weights"]
+        router.tokenizer = TOKENIZERS[manifest["tokenizer"]["name"]].from_dict(manifest["tokenizer"])
+        router.intent_docs = manifest["intent_docs"]
+        router.intent_labels = manifest["intent_labels"]
+        router.tokenized_docs = manifest["tokenized_docs"]
+        router.matcher = MultiPatternMatcher.from_dict(manifest["matcher"])
+        router._init_cascade(CascadeConfig.from_env())
+        router.route_cache = RouteCache.from_env()
+        
+        # 直接恢复倒排BM25索引，不重新计算IDF；route_intents 的权重矩阵以内存映射方式共享
+        matrix = np.load(os.path.join(path, INDEX_BM25_MATRIX_FILE), mmap_mode="r" if mmap else None)
+        router.bm25 = InvertedBM25Index.from_dict(manifest["bm25"], term_intent_matrix=matrix)
+        
+        # 让 jieba 直接读取产物中的前缀词典缓存
+        jieba_cache = os.path.join(path, INDEX_JIEBA_CACHE_FILE)
+        if router.tokenizer.name == JiebaTokenizer.name and os.path.isfile(jieba_cache):
+            jieba = _jieba()
+            if not jieba.dt.initialized:
+                jieba.dt.tmp_dir = os.path.abspath(path)
+                jieba.dt.cache_file = INDEX_JIEBA_CACHE_FILE
+        
+        return router
+    
+    def _keyword_match(self, text: str) -> Dict[str, float]:
+        """关键词匹配"""
+        return self.matcher.score(text)[0]
+    
+    def _regex_match(self, text: str) -> Dict[str, float]:
+        """正则表达式匹配"""
+        return self.matcher.score(text)[1]
     
     def _bm25_match(self, text: str) -> Dict[str, float]:
         """BM25稀疏检索匹配"""
         if not self.bm25:
             return {}
         
-        tokens = list(jieba.cut(text))
-        bm25_scores = self.bm25.get_scores(tokens)
-        
-        intent_scores = defaultdict(float)
-        for i, score in enumerate(bm25_scores):
-            intent = self.intent_labels[i]
-            intent_scores[intent] += score
-        
-        return dict(intent_scores)
+        tokens = self.tokenizer.cut(text)
+        return dict(zip(self.bm25.intents, self.bm25.score(tokens)))
     
     def route_intent(self, text: str) -> Tuple[str, float, Dict[str, float]]:
         """路由意图识别"""
-        # 1. 关键词匹配
-        keyword_scores = self._keyword_match(text)
+        # 1-2. 关键词 + 正则表达式匹配（单次扫描）
+        keyword_scores, regex_scores = self.matcher.score(text)
         
-        # 2. 正则表达式匹配
-        regex_scores = self._regex_match(text)
+        if self.cascade is not None:
+            decided = self._cascade_early_exit(keyword_scores, regex_scores)
+            if decided is not None:
+                return decided
         
         # 3. BM25稀疏检索匹配
         bm25_scores = self._bm25_match(text)
+        if self.cascade is not None:
+            self._record_cascade_exit("bm25")
         
         # 4. 综合评分
         combined_scores = defaultdict(float)
         
-        weights = {"keyword": 0.4, "regex": 0.3, "bm25": 0.3}
+        weights = self.score_weights
         
         for intent in self.intent_patterns.keys():
             combined_scores[intent] = (
@@ -131,6 +898,11 @@ class IntentRouter:
                 bm25_scores.get(intent, 0) * weights["bm25"]
             ) * self.intent_weights.get(intent, 1.0)
         
+        return self._select_intent(combined_scores)
+    
+    @staticmethod
+    def _select_intent(combined_scores: Dict[str, float]) -> Tuple[str, float, Dict[str, float]]:
+        """选择最佳意图并计算置信度"""
         # 5. 选择最佳意图
         if not combined_scores:
             return "general_wellness", 0.1, dict(combined_scores)
@@ -142,6 +914,119 @@ class IntentRouter:
         confidence = best_intent[1] / total_score if total_score > 0 else 0.1
         
         return best_intent[0], confidence, dict(combined_scores)
+    
+    def _cascade_early_exit(self, keyword_scores: Dict[str, float],
+                            regex_scores: Dict[str, float]) -> Optional[Tuple[str, float, Dict[str, float]]]:
+        """依次检查关键词、正则阶段的部分综合分数是否已足够确定，是则提前返回"""
+        cascade = self.cascade
+        weights = self.score_weights
+        partial = {
+            intent: keyword_scores.get(intent, 0) * weights["keyword"] * self.intent_weights.get(intent, 1.0)
+            for intent in self.intent_patterns
+        }
+        if self._is_decisive(partial, cascade.keyword_margin, cascade.keyword_min_confidence):
+            self._record_cascade_exit("keyword")
+            return self._select_intent(partial)
+        
+        partial = {
+            intent: (
+                keyword_scores.get(intent, 0) * weights["keyword"] +
+                regex_scores.get(intent, 0) * weights["regex"]
+            ) * self.intent_weights.get(intent, 1.0)
+            for intent in self.intent_patterns
+        }
+        if self._is_decisive(partial, cascade.regex_margin, cascade.regex_min_confidence):
+            self._record_cascade_exit("regex")
+            return self._select_intent(partial)
+        return None
+    
+    @staticmethod
+    def _is_decisive(scores: Dict[str, float], margin: float, min_confidence: float) -> bool:
+        """领先意图相对第二名的差距与占比是否都达到阈值"""
+        ranked = sorted(scores.values(), reverse=True)
+        if not ranked or ranked[0] <= 0:
+            return False
+        runner_up = ranked[1] if len(ranked) > 1 else 0.0
+        return ranked[0] - runner_up >= margin and ranked[0] / sum(ranked) >= min_confidence
+    
+    def _record_cascade_exit(self, stage: str):
+        with self._cascade_lock:
+            self._cascade_exits[stage] += 1
+    
+    def route_intent_cached(self, text: str) -> Tuple[str, float, Dict[str, float]]:
+        """带缓存的路由：以归一化文本为键，命中时跳过分词与全部打分阶段
+
+        缓存未命中时对归一化后的文本路由，使缓存值只取决于键本身，与先到达的是
+        哪种写法无关。未开启缓存时等同于 ``route_intent``。
+        """
+        if self.route_cache is None:
+            return self.route_intent(text)
+        
+        key = normalize_query(text)
+        cached = self.route_cache.get(key)
+        if cached is None:
+            cached = self.route_intent(key)
+            self.route_cache.put(key, cached)
+        intent, confidence, scores = cached
+        return intent, confidence, dict(scores)
+    
+    def route_intents(self, texts: List[str]) -> List[Tuple[str, float, Dict[str, float]]]:
+        """批量路由意图识别
+
+        总是完整计算关键词、正则与BM25三种分数，不走级联提前退出，也不读写路由缓存；
+        结果与关闭级联（cascade=None）时逐条调用 ``route_intent`` 相同。
+        BM25打分和加权汇总以数组运算完成，重复文本只分词、匹配一次。
+        """
+        intents = list(self.intent_patterns.keys())
+        if not intents:
+            return [("general_wellness", 0.1, {}) for _ in texts]
+        
+        # 去重：历史会话中的重复问题只处理一次
+        unique_index: Dict[str, int] = {}
+        positions = [unique_index.setdefault(text, len(unique_index)) for text in texts]
+        unique_texts = list(unique_index)
+        num_texts = len(unique_texts)
+        
+        keyword_counts = np.zeros((num_texts, len(intents)))
+        regex_counts = np.zeros((num_texts, len(intents)))
+        rows: List[int] = []
+        cols: List[int] = []
+        vocab = self.bm25.vocab
+        for row, text in enumerate(unique_texts):
+            keyword_counts[row], regex_counts[row] = self.matcher.count(text)
+            for token in self.tokenizer.cut(text):
+                term = vocab.get(token)
+                if term is not None:
+                    rows.append(row)
+                    cols.append(term)
+        
+        # 稀疏 (文本, 词项) 坐标累加词项-意图权重，重复词按出现次数累加
+        bm25_scores = np.zeros((num_texts, len(intents)))
+        if rows:
+            np.add.at(bm25_scores, np.array(rows), self.bm25.term_intent_matrix[np.array(cols)])
+        
+        weights = self.score_weights
+        intent_weights = np.array([self.intent_weights.get(intent, 1.0) for intent in intents])
+        combined = (
+            keyword_counts * weights["keyword"] +
+            regex_counts * weights["regex"] +
+            bm25_scores * weights["bm25"]
+        ) * intent_weights
+        
+        best = combined.argmax(axis=1)
+        best_scores = combined[np.arange(num_texts), best]
+        totals = combined.sum(axis=1)
+        confidences = np.full(num_texts, 0.1)
+        np.divide(best_scores, totals, out=confidences, where=totals > 0)
+        
+        results = [
+            (intents[best[row]], float(confidences[row]), combined[row].tolist())
+            for row in range(num_texts)
+        ]
+        return [
+            (results[position][0], results[position][1], dict(zip(intents, results[position][2])))
+            for position in positions
+        ]
 
 # 意图映射到中文描述
 INTENT_DESCRIPTIONS = {
@@ -151,12 +1036,162 @@ INTENT_DESCRIPTIONS = {
     "general_wellness": "一般健康"
 }
 
-def analyze_intent_advanced(user_input: str) -> Dict:
+def _atomic_write(directory: str, filename: str, writer):
+    """先写临时文件再原子替换，避免读者看到写了一半的文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{filename}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer(f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, os.path.join(directory, filename))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def build_intent_index(path: str, router: Optional[IntentRouter] = None,
+                       catalog_path: Optional[str] = None) -> IntentRouter:
+    """构建预编译意图索引产物（部署构建步骤使用）"""
+    router = router or IntentRouter(*load_intent_catalog(catalog_path))
+    router.save_index(path)
+    return router
+
+
+class IntentRouterRegistry:
+    """进程级意图路由器注册表
+
+    路由器（含分词后的BM25索引）只构建一次，之后所有请求线程共享同一实例。
+    若配置了预编译索引产物（``INTENT_INDEX_PATH``），优先从产物加载。
+
+    意图目录从配置文件加载并支持热更新：新路由器在锁外增量构建完成后才以一次
+    引用赋值原子替换，请求要么拿到旧路由器、要么拿到完整的新路由器，进行中的
+    请求继续使用它们已取得的旧实例，不会被阻塞。
+    """
+
+    def __init__(self, index_path: Optional[str] = None, catalog_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._router: Optional[IntentRouter] = None
+        self._catalog_mtime: Optional[float] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+        self.index_path = index_path if index_path is not None else os.getenv("INTENT_INDEX_PATH")
+        self.catalog_path = catalog_path or os.getenv("INTENT_CATALOG_PATH", DEFAULT_INTENT_CATALOG_PATH)
+
+    def _catalog_file_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.catalog_path)
+        except OSError:
+            return None
+
+    def _create_router(self) -> IntentRouter:
+        """优先加载预编译索引，产物缺失或过期时现场构建"""
+        self._catalog_mtime = self._catalog_file_mtime()
+        intent_patterns, intent_weights = load_intent_catalog(self.catalog_path)
+        tokenizer = create_tokenizer()
+        if self.index_path:
+            expected = intent_catalog_fingerprint(intent_patterns, intent_weights,
+                                                  DEFAULT_SCORE_WEIGHTS, tokenizer.fingerprint)
+            try:
+                return IntentRouter.load_index(self.index_path, expected_fingerprint=expected)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️  意图索引加载失败，改为现场构建: {e}")
+        return IntentRouter(intent_patterns, intent_weights, tokenizer=tokenizer)
+
+    def get(self) -> IntentRouter:
+        """获取共享路由器，首次调用时构建（双重检查加锁，保证只构建一次）"""
+        router = self._router
+        if router is None:
+            with self._lock:
+                if self._router is None:
+                    self._router = self._create_router()
+                router = self._router
+        return router
+
+    def warm_up(self) -> IntentRouter:
+        """启动时预热：构建索引并触发分词器词典加载，避免首个请求承担冷启动开销"""
+        router = self.get()
+        router.route_intent("预热")
+        return router
+
+    def reload(self) -> bool:
+        """重新加载意图目录并原子替换路由器
+
+        Returns:
+            目录有变化并已替换时返回 True；目录未变化时返回 False
+
+        Raises:
+            ValueError: 新目录非法（此时继续使用旧路由器）
+        """
+        with self._reload_lock:
+            current = self.get()
+            mtime = self._catalog_file_mtime()
+            intent_patterns, intent_weights = load_intent_catalog(self.catalog_path)
+            candidate_fingerprint = intent_catalog_fingerprint(
+                intent_patterns, intent_weights, current.score_weights, current.tokenizer.fingerprint
+            )
+            self._catalog_mtime = mtime
+            if candidate_fingerprint == current.fingerprint:
+                return False
+            
+            # 在锁外（不持有 self._lock）构建，get() 期间始终返回旧路由器
+            router = current.with_catalog(intent_patterns, intent_weights)
+            router.route_intent("预热")
+            self._router = router
+            print(f"🔄 意图目录已热更新: {len(router.intent_patterns)} 个意图")
+            return True
+
+    def reload_if_changed(self) -> bool:
+        """目录文件修改时间变化时重新加载"""
+        if self._catalog_file_mtime() == self._catalog_mtime:
+            return False
+        try:
+            return self.reload()
+        except (OSError, ValueError) as e:
+            print(f"⚠️  意图目录热更新失败，继续使用旧目录: {e}")
+            return False
+
+    def start_watcher(self, interval: float):
+        """启动后台线程，每 interval 秒检查一次目录文件并按需热更新（线程已退出时重新启动）"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        def watch():
+            while not self._stop_watching.wait(interval):
+                # 任何异常都不能让监视线程退出，否则之后的目录修改再也不会生效
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"⚠️  意图目录监视出错，继续使用旧目录: {e!r}")
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=watch, name="intent-catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """停止后台目录监视线程"""
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+
+router_registry = IntentRouterRegistry()
+
+
+def get_intent_router() -> IntentRouter:
+    """获取进程级共享的意图路由器"""
+    return router_registry.get()
+
+
+def analyze_intent_advanced(user_input: str, router: Optional[IntentRouter] = None) -> Dict:
     """高级意图分析函数"""
-    router = IntentRouter()
+    if router is None:
+        router = get_intent_router()
     
-    # 路由意图
-    primary_intent, confidence, all_scores = router.route_intent(user_input)
+    # 路由意图（经归一化文本缓存）
+    primary_intent, confidence, all_scores = router.route_intent_cached(user_input)
     
     # 构建结果
     result = {
@@ -180,7 +1215,7 @@ def test_intent_router():
         "我想了解如何改善整体健康状况"
     ]
     
-    router = IntentRouter()
+    router = get_intent_router()
     
     print("🧪 意图路由器测试")
     print("=" * 50)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+LLM Response Cache - 确定性补全的响应缓存
+
+内存LRU + 可选的SQLite磁盘层，按 (模型, 温度, 消息...) 请求体哈希缓存完整回复。
+流式回复按原始分块保存，命中时逐块回放，流式接口依旧是流式的。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """请求体的稳定哈希；忽略 stream 标志，流式与非流式调用共享同一条缓存"""
+    material = {key: value for key, value in payload.items() if key != "stream"}
+    encoded = json.dumps(material, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LLM回复缓存：内存LRU（条目数+字节上限）在前，SQLite磁盘层在后，均带TTL，线程安全
+
+    只缓存 temperature <= max_temperature 的请求，默认即只缓存确定性补全。
+    """
+
+    # 每个条目在 OrderedDict 与分块列表上的大致固定开销（字节）
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: float = 24 * 3600, path: Optional[str] = None,
+                 disk_max_entries: int = 100000, max_temperature: float = 0.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        self.disk_max_entries = disk_max_entries
+        self.max_temperature = max_temperature
+        self._entries: "OrderedDict[str, Tuple[List[str], float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._db = None
+        self._disk_count = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, chunks TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._disk_count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """读取 LLM_CACHE* 环境变量；缓存默认关闭，LLM_CACHE=true 时开启"""
+        if os.getenv("LLM_CACHE", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            ttl=float(os.getenv("LLM_CACHE_TTL", str(24 * 3600))),
+            path=os.getenv("LLM_CACHE_PATH") or None,
+            disk_max_entries=int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "100000")),
+            max_temperature=float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.0")),
+        )
+
+    def cacheable(self, payload: Dict[str, Any]) -> bool:
+        return payload.get("temperature", 0.0) <= self.max_temperature
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """返回缓存的回复分块，未命中或已过期返回 None"""
+        chunks = self._get_memory(key)
+        if chunks is not None:
+            return chunks
+        return self._get_disk(key)
+
+    def _get_memory(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            chunks, created, size = entry
+            if time.time() - created <= self.ttl:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return chunks
+            del self._entries[key]
+            self._bytes -= size
+            self.expirations += 1
+            return None
+
+    def _get_disk(self, key: str) -> Optional[List[str]]:
+        now = time.time()
+        with self._lock:
+            if self._db is None:
+                self.misses += 1
+                return None
+
+            row = self._db.execute("SELECT chunks, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._disk_count -= 1
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            chunks = json.loads(row[0])
+            self.disk_hits += 1
+            # 磁盘命中提升到内存层
+            self._store_memory(key, chunks, row[1])
+            return chunks
+
+    def put(self, key: str, chunks: List[str]):
+        """保存完整回复的分块（非流式调用保存为单个分块）"""
+        now = time.time()
+        with self._lock:
+            self.stores += 1
+            self._store_memory(key, chunks, now)
+            if self._db is not None:
+                encoded = json.dumps(chunks, ensure_ascii=False)
+                inserted = self._db.execute(
+                    "INSERT OR IGNORE INTO responses (key, chunks, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, encoded, now, now)
+                ).rowcount
+                if inserted:
+                    self._disk_count += 1
+                else:
+                    self._db.execute(
+                        "UPDATE responses SET chunks = ?, created = ?, accessed = ? WHERE key = ?",
+                        (encoded, now, now, key)
+                    )
+                # 按最近访问时间淘汰超出上限的磁盘条目
+                overflow = self._disk_count - self.disk_max_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                        (overflow,)
+                    )
+                    self._disk_count -= overflow
+                    self.evictions += overflow
+
+    def _store_memory(self, key: str, chunks: List[str], created: float):
+        # 调用方持有 self._lock
+        size = sum(len(chunk.encode("utf-8")) for chunk in chunks) + len(key) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[2]
+        self._entries[key] = (chunks, created, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    async def aget(self, key: str) -> Optional[List[str]]:
+        """异步查询：内存层直接查，磁盘层在线程中执行，避免SQLite读写阻塞事件循环"""
+        chunks = self._get_memory(key)
+        if chunks is not None:
+            return chunks
+        if self._db is None:
+            return self._get_disk(key)  # 仅记录未命中
+        return await asyncio.to_thread(self._get_disk, key)
+
+    async def aput(self, key: str, chunks: List[str]):
+        if self._db is None:
+            self.put(key, chunks)
+        else:
+            await asyncio.to_thread(self.put, key, chunks)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._disk_count = 0
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "disk_entries": self._disk_count,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
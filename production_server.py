@@ -33,16 +33,42 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 import asyncio
+from contextlib import aclosing, asynccontextmanager
 from typing import AsyncGenerator
 import json
 
 # Import the 维尔必应 agent AFTER setting environment variables
-from wellbeing_agent import run_wellbeing_agent, run_wellbeing_agent_stream
+from wellbeing_agent import follow_up_llm, llm, run_wellbeing_agent, run_wellbeing_agent_stream, stream_metrics
+from intent_router import router_registry
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时预热意图路由器，避免首个请求构建BM25索引"""
+    await asyncio.to_thread(router_registry.warm_up)
+    print("🎯 意图路由器已预热")
+    
+    # 意图目录热更新：定期检查目录文件，变化时在后台增量重建并原子替换
+    reload_interval = float(os.getenv("INTENT_CATALOG_RELOAD_INTERVAL", "0"))
+    if reload_interval > 0:
+        router_registry.start_watcher(reload_interval)
+        print(f"👀 意图目录热更新已开启（每 {reload_interval:g}s 检查一次）")
+    yield
+    router_registry.stop_watcher()
+    
+    # 关闭各提供方 LLM 的连接池（后续问题单独配置模型时还有一组）
+    for client in {id(llm): llm, id(follow_up_llm): follow_up_llm}.values():
+        aclose = getattr(client, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        close = getattr(client, "close", None)
+        if close is not None:
+            close()
 
 app = FastAPI(
     title="维尔必应 API",
     description="健康顾问AI API服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS配置 - 生产环境
@@ -74,6 +100,12 @@ async def health_check():
     """健康检查端点"""
     return {"status": "healthy", "message": "维尔必应 API 运行正常"}
 
+@app.get("/api/metrics")
+async def metrics():
+    """LLM 调用层指标（响应缓存、请求合并、上游限流、流式取消节省的 token）与流式请求断开统计"""
+    llm_metrics = getattr(llm, "metrics", None)
+    return {**(llm_metrics() if llm_metrics is not None else {}), "agent_streams": dict(stream_metrics)}
+
 @app.post("/api/chat/stream")
 async def chat_stream(message: ChatMessage):
     """流式聊天端点，处理用户消息通过维尔必应 agent"""
@@ -83,35 +115,36 @@ async def chat_stream(message: ChatMessage):
             start_data = {"type": "start", "message": "🌱 开始分析您的健康需求..."}
             yield f"data: {json.dumps(start_data, ensure_ascii=False)}\n\n"
             
-            # 使用真正的流式函数
-            async for chunk in run_wellbeing_agent_stream(message.message):
-                if chunk['type'] == 'step':
-                    # 步骤更新
-                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
-                elif chunk['type'] == 'content':
-                    # 内容更新 - 逐字符流式输出
-                    content = chunk.get('content', '')
-                    if content:
-                        # 模拟逐字符输出效果
-                        for char in content:
-                            char_data = {
-                                "type": "content",
-                                "content": char,
-                                "advice_type": chunk.get('advice_type', 'general'),
-                                "user_intent": chunk.get('user_intent', 'wellness')
-                            }
-                            yield f"data: {json.dumps(char_data, ensure_ascii=False)}\n\n"
-                            await asyncio.sleep(0.02)  # 控制流式速度
-                elif chunk['type'] == 'follow_up':
-                    # 后续问题
-                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
-                elif chunk['type'] == 'summary':
-                    # 总结
-                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
-                elif chunk['type'] == 'error':
-                    # 错误处理
-                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
-                    break
+            # 使用真正的流式函数；客户端断开时 Starlette 取消本生成器，aclosing 随即逐层关闭到上游 LLM 流
+            async with aclosing(run_wellbeing_agent_stream(message.message)) as agent_stream:
+                async for chunk in agent_stream:
+                    if chunk['type'] == 'step':
+                        # 步骤更新
+                        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    elif chunk['type'] == 'content':
+                        # 内容更新 - 逐字符流式输出
+                        content = chunk.get('content', '')
+                        if content:
+                            # 模拟逐字符输出效果
+                            for char in content:
+                                char_data = {
+                                    "type": "content",
+                                    "content": char,
+                                    "advice_type": chunk.get('advice_type', 'general'),
+                                    "user_intent": chunk.get('user_intent', 'wellness')
+                                }
+                                yield f"data: {json.dumps(char_data, ensure_ascii=False)}\n\n"
+                                await asyncio.sleep(0.02)  # 控制流式速度
+                    elif chunk['type'] == 'follow_up':
+                        # 后续问题
+                        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    elif chunk['type'] == 'summary':
+                        # 总结
+                        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    elif chunk['type'] == 'error':
+                        # 错误处理
+                        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                        break
             
             # 发送结束信号
             end_data = {"type": "end", "content": ""}
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Provider Router - 多个 LLM 提供方之间的运行时故障转移
+
+按优先级持有多个 LLM 客户端（DeepSeek、OpenAI 回退），每个提供方配一个熔断器：
+
+- 关闭（closed）：正常放行，在时间窗口内统计失败率与慢调用率（非流式按总耗时，流式按首包延迟）
+- 打开（open）：失败率或慢调用率超过阈值时熔断，open_duration 内直接跳过该提供方；
+  最后一个提供方后面已没有可转移的对象，熔断时仍强制放行，请求不会在未尝试任何提供方时失败
+- 半开（half_open）：熔断到期后只放行少量探测请求，全部成功则恢复，任一失败则重新熔断
+
+每个请求按优先级选择第一个放行的提供方，失败时转到下一个；流式请求只在收到首个分块之前转移。
+"""
+
+import os
+import copy
+import time
+import threading
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Deque, Dict, Generator, Iterator, List, Optional, Tuple
+
+
+class CircuitBreaker:
+    """基于时间窗口失败率与慢调用率的熔断器，线程安全"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # acquire() 返回的放行类型
+    CALL = "call"
+    PROBE = "probe"
+    # 熔断时仍强制放行的调用（最后一个提供方），结果与熔断后才返回的调用一样不计入窗口
+    FORCED = "forced"
+
+    def __init__(self, failure_rate: float = 0.5, slow_call_rate: float = 0.8, slow_call_threshold: float = 10.0,
+                 min_calls: int = 10, window: float = 60.0, open_duration: float = 30.0, half_open_probes: int = 1):
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_threshold = slow_call_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.open_duration = open_duration
+        self.half_open_probes = half_open_probes
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        # 窗口内的调用结果: (完成时间, 是否失败, 是否慢调用)
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.trips = 0
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        """读取 LLM_BREAKER_* 环境变量"""
+        return cls(
+            failure_rate=float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5")),
+            slow_call_rate=float(os.getenv("LLM_BREAKER_SLOW_CALL_RATE", "0.8")),
+            slow_call_threshold=float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "10")),
+            min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "10")),
+            window=float(os.getenv("LLM_BREAKER_WINDOW", "60")),
+            open_duration=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30")),
+            half_open_probes=int(os.getenv("LLM_BREAKER_HALF_OPEN_PROBES", "1")),
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._advance_locked(time.monotonic())
+            return self._state
+
+    def _advance_locked(self, now: float):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_duration:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+    def _trip_locked(self, now: float):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.trips += 1
+
+    def acquire(self) -> Optional[str]:
+        """请求放行：关闭时返回 CALL，半开且探测名额未满时返回 PROBE，否则返回 None"""
+        with self._lock:
+            self._advance_locked(time.monotonic())
+            if self._state == self.CLOSED:
+                return self.CALL
+            if self._state == self.HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return self.PROBE
+            return None
+
+    def record(self, ticket: str, success: bool, latency: float):
+        """记录一次放行调用的结果"""
+        now = time.monotonic()
+        slow = latency >= self.slow_call_threshold
+        with self._lock:
+            if ticket == self.PROBE:
+                if self._state != self.HALF_OPEN:
+                    return
+                self._probes_in_flight -= 1
+                if not success or slow:
+                    self._trip_locked(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._state = self.CLOSED
+                return
+
+            # 熔断之后才返回的旧调用结果不再计入
+            if self._state != self.CLOSED:
+                return
+            self._outcomes.append((now, not success, slow))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for _, failed, _ in self._outcomes if failed)
+            slow_calls = sum(1 for _, _, is_slow in self._outcomes if is_slow)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                self._trip_locked(now)
+
+    def release(self, ticket: str):
+        """放行的调用被调用方取消、没有结果时归还探测名额"""
+        if ticket != self.PROBE:
+            return
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes_in_flight > 0:
+                self._probes_in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._advance_locked(time.monotonic())
+            calls = len(self._outcomes)
+            return {
+                "state": self._state,
+                "window_calls": calls,
+                "failure_rate": sum(1 for _, failed, _ in self._outcomes if failed) / calls if calls else 0.0,
+                "slow_call_rate": sum(1 for _, _, slow in self._outcomes if slow) / calls if calls else 0.0,
+                "trips": self.trips,
+            }
+
+
+class _Provider:
+    """一个提供方：客户端、熔断器与计数"""
+
+    def __init__(self, name: str, client: Any, breaker: CircuitBreaker):
+        self.name = name
+        self.client = client
+        self.breaker = breaker
+        self.calls = 0
+        self.failures = 0
+        self.latencies: Deque[float] = deque(maxlen=512)
+
+    def record(self, ticket: str, success: bool, latency: float):
+        self.calls += 1
+        if success:
+            self.latencies.append(latency)
+        else:
+            self.failures += 1
+        self.breaker.record(ticket, success, latency)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        stats = {
+            **self.breaker.stats(),
+            "calls": self.calls,
+            "failures": self.failures,
+            "p95_latency_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+        }
+        client_metrics = getattr(self.client, "metrics", None)
+        if client_metrics is not None:
+            stats["client"] = client_metrics()
+        return stats
+
+
+class ProviderRouter:
+    """与单个 LLM 客户端接口一致（invoke / ainvoke / ainvoke_stream），按请求在提供方之间故障转移"""
+
+    def __init__(self, providers: List[Tuple[str, Any]], breaker_factory=CircuitBreaker):
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider")
+        self._providers = [_Provider(name, client, breaker_factory()) for name, client in providers]
+        self.failovers = 0
+        self.forced = 0
+
+    def with_client(self, name: str, client: Any) -> "ProviderRouter":
+        """同样的提供方与熔断器，只替换其中一个提供方的客户端（如后续问题改用其他模型）"""
+        if name not in self.provider_names:
+            raise ValueError(f"Unknown LLM provider: {name}")
+        router = copy.copy(self)
+        router._providers = [
+            _Provider(provider.name, client if provider.name == name else provider.client, provider.breaker)
+            for provider in self._providers
+        ]
+        router.failovers = 0
+        router.forced = 0
+        return router
+
+    @property
+    def provider_names(self) -> List[str]:
+        return [provider.name for provider in self._providers]
+
+    def _candidates(self) -> Iterator[Tuple[_Provider, str]]:
+        """按优先级逐个给出放行的提供方；调用方失败后才会继续向后取，避免占用多余的探测名额
+
+        熔断的提供方只在后面还有候选时跳过，最后一个提供方总会被尝试。
+        """
+        offered = False
+        last = self._providers[-1]
+        for provider in self._providers:
+            ticket = provider.breaker.acquire()
+            if ticket is None:
+                if provider is not last:
+                    continue
+                ticket = CircuitBreaker.FORCED
+                self.forced += 1
+            if offered:
+                self.failovers += 1
+            offered = True
+            yield provider, ticket
+
+    def invoke(self, messages, **kwargs):
+        error = None
+        for provider, ticket in self._candidates():
+            start = time.monotonic()
+            try:
+                result = provider.client.invoke(messages, **kwargs)
+            except Exception as e:
+                provider.record(ticket, False, time.monotonic() - start)
+                print(f"⚠️  LLM provider {provider.name} failed: {e}")
+                error = e
+                continue
+            except BaseException:
+                provider.breaker.release(ticket)
+                raise
+            provider.record(ticket, True, time.monotonic() - start)
+            return result
+        raise error
+
+    async def ainvoke(self, messages, **kwargs):
+        error = None
+        for provider, ticket in self._candidates():
+            start = time.monotonic()
+            try:
+                result = await provider.client.ainvoke(messages, **kwargs)
+            except Exception as e:
+                provider.record(ticket, False, time.monotonic() - start)
+                print(f"⚠️  LLM provider {provider.name} failed: {e}")
+                error = e
+                continue
+            except BaseException:
+                provider.breaker.release(ticket)
+                raise
+            provider.record(ticket, True, time.monotonic() - start)
+            return result
+        raise error
+
+    async def ainvoke_stream(self, messages, **kwargs) -> AsyncGenerator[str, None]:
+        """流式调用：首个分块之前失败则转到下一个提供方，之后的错误直接抛出"""
+        error = None
+        for provider, ticket in self._candidates():
+            start = time.monotonic()
+            first_chunk_latency = None
+            try:
+                async with aclosing(provider.client.ainvoke_stream(messages, **kwargs)) as stream:
+                    async for chunk in stream:
+                        if first_chunk_latency is None:
+                            first_chunk_latency = time.monotonic() - start
+                        yield chunk
+            except Exception as e:
+                provider.record(ticket, False, time.monotonic() - start)
+                if first_chunk_latency is not None:
+                    raise
+                print(f"⚠️  LLM provider {provider.name} failed: {e}")
+                error = e
+                continue
+            except BaseException:
+                # 调用方提前结束（如客户端断开）：已有首包说明提供方正常
+                if first_chunk_latency is not None:
+                    provider.record(ticket, True, first_chunk_latency)
+                else:
+                    provider.breaker.release(ticket)
+                raise
+            provider.record(ticket, True, first_chunk_latency if first_chunk_latency is not None
+                            else time.monotonic() - start)
+            return
+        raise error
+
+    def invoke_stream(self, messages, **kwargs) -> Generator[str, None, None]:
+        """同步流式调用，转移规则同 ainvoke_stream；没有 invoke_stream 的客户端退化为整段返回"""
+        error = None
+        for provider, ticket in self._candidates():
+            start = time.monotonic()
+            first_chunk_latency = None
+            stream_fn = getattr(provider.client, "invoke_stream", None)
+            try:
+                if stream_fn is None:
+                    stream = iter([provider.client.invoke(messages, **kwargs).content])
+                else:
+                    stream = stream_fn(messages, **kwargs)
+                try:
+                    for chunk in stream:
+                        if first_chunk_latency is None:
+                            first_chunk_latency = time.monotonic() - start
+                        yield chunk
+                finally:
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        close()
+            except Exception as e:
+                provider.record(ticket, False, time.monotonic() - start)
+                if first_chunk_latency is not None:
+                    raise
+                print(f"⚠️  LLM provider {provider.name} failed: {e}")
+                error = e
+                continue
+            except BaseException:
+                if first_chunk_latency is not None:
+                    provider.record(ticket, True, first_chunk_latency)
+                else:
+                    provider.breaker.release(ticket)
+                raise
+            provider.record(ticket, True, first_chunk_latency if first_chunk_latency is not None
+                            else time.monotonic() - start)
+            return
+        raise error
+
+    def metrics(self) -> Dict[str, Any]:
+        """各提供方的熔断状态、失败率、延迟与客户端自身的指标"""
+        return {
+            "failovers": self.failovers,
+            "forced": self.forced,
+            "providers": {provider.name: provider.stats() for provider in self._providers},
+        }
+
+    def close(self) -> None:
+        for provider in self._providers:
+            close = getattr(provider.client, "close", None)
+            if close is not None:
+                close()
+
+    async def aclose(self) -> None:
+        for provider in self._providers:
+            aclose = getattr(provider.client, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency Limiter - 上游 LLM 调用的并发与速率控制
+
+- 并发窗口按 AIMD 调整：每次成功加性增长（约每一轮窗口+1），遇到 429/503 乘性减小
+- 可选令牌桶限制每秒请求数
+- 遵守上游返回的 Retry-After：暂停发放许可直到指定时间
+- 超出窗口的请求按 FIFO 排队，超过截止时间仍未拿到许可则失败，不会无限期占住请求
+- 同一个限流器同时服务异步调用（事件循环）与同步调用（线程），统计排队深度与等待时间
+"""
+
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional
+
+
+class QueueTimeoutError(Exception):
+    """排队超过截止时间仍未获得上游调用许可"""
+
+
+class QueueFullError(Exception):
+    """等待队列已满，直接拒绝"""
+
+
+class _Waiter:
+    """排队中的一个调用方；异步调用方用 asyncio.Event，同步调用方用 threading.Event"""
+
+    __slots__ = ("loop", "event", "granted", "abandoned")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop]):
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+        self.granted = False
+        self.abandoned = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class Permit:
+    """一次上游调用的许可；调用方遇到限流响应时调用 overload() 反馈给限流器"""
+
+    __slots__ = ("overloaded", "retry_after")
+
+    def __init__(self):
+        self.overloaded = False
+        self.retry_after: Optional[float] = None
+
+    def overload(self, retry_after: Optional[float] = None):
+        self.overloaded = True
+        self.retry_after = retry_after
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD 并发窗口 + 令牌桶 + Retry-After 暂停 + 带截止时间的FIFO队列，线程安全"""
+
+    def __init__(self, max_concurrency: int = 32, min_concurrency: int = 1,
+                 initial_concurrency: Optional[int] = None, rate: Optional[float] = None,
+                 burst: Optional[int] = None, decrease_factor: float = 0.5,
+                 decrease_cooldown: float = 1.0, queue_timeout: float = 10.0, max_queue: int = 1000):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.rate = rate
+        self.burst = (burst or max(1, int(math.ceil(rate)))) if rate else None
+
+        self._lock = threading.Lock()
+        self._limit = float(initial_concurrency or max_concurrency)
+        self._in_flight = 0
+        self._queue: Deque[_Waiter] = deque()
+        self._paused_until = 0.0
+        self._last_decrease = -math.inf
+        self._tokens = float(self.burst or 0)
+        self._last_refill = time.monotonic()
+
+        self.granted = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.overloads = 0
+        self.max_queue_depth = 0
+        self._wait_total = 0.0
+        self._wait_samples: Deque[float] = deque(maxlen=1024)
+
+    @classmethod
+    def from_env(cls) -> Optional["AdaptiveConcurrencyLimiter"]:
+        """读取 DEEPSEEK_MAX_CONCURRENCY 等环境变量；并发上限为0时不限流"""
+        max_concurrency = int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "32"))
+        if max_concurrency <= 0:
+            return None
+        rate = float(os.getenv("DEEPSEEK_RATE_LIMIT", "0"))
+        return cls(
+            max_concurrency=max_concurrency,
+            min_concurrency=int(os.getenv("DEEPSEEK_MIN_CONCURRENCY", "1")),
+            rate=rate if rate > 0 else None,
+            queue_timeout=float(os.getenv("DEEPSEEK_QUEUE_TIMEOUT", "10")),
+            max_queue=int(os.getenv("DEEPSEEK_MAX_QUEUE", "1000")),
+        )
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    def _delay_locked(self, now: float) -> float:
+        """距离可以发放下一个许可还需等待的秒数；0 表示现在即可，inf 表示要等有调用结束"""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._in_flight >= self.limit:
+            return math.inf
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+        return 0.0
+
+    def _take_locked(self):
+        self._in_flight += 1
+        self.granted += 1
+        if self.rate:
+            self._tokens -= 1
+
+    def _dispatch_locked(self, now: float) -> float:
+        """按 FIFO 把许可交给队首的等待者，返回队首还需等待的秒数"""
+        while self._queue:
+            if self._queue[0].abandoned:
+                self._queue.popleft()
+                continue
+            delay = self._delay_locked(now)
+            if delay > 0:
+                return delay
+            waiter = self._queue.popleft()
+            self._take_locked()
+            waiter.granted = True
+            waiter.wake()
+        return 0.0
+
+    def _try_acquire_locked(self, now: float) -> bool:
+        if not self._queue and self._delay_locked(now) == 0:
+            self._take_locked()
+            self._record_wait(0.0)
+            return True
+        if len(self._queue) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"LLM request queue is full ({self.max_queue})")
+        return False
+
+    def _enqueue_locked(self, waiter: _Waiter):
+        self._queue.append(waiter)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+
+    def _abandon_locked(self, waiter: _Waiter, now: float):
+        """等待者超时或被取消：已拿到的许可归还，否则从队列中移除"""
+        if waiter.granted:
+            self._in_flight -= 1
+            self._dispatch_locked(now)
+        else:
+            waiter.abandoned = True
+
+    def _record_wait(self, waited: float):
+        self._wait_total += waited
+        self._wait_samples.append(waited)
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        """异步获取许可，返回排队等待的秒数；超过截止时间抛出 QueueTimeoutError"""
+        start = time.monotonic()
+        with self._lock:
+            if self._try_acquire_locked(start):
+                return 0.0
+            waiter = _Waiter(asyncio.get_running_loop())
+            self._enqueue_locked(waiter)
+        deadline = start + (self.queue_timeout if timeout is None else timeout)
+
+        try:
+            while True:
+                # 先清除事件再检查，避免错过检查之后、等待之前发出的唤醒
+                waiter.event.clear()
+                now = time.monotonic()
+                with self._lock:
+                    delay = self._dispatch_locked(now)
+                if waiter.granted:
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise QueueTimeoutError(f"Waited {now - start:.1f}s for an LLM request slot")
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), min(remaining, delay))
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                self._abandon_locked(waiter, time.monotonic())
+            raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._record_wait(waited)
+        return waited
+
+    def acquire_sync(self, timeout: Optional[float] = None) -> float:
+        """同步获取许可（供线程中的同步调用使用），语义同 acquire"""
+        start = time.monotonic()
+        with self._lock:
+            if self._try_acquire_locked(start):
+                return 0.0
+            waiter = _Waiter(None)
+            self._enqueue_locked(waiter)
+        deadline = start + (self.queue_timeout if timeout is None else timeout)
+
+        try:
+            while True:
+                # 先清除事件再检查，避免错过检查之后、等待之前发出的唤醒
+                waiter.event.clear()
+                now = time.monotonic()
+                with self._lock:
+                    delay = self._dispatch_locked(now)
+                if waiter.granted:
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise QueueTimeoutError(f"Waited {now - start:.1f}s for an LLM request slot")
+                waiter.event.wait(min(remaining, delay))
+        except BaseException:
+            with self._lock:
+                self._abandon_locked(waiter, time.monotonic())
+            raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._record_wait(waited)
+        return waited
+
+    def release(self, permit: Permit, success: bool):
+        """归还许可并按结果调整窗口：成功加性增长，限流乘性减小，其他错误不调整"""
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight -= 1
+            if permit.overloaded:
+                self.overloads += 1
+                if permit.retry_after:
+                    self._paused_until = max(self._paused_until, now + permit.retry_after)
+                # 同一波限流响应只减小一次窗口
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self._limit = max(self.min_concurrency, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+            elif success:
+                self._limit = min(self.max_concurrency, self._limit + 1.0 / max(self._limit, 1.0))
+            self._dispatch_locked(now)
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None) -> AsyncIterator[Permit]:
+        await self.acquire(timeout)
+        permit = Permit()
+        success = False
+        try:
+            yield permit
+            success = True
+        finally:
+            self.release(permit, success)
+
+    @contextmanager
+    def slot_sync(self, timeout: Optional[float] = None) -> Iterator[Permit]:
+        self.acquire_sync(timeout)
+        permit = Permit()
+        success = False
+        try:
+            yield permit
+            success = True
+        finally:
+            self.release(permit, success)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            waits: List[float] = sorted(self._wait_samples)
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queue_depth": sum(1 for waiter in self._queue if not waiter.abandoned),
+                "max_queue_depth": self.max_queue_depth,
+                "paused_for": max(0.0, self._paused_until - time.monotonic()),
+                "granted": self.granted,
+                "queued": self.queued,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "overloads": self.overloads,
+                "avg_wait_ms": self._wait_total / self.granted * 1000 if self.granted else 0.0,
+                "p95_wait_ms": waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+            }
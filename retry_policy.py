@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Retry Policy - 上游 LLM 调用的重试与对冲请求
+
+- 重试：可重试的错误（连接失败、超时、5xx、429/503）按带抖动的指数退避重试，
+  服务端给出 Retry-After 时至少等待该时长；流式调用只在收到第一个分块之前重试
+- 对冲（hedging）：异步调用在对冲延迟内还没有首个分块（非流式调用即完整回复）时，
+  再发一个相同请求，先返回的胜出，另一个立即取消。对冲延迟默认取最近首包延迟的 p95，
+  只有约 5% 最慢的请求会触发对冲；对冲请求数不超过调用数的 max_hedge_ratio，
+  上游整体变慢时不会让负载翻倍
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+
+def is_retryable(error: BaseException) -> bool:
+    """默认的可重试判断：异常自带 retryable 属性（如 DeepSeekAPIError）"""
+    return bool(getattr(error, "retryable", False))
+
+
+class _LatencyWindow:
+    """最近若干次首包延迟的滑动窗口"""
+
+    def __init__(self, size: int):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class RetryPolicy:
+    """带抖动退避的重试 + 基于首包延迟分位数的对冲请求，按调用类型（invoke/stream）分别统计延迟"""
+
+    def __init__(self, max_retries: int = 2, backoff_base: float = 0.25, backoff_max: float = 4.0,
+                 hedge: bool = False, hedge_delay: Optional[float] = None, hedge_quantile: float = 0.95,
+                 hedge_min_samples: int = 20, max_hedge_ratio: float = 0.1, window: int = 512,
+                 retryable: Callable[[BaseException], bool] = is_retryable):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        # 固定对冲延迟（秒）；None 时按最近延迟的分位数自适应
+        self.fixed_hedge_delay = hedge_delay
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.retryable = retryable
+        self._window = window
+        self._latencies: Dict[str, _LatencyWindow] = {}
+        # 同一个策略被多个线程（同步调用、各自事件循环中的异步调用）共用，计数与延迟窗口都在锁内修改
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.retries = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """读取 DEEPSEEK_MAX_RETRIES / DEEPSEEK_RETRY_BACKOFF* / DEEPSEEK_HEDGE* 环境变量；对冲默认关闭"""
+        hedge_delay = float(os.getenv("DEEPSEEK_HEDGE_DELAY", "0"))
+        return cls(
+            max_retries=int(os.getenv("DEEPSEEK_MAX_RETRIES", "2")),
+            backoff_base=float(os.getenv("DEEPSEEK_RETRY_BACKOFF", "0.25")),
+            backoff_max=float(os.getenv("DEEPSEEK_RETRY_BACKOFF_MAX", "4")),
+            hedge=os.getenv("DEEPSEEK_HEDGE", "false").lower() in ("1", "true", "yes"),
+            hedge_delay=hedge_delay if hedge_delay > 0 else None,
+            hedge_quantile=float(os.getenv("DEEPSEEK_HEDGE_QUANTILE", "0.95")),
+            max_hedge_ratio=float(os.getenv("DEEPSEEK_HEDGE_MAX_RATIO", "0.1")),
+        )
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次重试前的等待秒数：全抖动指数退避，且不少于服务端要求的 Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+    def record_latency(self, kind: str, seconds: float):
+        with self._lock:
+            window = self._latencies.get(kind)
+            if window is None:
+                window = self._latencies[kind] = _LatencyWindow(self._window)
+            window.samples.append(seconds)
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """当前的对冲延迟；未开启对冲或样本不足时返回 None（不对冲）"""
+        with self._lock:
+            return self._hedge_delay_locked(kind)
+
+    def _hedge_delay_locked(self, kind: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if self.fixed_hedge_delay is not None:
+            return self.fixed_hedge_delay
+        window = self._latencies.get(kind)
+        if window is None or len(window.samples) < self.hedge_min_samples:
+            return None
+        return window.quantile(self.hedge_quantile)
+
+    def _count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def _try_hedge(self) -> bool:
+        """对冲名额未超过 max_hedge_ratio 时占用一个名额并返回 True（检查与计数在同一次加锁内）"""
+        with self._lock:
+            if self.hedges_fired >= self.max_hedge_ratio * self.calls:
+                return False
+            self.hedges_fired += 1
+            return True
+
+    def _count_hedge_won(self):
+        with self._lock:
+            self.hedges_won += 1
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt >= self.max_retries or not self.retryable(error):
+            return False
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def _delay_for(self, error: BaseException, attempt: int) -> float:
+        return self.backoff(attempt, getattr(error, "retry_after", None))
+
+    # ---- 同步调用：只重试，不对冲 ----
+
+    def call_sync(self, fn: Callable[[], Any], kind: str = "invoke") -> Any:
+        self._count_call()
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._delay_for(e, attempt))
+                attempt += 1
+                continue
+            self.record_latency(kind, time.monotonic() - start)
+            return result
+
+    def stream_sync(self, factory: Callable[[], Iterator[str]], kind: str = "stream") -> Iterator[str]:
+        """收到第一个分块之前失败则重试；之后的错误直接抛给调用方"""
+        self._count_call()
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            source = factory()
+            try:
+                first = next(source)
+            except StopIteration:
+                return
+            except Exception as e:
+                source.close()
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._delay_for(e, attempt))
+                attempt += 1
+                continue
+            break
+
+        self.record_latency(kind, time.monotonic() - start)
+        try:
+            yield first
+            yield from source
+        finally:
+            source.close()
+
+    # ---- 异步调用：重试 + 对冲 ----
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], kind: str = "invoke") -> Any:
+        self._count_call()
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged_call(fn, kind)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._delay_for(e, attempt))
+                attempt += 1
+
+    async def _timed(self, fn: Callable[[], Awaitable[Any]], kind: str) -> Any:
+        start = time.monotonic()
+        result = await fn()
+        self.record_latency(kind, time.monotonic() - start)
+        return result
+
+    async def _hedged_call(self, fn: Callable[[], Awaitable[Any]], kind: str) -> Any:
+        delay = self.hedge_delay(kind)
+        primary = asyncio.ensure_future(self._timed(fn, kind))
+        tasks = [primary]
+        try:
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._try_hedge():
+                tasks.append(asyncio.ensure_future(self._timed(fn, kind)))
+
+            # 先成功的胜出；一个失败时继续等另一个，全部失败时抛出最后一个错误
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count_hedge_won()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def stream(self, factory: Callable[[], AsyncIterator[str]], kind: str = "stream") -> AsyncIterator[str]:
+        """流式调用：首个分块之前可重试、可对冲；胜出的流继续输出，其余流立即关闭"""
+        self._count_call()
+        attempt = 0
+        while True:
+            try:
+                opened = await self._open_stream(factory, kind)
+                break
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._delay_for(e, attempt))
+                attempt += 1
+
+        if opened is None:
+            return
+        source, first = opened
+        try:
+            yield first
+            async for chunk in source:
+                yield chunk
+        finally:
+            await source.aclose()
+
+    async def _open_stream(self, factory: Callable[[], AsyncIterator[str]],
+                           kind: str) -> Optional[Tuple[AsyncIterator[str], str]]:
+        """启动上游流并等待首个分块，返回 (流, 首个分块)；空流返回 None"""
+        delay = self.hedge_delay(kind)
+        start = time.monotonic()
+        # 每个尝试：(流, 读取首个分块的任务)
+        attempts: List[Tuple[AsyncIterator[str], asyncio.Future]] = []
+
+        def launch():
+            source = factory()
+            attempts.append((source, asyncio.ensure_future(source.__anext__())))
+
+        winner = None
+        launch()
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait([attempts[0][1]], timeout=delay)
+                if not done and self._try_hedge():
+                    launch()
+
+            pending = {task for _, task in attempts}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for index, (source, task) in enumerate(attempts):
+                    if task not in done or winner is not None:
+                        continue
+                    exception = task.exception()
+                    if exception is None or isinstance(exception, StopAsyncIteration):
+                        winner = index
+                    else:
+                        error = exception
+                if winner is not None:
+                    break
+            if winner is None:
+                raise error
+
+            self.record_latency(kind, time.monotonic() - start)
+            if winner > 0:
+                self._count_hedge_won()
+            source, task = attempts[winner]
+            if isinstance(task.exception(), StopAsyncIteration):
+                return None
+            return source, task.result()
+        finally:
+            # 关闭未胜出的流：先取消正在读取首个分块的任务，再关闭生成器释放连接
+            cancelled = False
+            for index, (source, task) in enumerate(attempts):
+                if index == winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    # 调用方自身在清理期间被取消（如客户端断开）：关闭其余流后继续向上抛出
+                    if asyncio.current_task().cancelling():
+                        cancelled = True
+                except Exception:
+                    pass
+                await source.aclose()
+            if cancelled:
+                raise asyncio.CancelledError()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            delays = {kind: self._hedge_delay_locked(kind) for kind in self._latencies}
+            p95 = {kind: window.quantile(0.95) for kind, window in self._latencies.items() if window.samples}
+            calls, retries, hedges_fired, hedges_won = self.calls, self.retries, self.hedges_fired, self.hedges_won
+        return {
+            "calls": calls,
+            "retries": retries,
+            "hedges_fired": hedges_fired,
+            "hedges_won": hedges_won,
+            "hedge_win_rate": hedges_won / hedges_fired if hedges_fired else 0.0,
+            **{f"{kind}_hedge_delay_ms": delay * 1000 for kind, delay in delays.items() if delay is not None},
+            **{f"{kind}_p95_ms": latency * 1000 for kind, latency in p95.items()},
+        }
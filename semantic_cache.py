@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Semantic Advice Cache - 近似问题的建议缓存
+
+用户问题常常只是措辞不同。这里用意图路由器的分词器把问题表示为本地 TF-IDF 稀疏向量，
+同一意图内余弦相似度超过阈值时直接复用已生成的 advice_result / follow_up_questions。
+
+索引是按 (意图, 词) 组织的倒排表，使用前缀过滤只索引每个条目权重最高的几个词：
+条目的词按权重从高到低排列，取到剩余词的模长不足阈值倍的向量模长为止。由柯西-施瓦茨
+不等式，与条目余弦相似度达到阈值的问题必然包含其前缀中的某个词，因此用问题的词查倒排表
+即可找全候选，再逐个精确计算相似度。常见词（"我""什么""建议"）很少进入前缀，
+倒排链保持很短，条目增长到数十万时单次查询开销依旧很小。
+
+条目只保存词频权重（1 + log tf）。IDF 随条目增减不断变化，每次比较时都用当前的文档频率
+同时加权问题与候选条目，相似度不取决于条目插入的先后。前缀在插入时按当时的权重选出，
+之后 IDF 的变化只会让前缀过滤略有遗漏（少命中），不会造成错误命中。
+
+前缀依赖阈值，阈值只能在创建缓存时设置。
+"""
+
+import os
+import math
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from intent_router import normalize_query
+
+
+class SemanticAdviceCache:
+    """按意图分区的近似问题缓存，线程安全"""
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 200000, tokenizer=None,
+                 max_postings: int = 50000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # 倒排链超过该长度时跳过（只会漏掉命中，不会错误命中）
+        self.max_postings = max_postings
+        self._tokenizer = tokenizer
+        self._lock = threading.Lock()
+        # 条目: id -> (意图, 词频权重, 前缀词, 缓存的建议)，按插入/命中顺序维护LRU
+        self._entries: "OrderedDict[int, Tuple[str, Dict[str, float], List[str], Dict[str, Any]]]" = OrderedDict()
+        # 倒排表: (意图, 前缀词) -> 条目id集合
+        self._postings: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+        # 全局文档频率，用于 IDF
+        self._doc_freq: Dict[str, int] = defaultdict(int)
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["SemanticAdviceCache"]:
+        """读取 SEMANTIC_CACHE* 环境变量；缓存默认关闭，SEMANTIC_CACHE=true 时开启"""
+        if os.getenv("SEMANTIC_CACHE", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "200000")),
+        )
+
+    @property
+    def tokenizer(self):
+        """默认复用进程级意图路由器的分词器（已按意图目录初始化）"""
+        if self._tokenizer is None:
+            from intent_router import get_intent_router
+            self._tokenizer = get_intent_router().tokenizer
+        return self._tokenizer
+
+    def _term_counts(self, question: str) -> Dict[str, int]:
+        counts: Dict[str, int] = defaultdict(int)
+        for token in self.tokenizer.cut(normalize_query(question)):
+            if token.strip():
+                counts[token] += 1
+        return counts
+
+    def _idf(self, term: str) -> float:
+        # 平滑IDF，未出现过的词取最大值
+        return math.log((1 + len(self._entries)) / (1 + self._doc_freq.get(term, 0))) + 1.0
+
+    @staticmethod
+    def _tf(counts: Dict[str, int]) -> Dict[str, float]:
+        return {term: 1 + math.log(count) for term, count in counts.items()}
+
+    def _weights(self, tf: Dict[str, float]) -> Tuple[Dict[str, float], float]:
+        """按当前 IDF 加权（调用方持有 self._lock）"""
+        weights = {term: value * self._idf(term) for term, value in tf.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return weights, norm
+
+    def _prefix(self, weights: Dict[str, float], norm: float) -> List[str]:
+        """按权重从高到低取词，直到剩余词的模长小于 阈值 * 向量模长"""
+        bound = (self.threshold * norm) ** 2
+        remaining = norm * norm
+        prefix = []
+        for term in sorted(weights, key=weights.get, reverse=True):
+            if remaining < bound:
+                break
+            prefix.append(term)
+            remaining -= weights[term] ** 2
+        return prefix
+
+    def lookup(self, question: str, intent: str) -> Optional[Dict[str, Any]]:
+        """查找同一意图内相似度达到阈值的已缓存问题，返回缓存的建议（附带 similarity）"""
+        counts = self._term_counts(question)
+        with self._lock:
+            match = self._best_match(counts, intent)
+            if match is None:
+                self.misses += 1
+                return None
+            entry_id, similarity = match
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return {**self._entries[entry_id][3], "similarity": similarity}
+
+    def _best_match(self, counts: Dict[str, int], intent: str) -> Optional[Tuple[int, float]]:
+        # 调用方持有 self._lock
+        if not counts or not self._entries:
+            return None
+        weights, norm = self._weights(self._tf(counts))
+        if norm == 0:
+            return None
+
+        candidates: Set[int] = set()
+        for term in weights:
+            postings = self._postings.get((intent, term))
+            if postings and len(postings) <= self.max_postings:
+                candidates.update(postings)
+
+        best_id, best_similarity = None, self.threshold
+        for entry_id in candidates:
+            # 条目与问题使用同一份当前 IDF
+            doc_weights, doc_norm = self._weights(self._entries[entry_id][1])
+            dot = sum(weight * doc_weights.get(term, 0.0) for term, weight in weights.items())
+            similarity = dot / (norm * doc_norm)
+            if similarity >= best_similarity:
+                best_id, best_similarity = entry_id, similarity
+        if best_id is None:
+            return None
+        return best_id, min(best_similarity, 1.0)
+
+    def add(self, question: str, intent: str, advice_result: str, follow_up_questions: List[str]):
+        """缓存一条生成的建议；已存在近似问题时不重复添加"""
+        counts = self._term_counts(question)
+        if not counts:
+            return
+        with self._lock:
+            if self._best_match(counts, intent) is not None:
+                return
+
+            for term in counts:
+                self._doc_freq[term] += 1
+            tf = self._tf(counts)
+            prefix = self._prefix(*self._weights(tf))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (intent, tf, prefix, {
+                "advice_result": advice_result,
+                "follow_up_questions": list(follow_up_questions or []),
+            })
+            for term in prefix:
+                self._postings[(intent, term)].add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        # 调用方持有 self._lock
+        entry_id, (intent, tf, prefix, _) = self._entries.popitem(last=False)
+        for term in prefix:
+            postings = self._postings[(intent, term)]
+            postings.discard(entry_id)
+            if not postings:
+                del self._postings[(intent, term)]
+        for term in tf:
+            self._doc_freq[term] -= 1
+            if not self._doc_freq[term]:
+                del self._doc_freq[term]
+        self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+            self._doc_freq.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "terms": len(self._doc_freq),
+                "postings": sum(len(postings) for postings in self._postings.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
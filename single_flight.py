@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Single Flight - 合并相同的并发 LLM 请求
+
+热门问题突增时，大量并发请求会同时向上游发送完全相同的提示词。这里按请求体哈希
+合并进行中的相同请求：只有第一个请求（leader）真正调用上游，其余请求共享其结果。
+流式请求由后台任务读取上游，并把每个分块分发给所有订阅者；中途加入的订阅者先回放
+已收到的分块，再继续接收新分块。所有订阅者都离开时取消上游请求。
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+class _StreamFlight:
+    """一次进行中的上游流式请求及其订阅者"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # 唤醒当前所有等待者，后续等待使用新的 Event
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def pump(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """按键合并进行中的相同调用（普通调用共享结果，流式调用共享分块）
+
+    只在单个事件循环内合并；键由调用方保证唯一表示一次上游请求。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def call(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """相同键的并发调用只执行一次 fn，所有调用方得到同一个结果或异常"""
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+
+            def forget(_):
+                if self._calls.get(key) is task:
+                    del self._calls[key]
+
+            task.add_done_callback(forget)
+        else:
+            self.followers += 1
+        # shield：某个调用方被取消时，不影响其他仍在等待的调用方
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, source_factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """相同键的并发流式调用共享一个上游流，每个订阅者收到完整的分块序列"""
+        flight = self._streams.get(key)
+        if flight is None:
+            self.leaders += 1
+            flight = _StreamFlight()
+            flight.task = asyncio.ensure_future(flight.pump(source_factory()))
+            self._streams[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.followers += 1
+
+        flight.subscribers += 1
+        subscription = flight.subscribe()
+        try:
+            async for chunk in subscription:
+                yield chunk
+        finally:
+            await subscription.aclose()
+            flight.subscribers -= 1
+            # 所有订阅者都已离开（如客户端断开），没有必要继续消耗上游 token
+            if flight.subscribers == 0 and not flight.done:
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _StreamFlight):
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._streams)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": self.in_flight(),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesce_rate": self.followers / total if total else 0.0,
+        }
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+SSE Parser - DeepSeek 流式响应的增量解析
+
+直接在网络读到的字节块上工作：按 SSE 规范切分行（\\n、\\r\\n、\\r，且跨块的 \\r\\n 也能正确识别），
+半截的行留在缓冲区等下一块，多行 data 字段按规范用换行拼接后再作为一个事件交给 JSON 解码。
+不逐行解码为 str；安装了 orjson 时用它直接解码字节，否则使用标准库 json。
+"""
+
+import json
+from typing import List, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+_raw_decode = json.JSONDecoder().raw_decode
+
+
+def _json_loads(payload: bytes):
+    """标准库解码：先转为 str（json.loads 直接处理 bytes 时要逐次探测编码），
+    raw_decode 省去首尾空白的正则匹配，失败时再交给 json.loads 按完整规则处理"""
+    text = payload.decode("utf-8")
+    try:
+        return _raw_decode(text)[0]
+    except ValueError:
+        return json.loads(text)
+
+
+if orjson is not None:
+    loads = orjson.loads
+    JSON_BACKEND = "orjson"
+else:
+    loads = _json_loads
+    JSON_BACKEND = "json"
+
+DONE = b"[DONE]"
+
+
+class SSEParser:
+    """增量 SSE 解析器：feed() 输入任意切分的字节块，返回其中已完整的事件的 data 字段"""
+
+    __slots__ = ("_buffer", "_skip_lf")
+
+    def __init__(self):
+        # 尚未以空行结束的事件（可能是半截的行）
+        self._buffer = b""
+        # 上一块以 \r 结尾时，下一块开头的 \n 属于同一个换行
+        self._skip_lf = False
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        if self._skip_lf:
+            self._skip_lf = False
+            if chunk[:1] == b"\n":
+                chunk = chunk[1:]
+        buffer = self._buffer + chunk if self._buffer else chunk
+        if b"\r" in buffer:
+            # 少见的 \r\n / \r 换行统一为 \n
+            if buffer[-1:] == b"\r":
+                self._skip_lf = True
+            buffer = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        # 事件以空行结束；最后一段还没结束，留到下一块
+        blocks = buffer.split(b"\n\n")
+        self._buffer = blocks.pop()
+        events = []
+        for block in blocks:
+            if block[:6] == b"data: " and b"\n" not in block:
+                # 常见情况：单行 data 事件
+                events.append(block[6:])
+            elif block:
+                # 多行 data 按规范用换行拼接；注释行（":" 开头）与 event/id/retry 字段不影响补全内容
+                data = [line[6:] if line[:6] == b"data: " else line[5:]
+                        for line in block.split(b"\n") if line[:5] == b"data:"]
+                if data:
+                    events.append(b"\n".join(data))
+        return events
+
+
+def parse_delta(payload: bytes) -> Optional[str]:
+    """从一个 chat.completion.chunk 事件中取出增量内容；无效 JSON 或没有内容时返回 None"""
+    try:
+        chunk = loads(payload)
+        return chunk["choices"][0]["delta"].get("content") or None
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+class DeltaDecoder:
+    """字节块 -> 增量内容；收到 [DONE] 后忽略其余数据（调用方仍应读完响应以便连接归还连接池）"""
+
+    __slots__ = ("parser", "done")
+
+    def __init__(self):
+        self.parser = SSEParser()
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[str]:
+        if self.done:
+            return []
+        contents = []
+        for payload in self.parser.feed(chunk):
+            if payload == DONE:
+                self.done = True
+                break
+            content = parse_delta(payload)
+            if content:
+                contents.append(content)
+        return contents
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Test DeepSeek LLM client against a local stub server
+"""
+
+import asyncio
+
+from langchain_core.messages import AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
+
+from deepseek_llm import DeepSeekLLM, serialize_messages
+from deepseek_stub_server import DeepSeekStubServer
+from llm_cache import ResponseCache
+
+MESSAGES = [SystemMessage(content="你是健康顾问"), HumanMessage(content="我想减肥，有什么建议吗？")]
+
+
+def _llm(server: DeepSeekStubServer, **kwargs) -> DeepSeekLLM:
+    return DeepSeekLLM(api_key="test-key", base_url=server.base_url, **kwargs)
+
+
+def test_serialize_messages():
+    """消息转换：子类按父类映射，不支持的类型被跳过"""
+    messages = MESSAGES + [AIMessageChunk(content="好的"), ToolMessage(content="{}", tool_call_id="1")]
+    assert serialize_messages(messages) == [
+        {"role": "system", "content": "你是健康顾问"},
+        {"role": "user", "content": "我想减肥，有什么建议吗？"},
+        {"role": "assistant", "content": "好的"},
+    ]
+
+
+def test_sync_calls_reuse_connection():
+    """同步调用复用实例级 keep-alive 会话"""
+    print("🧪 测试同步调用连接复用")
+    with DeepSeekStubServer() as server:
+        llm = _llm(server)
+        try:
+            responses = [llm.invoke(MESSAGES).content for _ in range(5)]
+            chunks = list(llm.invoke_stream(MESSAGES))
+            text = llm._call("你好", stop=["。"])
+        finally:
+            llm.close()
+
+    assert responses == ["".join(server.chunks)] * 5
+    assert chunks == server.chunks
+    assert text == "".join(server.chunks)
+    assert server.last_payload["stop"] == ["。"]
+    assert server.connection_count == 1
+    print(f"✅ {server.request_count} 次请求共用 {server.connection_count} 个连接")
+
+
+def test_ainvoke_and_stream():
+    """异步调用与流式调用返回桩服务的内容"""
+    print("🧪 测试异步调用")
+    with DeepSeekStubServer() as server:
+        llm = _llm(server)
+
+        async def run():
+            try:
+                response = await llm.ainvoke(MESSAGES)
+                chunks = [chunk async for chunk in llm.ainvoke_stream(MESSAGES)]
+                return response, chunks
+            finally:
+                await llm.aclose()
+
+        response, chunks = asyncio.run(run())
+
+    assert response.content == "".join(server.chunks)
+    assert chunks == server.chunks
+    assert server.last_payload["stream"] is True
+    assert [m["role"] for m in server.last_payload["messages"]] == ["system", "user"]
+    print(f"✅ 流式返回 {len(chunks)} 个块")
+
+
+def test_new_event_loop_closes_stale_session():
+    """每次 asyncio.run 使用新的事件循环：重建会话时关闭旧循环留下的会话与连接池"""
+    with DeepSeekStubServer() as server:
+        llm = _llm(server, coalesce=False)
+
+        async def call():
+            await llm.ainvoke(MESSAGES)
+            return llm._async_session
+
+        first = asyncio.run(call())
+        assert not first.closed
+        second = asyncio.run(call())
+        assert second is not first and first.closed
+        asyncio.run(llm.aclose())
+    assert second.closed
+
+
+def test_concurrent_streams_share_pool():
+    """并发流互不阻塞，且复用连接池中的 keep-alive 连接"""
+    print("🧪 测试并发流式调用")
+    streams, pool_size = 20, 5
+    with DeepSeekStubServer(chunk_delay=0.02) as server:
+        llm = _llm(server, pool_size=pool_size, coalesce=False)
+
+        async def consume():
+            return "".join([chunk async for chunk in llm.ainvoke_stream(MESSAGES)])
+
+        async def run():
+            try:
+                return await asyncio.gather(*(consume() for _ in range(streams)))
+            finally:
+                await llm.aclose()
+
+        results = asyncio.run(run())
+
+    assert all(result == "".join(server.chunks) for result in results)
+    assert server.connection_count <= pool_size
+    # 连接池占满：各流同时在服务端处理，而不是逐个排队
+    assert server.max_active == pool_size
+    print(f"✅ {streams} 个流最多 {server.max_active} 个同时进行，连接数 {server.connection_count}")
+
+
+def test_response_cache_replays_streams():
+    """命中缓存时不再请求上游，流式回复按原始分块回放"""
+    print("🧪 测试响应缓存")
+    with DeepSeekStubServer() as server:
+        llm = _llm(server, cache=ResponseCache())
+        try:
+            first = list(llm.invoke_stream(MESSAGES))
+            assert list(llm.invoke_stream(MESSAGES)) == first == server.chunks
+            assert llm.invoke(MESSAGES).content == "".join(server.chunks)
+
+            async def run():
+                try:
+                    chunks = [chunk async for chunk in llm.ainvoke_stream(MESSAGES)]
+                    response = await llm.ainvoke(MESSAGES)
+                    return chunks, response
+                finally:
+                    await llm.aclose()
+
+            chunks, response = asyncio.run(run())
+            assert chunks == server.chunks and response.content == "".join(server.chunks)
+            assert server.request_count == 1
+
+            # 中途放弃的流不写入缓存
+            other = [HumanMessage(content="我想增肌")]
+            stream = llm.invoke_stream(other)
+            next(stream)
+            stream.close()
+            list(llm.invoke_stream(other))
+            assert server.request_count == 3
+
+            # 非确定性温度不缓存
+            hot = _llm(server, cache=llm.cache, temperature=0.7)
+            hot.invoke(MESSAGES)
+            hot.invoke(MESSAGES)
+            assert server.request_count == 5
+            hot.close()
+        finally:
+            llm.close()
+    print(f"✅ 缓存统计: {llm.cache.stats()}")
+
+
+def test_identical_concurrent_requests_coalesce():
+    """相同的并发请求只发送一次上游请求，每个流式调用方都收到完整分块"""
+    print("🧪 测试相同请求合并")
+    with DeepSeekStubServer(chunk_delay=0.01) as server:
+        llm = _llm(server)
+
+        async def consume():
+            return [chunk async for chunk in llm.ainvoke_stream(MESSAGES)]
+
+        async def run():
+            try:
+                streams = await asyncio.gather(*(consume() for _ in range(10)))
+                responses = await asyncio.gather(*(llm.ainvoke(MESSAGES) for _ in range(10)))
+                return streams, responses
+            finally:
+                await llm.aclose()
+
+        streams, responses = asyncio.run(run())
+
+    assert streams == [server.chunks] * 10
+    assert [response.content for response in responses] == ["".join(server.chunks)] * 10
+    assert server.request_count == 2
+    assert llm.coalesce_stats()["followers"] == 18
+    print(f"✅ 20 个调用只请求上游 {server.request_count} 次")
+
+
+if __name__ == "__main__":
+    test_serialize_messages()
+    test_sync_calls_reuse_connection()
+    test_ainvoke_and_stream()
+    test_new_event_loop_closes_stale_session()
+    test_concurrent_streams_share_pool()
+    test_response_cache_replays_streams()
+    test_identical_concurrent_requests_coalesce()
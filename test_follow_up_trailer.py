@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test incremental splitting of the follow-up question trailer
+"""
+
+import random
+
+from follow_up_trailer import FOLLOW_UP_MARKER, TrailerSplitter, parse_follow_up_questions
+
+ADVICE = "每天快走30分钟。<<<注意>>>循序渐进，避免受伤。\n"
+TRAILER = '\n["您每周能运动几次？", "有没有关节不适？"]'
+OUTPUT = ADVICE + FOLLOW_UP_MARKER + TRAILER
+
+
+def _split(pieces):
+    splitter = TrailerSplitter()
+    advice = [splitter.feed(piece) for piece in pieces]
+    advice.append(splitter.finish())
+    return "".join(advice), splitter
+
+
+def test_arbitrary_chunk_boundaries():
+    """分隔符被切在任意位置时，正文不会带出分隔符的片段，尾部完整"""
+    print("🧪 测试后续问题尾部的增量切分")
+    rng = random.Random(0)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(OUTPUT)), 6))
+        pieces = [OUTPUT[a:b] for a, b in zip([0] + cuts, cuts + [len(OUTPUT)])]
+        advice, splitter = _split(pieces)
+        assert advice == ADVICE
+        assert splitter.found and splitter.trailer == TRAILER
+    advice, splitter = _split([OUTPUT[i] for i in range(len(OUTPUT))])
+    assert advice == ADVICE and splitter.trailer == TRAILER
+    print("✅ 各种切分下正文与尾部一致")
+
+
+def test_missing_marker_and_held_back_text():
+    """没有分隔符时全部是正文；疑似分隔符开头的片段在流结束时补回"""
+    splitter = TrailerSplitter()
+    assert splitter.feed("多喝水<<<FOLL") == "多喝水"
+    assert splitter.feed("OW") == ""
+    assert splitter.finish() == "<<<FOLLOW"
+    assert not splitter.found and splitter.trailer == ""
+
+
+def test_parse_follow_up_questions():
+    """解析 JSON 数组，容忍代码块与多余文字，无法解析时返回 None"""
+    assert parse_follow_up_questions(TRAILER) == ["您每周能运动几次？", "有没有关节不适？"]
+    assert parse_follow_up_questions('```json\n["a?", " ", 3, "b?"]\n```') == ["a?", "b?"]
+    assert parse_follow_up_questions("") is None
+    assert parse_follow_up_questions('["a?"') is None
+    assert parse_follow_up_questions("[]") is None
+
+
+if __name__ == "__main__":
+    test_arbitrary_chunk_boundaries()
+    test_missing_marker_and_held_back_text()
+    test_parse_follow_up_questions()
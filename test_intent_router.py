@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Test Intent Router
+"""
+
+import os
+import json
+import random
+import re
+import tempfile
+import threading
+
+from rank_bm25 import BM25Okapi
+
+from intent_router import (
+    DEFAULT_INTENT_CATALOG_PATH,
+    DEFAULT_INTENT_PATTERNS,
+    DEFAULT_INTENT_WEIGHTS,
+    CascadeConfig,
+    IntentRouter,
+    InvertedBM25Index,
+    IntentRouterRegistry,
+    MultiPatternMatcher,
+    RouteCache,
+    TrieTokenizer,
+    analyze_intent_advanced,
+    create_tokenizer,
+    get_intent_router,
+    load_intent_catalog,
+    normalize_query,
+)
+
+TEST_CASES = [
+    "我想减肥，有什么建议吗？",
+    "我需要运动指导，包括适合我的运动类型",
+    "我最近感觉很焦虑，睡眠质量不好",
+    "我想了解如何改善整体健康状况",
+]
+
+
+def test_registry_builds_router_once():
+    """测试注册表在并发访问下只构建一个路由器"""
+    registry = IntentRouterRegistry()
+    routers = []
+
+    def worker():
+        routers.append(registry.get())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(router) for router in routers}) == 1
+    assert registry.warm_up() is routers[0]
+
+
+def test_analyze_intent_uses_shared_router():
+    """测试高级意图分析复用进程级路由器"""
+    shared = get_intent_router()
+    for text in TEST_CASES:
+        result = analyze_intent_advanced(text)
+        assert result["all_scores"] == shared.route_intent(normalize_query(text))[2]
+    assert get_intent_router() is shared
+    assert analyze_intent_advanced(TEST_CASES[0])["primary_intent"] == "diet"
+    assert analyze_intent_advanced(TEST_CASES[2])["primary_intent"] == "mental_health"
+
+
+def _reference_scores(intent_patterns, text):
+    """逐个关键词 in / 逐个模板 re.findall 的原始实现，作为对照"""
+    text_lower = text.lower()
+    keyword_scores = {}
+    regex_scores = {}
+    for intent, patterns in intent_patterns.items():
+        keyword_scores[intent] = float(sum(1 for kw in patterns["keywords"] if kw in text_lower))
+        regex_scores[intent] = float(sum(
+            len(re.findall(pattern, text, re.IGNORECASE)) for pattern in patterns["regex_patterns"]
+        ))
+    return keyword_scores, regex_scores
+
+
+def test_matcher_matches_reference_scores():
+    """测试单次扫描匹配器与逐个匹配的得分完全一致（含重叠、大小写与非字面量正则）"""
+    intent_patterns = {
+        "strength": {
+            "keywords": ["力量", "力量训练", "训练", "哈", "BMI", "bmi", "力量"],
+            "regex_patterns": ["哈哈|哈", "训练|力量训练", "力量训练|训练", "BMI|体重", "哈哈哈"],
+        },
+        "other": {
+            "keywords": ["哈哈", "练"],
+            "regex_patterns": ["练|训", "(减肥)+"],
+        },
+    }
+    matcher = MultiPatternMatcher(intent_patterns)
+    alphabet = list("力量训练哈减肥体重BMIbmi İK")
+    rng = random.Random(42)
+    for _ in range(3000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 16)))
+        assert matcher.score(text) == _reference_scores(intent_patterns, text), text
+
+    router = get_intent_router()
+    for text in TEST_CASES:
+        keyword_scores, regex_scores = router.matcher.score(text)
+        assert (keyword_scores, regex_scores) == _reference_scores(router.intent_patterns, text)
+        assert router._keyword_match(text) == keyword_scores
+        assert router._regex_match(text) == regex_scores
+
+
+def test_route_intents_matches_route_intent():
+    """测试批量路由与逐条路由结果一致"""
+    router = get_intent_router()
+    rng = random.Random(7)
+    alphabet = list("减肥瘦身饮食营养运动健身跑步心理焦虑睡眠失眠健康养生体检我想了解，？ |")
+    texts = TEST_CASES + ["", TEST_CASES[0]] + [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 24))) for _ in range(200)
+    ]
+
+    batch = router.route_intents(texts)
+    assert len(batch) == len(texts)
+    for text, (intent, confidence, scores) in zip(texts, batch):
+        expected_intent, expected_confidence, expected_scores = router.route_intent(text)
+        assert intent == expected_intent, text
+        assert abs(confidence - expected_confidence) < 1e-9
+        assert scores.keys() == expected_scores.keys()
+        for name, score in scores.items():
+            assert abs(score - expected_scores[name]) < 1e-9
+    assert router.route_intents([]) == []
+
+
+def test_index_artifact_round_trip():
+    """测试预编译索引产物加载后路由结果不变，且过期产物会被拒绝"""
+    router = get_intent_router()
+    with tempfile.TemporaryDirectory() as path:
+        router.save_index(path)
+        loaded = IntentRouter.load_index(path, expected_fingerprint=router.fingerprint)
+        for text in TEST_CASES + ["焦虑|压力 睡眠"]:
+            assert loaded.route_intent(text) == router.route_intent(text)
+        assert loaded.route_intents(TEST_CASES) == router.route_intents(TEST_CASES)
+
+        registry = IntentRouterRegistry(index_path=path)
+        assert registry.get().fingerprint == router.fingerprint
+
+        try:
+            IntentRouter.load_index(path, expected_fingerprint="stale")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("过期索引应被拒绝")
+
+    # 产物缺失时注册表退回现场构建
+    missing = IntentRouterRegistry(index_path=os.path.join(tempfile.gettempdir(), "missing-intent-index"))
+    assert missing.get().route_intent(TEST_CASES[0])[0] == "diet"
+
+
+def test_trie_tokenizer():
+    """测试字典树分词器：前向最大匹配、可通过配置选择、可随索引产物保存"""
+    tokenizer = TrieTokenizer(["力量", "力量训练", "训练", "减肥"])
+    assert tokenizer.cut("我想做力量训练来减肥") == ["我", "想", "做", "力量训练", "来", "减肥"]
+    assert tokenizer.cut("") == []
+    assert isinstance(create_tokenizer("trie"), TrieTokenizer)
+
+    router = IntentRouter(tokenizer=create_tokenizer("trie"))
+    assert "卡路里" in router.tokenizer.vocabulary
+    expected = ["diet", "exercise", "mental_health", "general_wellness"]
+    assert [router.route_intent(text)[0] for text in TEST_CASES] == expected
+    assert router.fingerprint != get_intent_router().fingerprint
+
+    with tempfile.TemporaryDirectory() as path:
+        router.save_index(path)
+        assert not os.path.exists(os.path.join(path, "jieba.cache"))
+        loaded = IntentRouter.load_index(path, expected_fingerprint=router.fingerprint)
+        assert isinstance(loaded.tokenizer, TrieTokenizer)
+        assert loaded.route_intents(TEST_CASES) == router.route_intents(TEST_CASES)
+
+
+def test_cascade_early_exit():
+    """测试级联路由：关键词明确时跳过BM25，含糊时走完全部阶段，并记录各阶段计数"""
+    full = IntentRouter(cascade=None)
+    router = IntentRouter(cascade=CascadeConfig())
+
+    intent, confidence, scores = router.route_intent("减肥 减重 瘦身")
+    assert intent == "diet" and confidence == 1.0
+    assert router.cascade_stats()["keyword"]["count"] == 1
+
+    ambiguous = "我想了解一下"
+    assert router.route_intent(ambiguous) == full.route_intent(ambiguous)
+    stats = router.cascade_stats()
+    assert stats["bm25"]["count"] == 1
+    assert abs(sum(item["ratio"] for item in stats.values()) - 1.0) < 1e-9
+
+    for text in TEST_CASES:
+        assert router.route_intent(text)[0] == full.route_intent(text)[0]
+
+
+def test_catalog_hot_reload():
+    """测试意图目录从文件加载、增量热更新、非法目录保留旧路由器"""
+    assert load_intent_catalog(DEFAULT_INTENT_CATALOG_PATH) == (DEFAULT_INTENT_PATTERNS, DEFAULT_INTENT_WEIGHTS)
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, "catalog.json")
+        catalog = {"intent_patterns": DEFAULT_INTENT_PATTERNS, "intent_weights": DEFAULT_INTENT_WEIGHTS}
+        with open(catalog_path, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, ensure_ascii=False)
+
+        registry = IntentRouterRegistry(index_path="", catalog_path=catalog_path)
+        old_router = registry.warm_up()
+        assert registry.reload() is False
+        assert registry.get() is old_router
+        assert old_router.route_intent("我想学普拉提")[0] != "exercise"
+
+        # 新增关键词：只有被修改的文档需要重新分词
+        cut_calls = []
+        original_cut = old_router.tokenizer.cut
+        old_router.tokenizer.cut = lambda text: cut_calls.append(text) or original_cut(text)
+        try:
+            updated = json.loads(json.dumps(catalog))
+            updated["intent_patterns"]["exercise"]["keywords"].append("普拉提")
+            with open(catalog_path, "w", encoding="utf-8") as f:
+                json.dump(updated, f, ensure_ascii=False)
+            assert registry.reload() is True
+        finally:
+            del old_router.tokenizer.cut
+        assert cut_calls == [" ".join(updated["intent_patterns"]["exercise"]["keywords"]), "预热"]
+
+        new_router = registry.get()
+        assert new_router is not old_router
+        assert new_router.route_cache is not old_router.route_cache
+        assert new_router.route_intent("我想学普拉提")[0] == "exercise"
+        assert old_router.route_intent("我想学普拉提")[0] != "exercise"
+
+        with open(catalog_path, "w", encoding="utf-8") as f:
+            json.dump({"intent_patterns": {"diet": {"keywords": ["减肥"], "regex_patterns": ["("]}}}, f)
+        os.utime(catalog_path, (0, 0))
+        assert registry.reload_if_changed() is False
+        assert registry.get() is new_router
+
+
+def test_catalog_without_weights():
+    """目录没有 intent_weights 时使用默认权重，预编译产物可以加载，未变化的目录不会重建"""
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, "catalog.json")
+        index_path = os.path.join(directory, "index")
+        with open(catalog_path, "w", encoding="utf-8") as f:
+            json.dump({"intent_patterns": DEFAULT_INTENT_PATTERNS}, f, ensure_ascii=False)
+        assert load_intent_catalog(catalog_path)[1] == DEFAULT_INTENT_WEIGHTS
+
+        IntentRouterRegistry(index_path="", catalog_path=catalog_path).get().save_index(index_path)
+        # 记录从产物加载的路由器：指纹不一致时 load_index 抛出异常，注册表会改为现场构建
+        loaded = []
+        load_index = IntentRouter.__dict__["load_index"]
+        IntentRouter.load_index = classmethod(
+            lambda cls, *args, **kwargs: loaded.append(load_index.__func__(cls, *args, **kwargs)) or loaded[-1]
+        )
+        try:
+            registry = IntentRouterRegistry(index_path=index_path, catalog_path=catalog_path)
+            router = registry.get()
+        finally:
+            IntentRouter.load_index = load_index
+        assert loaded == [router]
+        assert registry.reload() is False
+        assert registry.get() is router
+
+
+def test_invalid_catalog_shapes():
+    """目录文件结构不对时抛出 ValueError，而不是 AttributeError"""
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, "catalog.json")
+        for catalog in (
+            [DEFAULT_INTENT_PATTERNS],
+            {"intent_patterns": [DEFAULT_INTENT_PATTERNS]},
+            {"intent_patterns": DEFAULT_INTENT_PATTERNS, "intent_weights": [1.0]},
+            {"intent_patterns": DEFAULT_INTENT_PATTERNS, "intent_weights": "diet"},
+        ):
+            with open(catalog_path, "w", encoding="utf-8") as f:
+                json.dump(catalog, f, ensure_ascii=False)
+            try:
+                load_intent_catalog(catalog_path)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"非法目录没有被拒绝: {catalog!r}")
+
+
+def test_catalog_watcher_survives_errors():
+    """热更新抛出意外异常时监视线程继续运行；线程已退出时 start_watcher 重新启动"""
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, "catalog.json")
+        with open(catalog_path, "w", encoding="utf-8") as f:
+            json.dump({"intent_patterns": DEFAULT_INTENT_PATTERNS}, f, ensure_ascii=False)
+        registry = IntentRouterRegistry(index_path="", catalog_path=catalog_path)
+        router = registry.get()
+
+        # 已退出的线程不应阻止 start_watcher
+        registry._watcher = threading.Thread(target=lambda: None)
+        registry._watcher.start()
+        registry._watcher.join()
+
+        calls = threading.Semaphore(0)
+
+        def failing_reload():
+            calls.release()
+            raise RuntimeError("boom")
+
+        registry.reload = failing_reload
+        os.utime(catalog_path, (0, 0))
+        registry.start_watcher(0.01)
+        try:
+            assert calls.acquire(timeout=5)
+            assert calls.acquire(timeout=5)
+            assert registry._watcher.is_alive()
+        finally:
+            registry.stop_watcher()
+        assert registry.get() is router
+
+
+def test_route_cache():
+    """测试归一化文本路由缓存：近似写法命中、LRU有界、统计命中率"""
+    assert normalize_query("我想减肥，有什么建议吗？") == normalize_query(" 我想减肥 有什么建议吗?")
+    assert normalize_query("ＢＭＩ 偏高！") == "bmi偏高"
+
+    router = IntentRouter(cascade=None)
+    router.route_cache = RouteCache(max_entries=2)
+    first = router.route_intent_cached("我想减肥，有什么建议吗？")
+    again = router.route_intent_cached("我想减肥 有什么建议吗?")
+    assert first == again == router.route_intent(normalize_query("我想减肥，有什么建议吗？"))
+    again[2]["diet"] = -1.0  # 调用方修改返回值不影响缓存
+    assert router.route_intent_cached("我想减肥，有什么建议吗？") == first
+
+    router.route_intent_cached("我最近感觉很焦虑")
+    router.route_intent_cached("我想了解如何改善整体健康状况")
+    stats = router.route_cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 3
+    assert abs(stats["hit_rate"] - 0.4) < 1e-9
+
+    tiny = RouteCache(max_entries=100, max_bytes=1000)
+    for i in range(20):
+        tiny.put(f"query-{i}", ("diet", 1.0, {"diet": 1.0}))
+    assert tiny.stats()["bytes"] <= 1000
+
+    router.route_cache = None
+    assert router.route_intent_cached("我想减肥") == router.route_intent("我想减肥")
+
+
+def test_inverted_bm25_matches_bm25okapi():
+    """测试倒排BM25与 rank_bm25.BM25Okapi 按意图汇总后的分数一致"""
+    rng = random.Random(3)
+    vocabulary = ["减肥", "运动", "焦虑", "睡眠", "健康", "饮食", "跑步", "压力", "|", " "]
+    intents = [f"intent_{i}" for i in range(6)]
+    tokenized_docs = [[rng.choice(vocabulary) for _ in range(rng.randint(1, 12))] for _ in range(30)]
+    labels = [rng.choice(intents) for _ in tokenized_docs]
+
+    reference = BM25Okapi(tokenized_docs)
+    index = InvertedBM25Index(tokenized_docs, labels, intents)
+    for _ in range(200):
+        query = [rng.choice(vocabulary + ["未登录词"]) for _ in range(rng.randint(0, 8))]
+        expected = dict.fromkeys(intents, 0.0)
+        for doc_idx, score in enumerate(reference.get_scores(query)):
+            expected[labels[doc_idx]] += score
+        for intent, score in zip(intents, index.score(query)):
+            assert abs(score - expected[intent]) < 1e-9
+
+    restored = InvertedBM25Index.from_dict(json.loads(json.dumps(index.to_dict())))
+    assert restored.score(["减肥", "睡眠", "减肥"]) == index.score(["减肥", "睡眠", "减肥"])
+    assert (restored.term_intent_matrix == index.term_intent_matrix).all()
+
+
+def test_accuracy_not_below_baseline():
+    """测试标注集准确率不低于已保存的基线，并验证基线对比能识别回归"""
+    from benchmark_intent_router import BASELINE_PATH, compare_to_baseline, evaluate_accuracy, load_labeled_queries
+
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        baseline = json.load(f)
+    labeled = load_labeled_queries()
+    report = {"accuracy": {}}
+    for name in baseline["accuracy"]:
+        router = IntentRouter(tokenizer=create_tokenizer(name), cascade=None)
+        report["accuracy"][name] = evaluate_accuracy(router, labeled)
+    assert compare_to_baseline(report, {"accuracy": baseline["accuracy"]}) == []
+
+    slower = {"routing": {"intents=4": {"len=16": {"qps": 100.0, "p50_us": 30.0}}}}
+    faster = {"routing": {"intents=4": {"len=16": {"qps": 1000.0, "p50_us": 10.0}}}}
+    assert len(compare_to_baseline(slower, faster)) == 2
+    assert compare_to_baseline(faster, slower) == []
+
+
+if __name__ == "__main__":
+    test_registry_builds_router_once()
+    test_analyze_intent_uses_shared_router()
+    test_matcher_matches_reference_scores()
+    test_route_intents_matches_route_intent()
+    test_index_artifact_round_trip()
+    test_trie_tokenizer()
+    test_cascade_early_exit()
+    test_catalog_hot_reload()
+    test_catalog_without_weights()
+    test_invalid_catalog_shapes()
+    test_catalog_watcher_survives_errors()
+    test_route_cache()
+    test_inverted_bm25_matches_bm25okapi()
+    test_accuracy_not_below_baseline()
+    print("✅ 意图路由器测试通过")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test LLM Response Cache
+"""
+
+import os
+import asyncio
+import tempfile
+
+from llm_cache import ResponseCache, cache_key
+
+PAYLOAD = {
+    "model": "deepseek-chat",
+    "messages": [{"role": "user", "content": "我想减肥，有什么建议吗？"}],
+    "temperature": 0.0,
+    "max_tokens": 4096,
+}
+
+
+def test_cache_key_ignores_stream_flag():
+    """流式与非流式请求共享缓存键，消息或温度不同则键不同"""
+    assert cache_key(PAYLOAD) == cache_key({**PAYLOAD, "stream": True})
+    assert cache_key(PAYLOAD) != cache_key({**PAYLOAD, "temperature": 0.7})
+    assert cache_key(PAYLOAD) != cache_key({**PAYLOAD, "messages": [{"role": "user", "content": "我想增肌"}]})
+    assert ResponseCache().cacheable(PAYLOAD)
+    assert not ResponseCache().cacheable({**PAYLOAD, "temperature": 0.7})
+
+
+def test_memory_lru_limits_and_ttl():
+    """内存层按条目数与字节数淘汰，过期条目视为未命中"""
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", ["1"])
+    cache.put("b", ["2"])
+    assert cache.get("a") == ["1"]
+    cache.put("c", ["3"])  # 淘汰最久未使用的 b
+    assert cache.get("b") is None
+    assert cache.get("c") == ["3"]
+
+    small = ResponseCache(max_bytes=ResponseCache.ENTRY_OVERHEAD + 100)
+    small.put("big", ["x" * 1000])
+    assert small.get("big") is None
+
+    expired = ResponseCache(ttl=0)
+    expired.put("a", ["1"])
+    assert expired.get("a") is None
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+    print(f"✅ 内存层统计: {stats}")
+
+
+def test_sqlite_tier_persists_and_evicts():
+    """磁盘层跨实例保留回复，超过条目上限时淘汰最久未访问的条目"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm_cache.sqlite")
+        writer = ResponseCache(path=path, disk_max_entries=2)
+        writer.put("a", ["保持", "运动"])
+        writer.put("b", ["均衡", "饮食"])
+        writer.close()
+
+        reader = ResponseCache(path=path, disk_max_entries=2)
+        assert reader.get("a") == ["保持", "运动"]
+        assert reader.stats()["disk_hits"] == 1
+        assert reader.get("a") == ["保持", "运动"]  # 已提升到内存层
+        assert reader.stats()["memory_hits"] == 1
+
+        reader.put("c", ["早睡"])
+        assert reader.stats()["disk_entries"] == 2
+        reader.clear()
+        assert reader.get("a") is None and asyncio.run(reader.aget("c")) is None
+        reader.close()
+
+
+if __name__ == "__main__":
+    test_cache_key_ignores_stream_flag()
+    test_memory_lru_limits_and_ttl()
+    test_sqlite_tier_persists_and_evicts()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Test LLM provider failover and circuit breaker
+"""
+
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+
+from deepseek_llm import DeepSeekLLM
+from deepseek_stub_server import DeepSeekStubServer
+from provider_router import CircuitBreaker, ProviderRouter
+from test_deepseek_llm import MESSAGES
+
+
+class FakeLLM:
+    """可控的假客户端：healthy=False 时所有调用失败，chunks_before_error 控制流式中途失败"""
+
+    def __init__(self, text: str, healthy: bool = True, delay: float = 0.0, chunks_before_error: int = 0):
+        self.text = text
+        self.healthy = healthy
+        self.delay = delay
+        self.chunks_before_error = chunks_before_error
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if not self.healthy:
+            raise ConnectionError(f"{self.text} is down")
+        return AIMessage(content=self.text)
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if not self.healthy:
+            raise ConnectionError(f"{self.text} is down")
+        return AIMessage(content=self.text)
+
+    async def ainvoke_stream(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        for index, char in enumerate(self.text):
+            if not self.healthy and index >= self.chunks_before_error:
+                raise ConnectionError(f"{self.text} is down")
+            yield char
+
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    options = dict(min_calls=4, window=60, open_duration=0.1, half_open_probes=2)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def test_breaker_trips_and_recovers_with_probes():
+    """失败率超过阈值时熔断，到期后半开放行探测请求，探测成功恢复、失败重新熔断"""
+    print("🧪 测试熔断器状态转换")
+    breaker = _breaker()
+    for success in (True, False, True, False):
+        assert breaker.acquire() == CircuitBreaker.CALL
+        breaker.record(CircuitBreaker.CALL, success, 0.01)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.acquire() is None
+
+    time.sleep(0.12)
+    assert breaker.acquire() == CircuitBreaker.PROBE
+    assert breaker.acquire() == CircuitBreaker.PROBE
+    assert breaker.acquire() is None  # 探测名额已满
+    breaker.record(CircuitBreaker.PROBE, True, 0.01)
+    breaker.record(CircuitBreaker.PROBE, False, 0.01)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.trips == 2
+
+    time.sleep(0.12)
+    for _ in range(2):
+        breaker.record(breaker.acquire(), True, 0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    # 慢调用同样会触发熔断
+    slow = _breaker(slow_call_threshold=0.5, slow_call_rate=0.75)
+    for _ in range(4):
+        slow.record(slow.acquire(), True, 1.0)
+    assert slow.state == CircuitBreaker.OPEN
+    print(f"✅ 熔断 {breaker.trips} 次后恢复")
+
+
+def test_router_fails_over_per_request():
+    """主提供方失败时请求转到回退提供方，熔断后不再尝试主提供方，恢复后切回"""
+    print("🧪 测试按请求故障转移")
+    primary, fallback = FakeLLM("primary", healthy=False), FakeLLM("fallback")
+    router = ProviderRouter([("deepseek", primary), ("openai", fallback)], breaker_factory=_breaker)
+
+    assert [router.invoke(MESSAGES).content for _ in range(6)] == ["fallback"] * 6
+    assert primary.calls == 4  # 第4次失败后熔断，之后直接跳过
+    metrics = router.metrics()
+    assert metrics["providers"]["deepseek"]["state"] == CircuitBreaker.OPEN
+    assert metrics["failovers"] == 4
+
+    primary.healthy = True
+    time.sleep(0.12)
+
+    async def run():
+        return [(await router.ainvoke(MESSAGES)).content for _ in range(3)]
+
+    assert asyncio.run(run()) == ["primary"] * 3
+    assert router.metrics()["providers"]["deepseek"]["state"] == CircuitBreaker.CLOSED
+    print(f"✅ 故障转移 {metrics['failovers']} 次，探测成功后切回主提供方")
+
+
+def test_stream_failover_only_before_first_chunk():
+    """流式请求在首个分块之前失败可以转移，输出过内容后失败则直接抛出"""
+    print("🧪 测试流式故障转移")
+    router = ProviderRouter([("deepseek", FakeLLM("abc", healthy=False)), ("openai", FakeLLM("xyz"))],
+                            breaker_factory=_breaker)
+    partial = ProviderRouter([("deepseek", FakeLLM("abc", healthy=False, chunks_before_error=2)),
+                              ("openai", FakeLLM("xyz"))], breaker_factory=_breaker)
+
+    async def run():
+        chunks = [chunk async for chunk in router.ainvoke_stream(MESSAGES)]
+        received = []
+        try:
+            async for chunk in partial.ainvoke_stream(MESSAGES):
+                received.append(chunk)
+            raise AssertionError("expected mid-stream failure")
+        except ConnectionError:
+            pass
+        return chunks, received
+
+    chunks, received = asyncio.run(run())
+    assert chunks == ["x", "y", "z"]
+    assert received == ["a", "b"]
+    assert partial.metrics()["failovers"] == 0
+    print("✅ 首包前转移，首包后不重复输出")
+
+
+def test_last_provider_always_attempted():
+    """熔断的提供方只在后面还有候选时跳过：唯一或最后一个提供方熔断时仍然会被尝试"""
+    client = FakeLLM("a", healthy=False)
+    router = ProviderRouter([("deepseek", client)], breaker_factory=_breaker)
+    for _ in range(5):
+        try:
+            router.invoke(MESSAGES)
+            raise AssertionError("expected the provider error")
+        except ConnectionError:
+            pass
+    assert client.calls == 5
+    metrics = router.metrics()
+    assert metrics["forced"] == 1
+    assert metrics["providers"]["deepseek"]["state"] == CircuitBreaker.OPEN
+
+    # 唯一的提供方恢复后，熔断期间的请求照样成功
+    client.healthy = True
+    assert router.invoke(MESSAGES).content == "a"
+
+    # 两个提供方都熔断时跳过第一个、强制尝试最后一个
+    primary, fallback = FakeLLM("p", healthy=False), FakeLLM("f", healthy=False)
+    router = ProviderRouter([("deepseek", primary), ("openai", fallback)], breaker_factory=_breaker)
+    for _ in range(4):
+        try:
+            router.invoke(MESSAGES)
+        except ConnectionError:
+            pass
+    fallback.healthy = True
+    assert router.invoke(MESSAGES).content == "f"
+    assert primary.calls == 4 and fallback.calls == 5
+
+
+def test_router_over_deepseek_stub():
+    """DeepSeek 返回 5xx 时由回退提供方接管流式请求"""
+    print("🧪 测试 DeepSeek 故障时的回退")
+    with DeepSeekStubServer(failures=1, failure_status=502) as server:
+        deepseek = DeepSeekLLM(api_key="test-key", base_url=server.base_url)
+        router = ProviderRouter([("deepseek", deepseek), ("openai", FakeLLM("ok"))], breaker_factory=_breaker)
+
+        async def run():
+            try:
+                first = [chunk async for chunk in router.ainvoke_stream(MESSAGES)]
+                second = [chunk async for chunk in router.ainvoke_stream(MESSAGES)]
+                return first, second
+            finally:
+                await router.aclose()
+
+        first, second = asyncio.run(run())
+        router.close()
+
+    assert first == ["o", "k"]
+    assert second == server.chunks
+    stats = router.metrics()["providers"]["deepseek"]
+    assert stats["calls"] == 2 and stats["failures"] == 1
+    print("✅ 502 后转到回退提供方，下一个请求回到 DeepSeek")
+
+
+def test_with_client_shares_breakers():
+    """替换一个提供方的客户端后仍共用熔断器：任一路由器上的失败都计入同一个熔断器"""
+    primary, fallback = FakeLLM("primary", healthy=False), FakeLLM("fallback")
+    router = ProviderRouter([("deepseek", primary), ("openai", fallback)], breaker_factory=_breaker)
+    other = router.with_client("deepseek", FakeLLM("other", healthy=False))
+    assert other.provider_names == router.provider_names
+
+    for _ in range(2):
+        assert router.invoke(MESSAGES).content == "fallback"
+        assert other.invoke(MESSAGES).content == "fallback"
+    assert router.metrics()["providers"]["deepseek"]["state"] == CircuitBreaker.OPEN
+    assert other.metrics()["providers"]["deepseek"]["state"] == CircuitBreaker.OPEN
+    assert primary.calls == 2 and other.metrics()["providers"]["deepseek"]["calls"] == 2
+    try:
+        router.with_client("missing", fallback)
+        raise AssertionError("expected unknown provider error")
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_breaker_trips_and_recovers_with_probes()
+    test_router_fails_over_per_request()
+    test_stream_failover_only_before_first_chunk()
+    test_last_provider_always_attempted()
+    test_router_over_deepseek_stub()
+    test_with_client_shares_breakers()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Test adaptive concurrency limiter and DeepSeek 429/Retry-After handling
+"""
+
+import asyncio
+import threading
+import time
+
+from deepseek_llm import DeepSeekLLM, DeepSeekRateLimitError, parse_retry_after
+from deepseek_stub_server import DeepSeekStubServer
+from rate_limiter import AdaptiveConcurrencyLimiter, QueueFullError, QueueTimeoutError
+from test_deepseek_llm import MESSAGES
+
+
+def test_concurrency_cap_and_fifo_queue():
+    """超出并发窗口的调用排队，按到达顺序获得许可"""
+    print("🧪 测试并发上限与排队")
+    limiter = AdaptiveConcurrencyLimiter(max_concurrency=3)
+    active, peak, order = 0, 0, []
+
+    async def call(index: int):
+        nonlocal active, peak
+        async with limiter.slot():
+            order.append(index)
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+
+    async def run():
+        for index in range(12):
+            asyncio.ensure_future(call(index))
+            await asyncio.sleep(0)
+        while limiter.stats()["granted"] < 12 or limiter.stats()["in_flight"]:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    stats = limiter.stats()
+    assert peak == 3
+    assert order == list(range(12))
+    assert stats["max_queue_depth"] == 9 and stats["queue_depth"] == 0
+    assert stats["p95_wait_ms"] > 0
+    print(f"✅ 峰值并发 {peak}，最大排队 {stats['max_queue_depth']}，p95等待 {stats['p95_wait_ms']:.1f}ms")
+
+
+def test_queue_deadline_and_capacity():
+    """排队超过截止时间抛出 QueueTimeoutError，队列满时直接拒绝"""
+    print("🧪 测试排队截止时间")
+    limiter = AdaptiveConcurrencyLimiter(max_concurrency=1, queue_timeout=0.05, max_queue=1)
+
+    async def run():
+        async with limiter.slot():
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            try:
+                await limiter.acquire()
+                raise AssertionError("queue should be full")
+            except QueueFullError:
+                pass
+            try:
+                await waiter
+                raise AssertionError("waiter should time out")
+            except QueueTimeoutError:
+                pass
+        # 超时的等待者不占用许可
+        async with limiter.slot():
+            pass
+
+    asyncio.run(run())
+    stats = limiter.stats()
+    assert stats["timeouts"] == 1 and stats["rejected"] == 1
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+    print("✅ 超时与拒绝均已计数")
+
+
+def test_aimd_window_and_retry_after():
+    """限流响应乘性减小窗口并暂停到 Retry-After，成功后加性恢复"""
+    print("🧪 测试 AIMD 窗口调整")
+    limiter = AdaptiveConcurrencyLimiter(max_concurrency=8, decrease_cooldown=0)
+
+    with limiter.slot_sync() as permit:
+        permit.overload(retry_after=0.1)
+    assert limiter.limit == 4
+    assert limiter.stats()["paused_for"] > 0
+
+    start = time.monotonic()
+    with limiter.slot_sync():
+        pass
+    assert time.monotonic() - start >= 0.08
+
+    for _ in range(20):
+        with limiter.slot_sync():
+            pass
+    assert 4 < limiter.limit <= 8
+    print(f"✅ 限流后窗口 4，恢复到 {limiter.limit}")
+
+
+def test_sync_and_async_callers_share_window():
+    """线程中的同步调用与事件循环中的异步调用共用同一个并发窗口"""
+    print("🧪 测试同步与异步调用共用窗口")
+    limiter = AdaptiveConcurrencyLimiter(max_concurrency=2)
+    active, peak = 0, 0
+    lock = threading.Lock()
+
+    def enter():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+
+    def leave():
+        nonlocal active
+        with lock:
+            active -= 1
+
+    def sync_call():
+        with limiter.slot_sync():
+            enter()
+            time.sleep(0.02)
+            leave()
+
+    async def async_call():
+        async with limiter.slot():
+            enter()
+            await asyncio.sleep(0.02)
+            leave()
+
+    threads = [threading.Thread(target=sync_call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+
+    async def run():
+        await asyncio.gather(*(async_call() for _ in range(4)))
+
+    asyncio.run(run())
+    for thread in threads:
+        thread.join()
+    assert peak == 2
+    assert limiter.stats()["granted"] == 8
+    print(f"✅ 8 次调用峰值并发 {peak}")
+
+
+def test_deepseek_client_honours_429():
+    """客户端遇到 429 抛出带 Retry-After 的异常，并让限流器暂停、缩小窗口"""
+    print("🧪 测试 DeepSeek 429 处理")
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+    with DeepSeekStubServer(failures=2, retry_after="0.1", response_delay=0.02) as server:
+        limiter = AdaptiveConcurrencyLimiter(max_concurrency=4, decrease_cooldown=0)
+        llm = DeepSeekLLM(api_key="test-key", base_url=server.base_url, limiter=limiter,
+                          coalesce=False)
+
+        try:
+            llm.invoke(MESSAGES)
+            raise AssertionError("expected rate limit error")
+        except DeepSeekRateLimitError as e:
+            assert e.status == 429 and e.retry_after == 0.1
+
+        async def run():
+            try:
+                try:
+                    [chunk async for chunk in llm.ainvoke_stream(MESSAGES)]
+                    raise AssertionError("expected rate limit error")
+                except DeepSeekRateLimitError:
+                    pass
+                return await asyncio.gather(*(llm.ainvoke(MESSAGES) for _ in range(3)))
+            finally:
+                await llm.aclose()
+
+        start = time.monotonic()
+        responses = asyncio.run(run())
+        elapsed = time.monotonic() - start
+        llm.close()
+
+    assert [r.content for r in responses] == ["".join(server.chunks)] * 3
+    assert elapsed >= 0.08  # 等待 Retry-After 后才重新发出请求
+    assert server.max_active <= 2  # 两次限流后窗口从 4 缩小到 1，再逐步恢复
+    metrics = llm.metrics()
+    assert metrics["limiter"]["overloads"] == 2
+    print(f"✅ 限流 {metrics['limiter']['overloads']} 次，恢复后上游峰值并发 {server.max_active}")
+
+
+if __name__ == "__main__":
+    test_concurrency_cap_and_fifo_queue()
+    test_queue_deadline_and_capacity()
+    test_aimd_window_and_retry_after()
+    test_sync_and_async_callers_share_window()
+    test_deepseek_client_honours_429()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Test retry with jittered backoff and hedged DeepSeek requests
+"""
+
+import asyncio
+import sys
+import threading
+import time
+
+from deepseek_llm import DeepSeekAPIError, DeepSeekLLM
+from deepseek_stub_server import DeepSeekStubServer
+from retry_policy import RetryPolicy
+from test_deepseek_llm import MESSAGES
+
+
+def _llm(server: DeepSeekStubServer, retry: RetryPolicy) -> DeepSeekLLM:
+    return DeepSeekLLM(api_key="test-key", base_url=server.base_url, retry=retry, coalesce=False)
+
+
+def test_backoff_and_adaptive_hedge_delay():
+    """退避带全抖动且不少于 Retry-After；对冲延迟取首包延迟的 p95"""
+    print("🧪 测试退避与对冲延迟")
+    policy = RetryPolicy(backoff_base=0.1, backoff_max=1.0, hedge=True, hedge_min_samples=20)
+    delays = [policy.backoff(attempt) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= 1.0 for delay in delays)
+    assert len(set(delays)) > 100
+    assert policy.backoff(0, retry_after=2.0) == 2.0
+
+    assert policy.hedge_delay("stream") is None  # 样本不足时不对冲
+    for ms in range(1, 101):
+        policy.record_latency("stream", ms / 1000)
+    assert policy.hedge_delay("stream") == 0.096
+    assert policy.hedge_delay("invoke") is None
+    print(f"✅ p95 对冲延迟 {policy.hedge_delay('stream') * 1000:.0f}ms")
+
+
+def test_transient_errors_are_retried():
+    """5xx 与 429 会重试，重试用尽后抛出最后的错误；4xx 不重试"""
+    print("🧪 测试失败重试")
+    with DeepSeekStubServer(failures=2, failure_status=503, retry_after="0") as server:
+        llm = _llm(server, RetryPolicy(max_retries=2, backoff_base=0.01))
+        assert llm.invoke(MESSAGES).content == "".join(server.chunks)
+        llm.close()
+    assert server.request_count == 3
+
+    with DeepSeekStubServer(failures=2, failure_status=500) as server:
+        policy = RetryPolicy(max_retries=2, backoff_base=0.01)
+        llm = _llm(server, policy)
+
+        async def run():
+            try:
+                return [chunk async for chunk in llm.ainvoke_stream(MESSAGES)]
+            finally:
+                await llm.aclose()
+
+        assert asyncio.run(run()) == server.chunks
+        assert policy.stats()["retries"] == 2
+
+    with DeepSeekStubServer(failures=5, failure_status=400) as server:
+        llm = _llm(server, RetryPolicy(max_retries=2, backoff_base=0.01))
+        try:
+            list(llm.invoke_stream(MESSAGES))
+            raise AssertionError("expected a client error")
+        except DeepSeekAPIError as e:
+            assert not e.retryable
+        llm.close()
+    assert server.request_count == 1
+    print("✅ 可重试错误已重试，客户端错误直接返回")
+
+
+def test_hedged_requests_cut_tail_latency():
+    """首个请求迟迟没有首包时发出对冲请求，先到的胜出，落败的请求被取消"""
+    print("🧪 测试对冲请求")
+    with DeepSeekStubServer(response_delays=[2.0, 0.0, 2.0, 0.0]) as server:
+        policy = RetryPolicy(hedge=True, hedge_delay=0.05, max_hedge_ratio=1.0)
+        llm = _llm(server, policy)
+
+        async def run():
+            try:
+                start = time.monotonic()
+                response = await llm.ainvoke(MESSAGES)
+                chunks = [chunk async for chunk in llm.ainvoke_stream(MESSAGES)]
+                elapsed = time.monotonic() - start
+                # 等待服务端处理完落败请求的断开
+                for _ in range(100):
+                    if server.cancelled == 2:
+                        break
+                    await asyncio.sleep(0.01)
+                return response, chunks, elapsed
+            finally:
+                await llm.aclose()
+
+        response, chunks, elapsed = asyncio.run(run())
+
+    stats = policy.stats()
+    assert response.content == "".join(server.chunks)
+    assert chunks == server.chunks
+    assert elapsed < 1.0
+    assert stats["hedges_fired"] == 2 and stats["hedges_won"] == 2
+    assert server.request_count == 4 and server.cancelled == 2
+    print(f"✅ 两次慢请求均被对冲请求超过，总耗时 {elapsed * 1000:.0f}ms")
+
+
+def test_hedging_is_budgeted():
+    """对冲请求数受 max_hedge_ratio 限制，上游整体变慢时不会让负载翻倍"""
+    print("🧪 测试对冲预算")
+    with DeepSeekStubServer(response_delay=0.05) as server:
+        policy = RetryPolicy(hedge=True, hedge_delay=0.01, max_hedge_ratio=0.2)
+        llm = _llm(server, policy)
+
+        async def run():
+            try:
+                for _ in range(10):
+                    await llm.ainvoke(MESSAGES)
+            finally:
+                await llm.aclose()
+
+        asyncio.run(run())
+
+    assert policy.stats()["hedges_fired"] == 2
+    assert server.request_count == 12
+    print(f"✅ 10 次调用只对冲 {policy.stats()['hedges_fired']} 次")
+
+
+def test_cancel_during_loser_cleanup_propagates():
+    """等待落败的对冲流结束时调用方被取消，取消不会被吞掉，落败的流仍被关闭"""
+    closed = []
+
+    async def source(name: str, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            yield name
+        except asyncio.CancelledError:
+            # 落败的流取消时还要花一点时间收尾
+            await asyncio.sleep(0.1)
+            raise
+        finally:
+            closed.append(name)
+
+    sources = iter([source("slow", 10.0), source("fast", 0.0)])
+    policy = RetryPolicy(hedge=True, hedge_delay=0.01, max_hedge_ratio=1.0)
+
+    async def consume():
+        return [chunk async for chunk in policy.stream(lambda: next(sources))]
+
+    async def run():
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.05)  # 快的流已胜出，正在等待慢的流收尾
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(run())
+    assert "slow" in closed
+
+
+def test_counters_are_thread_safe():
+    """多个线程同时调用并读取统计时，计数不丢失，stats() 不会因延迟窗口被修改而出错"""
+    print("🧪 测试重试策略计数的线程安全")
+    policy = RetryPolicy(hedge=True, hedge_min_samples=1)
+    threads, calls_per_thread = 8, 2000
+    errors = []
+
+    def call(thread: int):
+        try:
+            # 不断出现新的调用类型，stats() 遍历延迟窗口时字典仍在插入
+            for index in range(calls_per_thread):
+                policy.call_sync(lambda: None, kind=f"kind{thread}-{index % 1000}")
+        except Exception as e:
+            errors.append(e)
+
+    def read_stats():
+        try:
+            while any(worker.is_alive() for worker in workers):
+                policy.stats()
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=call, args=(thread,)) for thread in range(threads)]
+    reader = threading.Thread(target=read_stats)
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for worker in workers:
+            worker.start()
+        reader.start()
+        for worker in workers + [reader]:
+            worker.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert not errors, errors
+    assert policy.stats()["calls"] == threads * calls_per_thread
+    assert sum(len(window.samples) for window in policy._latencies.values()) == threads * calls_per_thread
+    print("✅ 并发调用的计数完整")
+
+
+if __name__ == "__main__":
+    test_backoff_and_adaptive_hedge_delay()
+    test_transient_errors_are_retried()
+    test_hedged_requests_cut_tail_latency()
+    test_hedging_is_budgeted()
+    test_cancel_during_loser_cleanup_propagates()
+    test_counters_are_thread_safe()
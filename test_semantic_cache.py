@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test Semantic Advice Cache
+"""
+
+from semantic_cache import SemanticAdviceCache
+
+
+def _cache(**kwargs) -> SemanticAdviceCache:
+    cache = SemanticAdviceCache(**kwargs)
+    cache.add("我想减肥，有什么建议吗？", "diet", "控制热量，规律运动。", ["你的目标体重是多少？"])
+    cache.add("最近睡眠质量很差怎么办", "mental_health", "固定作息，睡前放松。", [])
+    return cache
+
+
+def test_near_duplicate_hits_within_intent():
+    """措辞相近的问题在同一意图内命中，不同意图或不同问题不命中"""
+    cache = _cache(threshold=0.85)
+
+    hit = cache.lookup("我想减肥有什么建议吗", "diet")
+    assert hit is not None and hit["advice_result"] == "控制热量，规律运动。"
+    assert hit["follow_up_questions"] == ["你的目标体重是多少？"]
+    assert hit["similarity"] >= 0.85
+
+    assert cache.lookup("我想减肥有什么建议吗", "exercise") is None
+    assert cache.lookup("我想增肌，有什么建议吗？", "diet") is None
+    assert cache.lookup("！？", "diet") is None
+    print(f"✅ 近似命中相似度 {hit['similarity']:.3f}，统计: {cache.stats()}")
+
+
+def test_threshold_is_tunable():
+    """阈值越低，允许复用的措辞差异越大"""
+    paraphrase = "最近睡眠质量不好，怎么办？"
+    assert _cache(threshold=0.95).lookup(paraphrase, "mental_health") is None
+    assert _cache(threshold=0.6).lookup(paraphrase, "mental_health") is not None
+
+
+def test_duplicates_skipped_and_lru_eviction():
+    """近似问题不重复入库，超过上限时淘汰最久未用的条目并清理倒排表"""
+    cache = _cache(max_entries=2)
+    cache.add("我想减肥有什么建议吗", "diet", "另一条建议", [])
+    assert len(cache) == 2
+
+    cache.lookup("我想减肥有什么建议吗", "diet")  # 减肥条目变为最近使用
+    cache.add("每周应该跑步几次比较合适", "exercise", "每周三到五次。", [])
+    assert len(cache) == 2 and cache.stats()["evictions"] == 1
+    assert cache.lookup("最近睡眠质量很差怎么办", "mental_health") is None
+    assert cache.lookup("我想减肥，有什么建议吗？", "diet")["advice_result"] == "控制热量，规律运动。"
+    assert not any(intent == "mental_health" for intent, _ in cache._postings)
+
+
+def test_similarity_uses_current_idf():
+    """条目与问题按同一份当前 IDF 加权：之后插入的条目改变 IDF 后，原问题的相似度仍为 1"""
+    cache = _cache(threshold=0.5)
+    question = "我想减肥，有什么建议吗？"
+    assert abs(cache.lookup(question, "diet")["similarity"] - 1.0) < 1e-9
+    # 共享"建议"等常见词的条目让这些词的 IDF 下降，其余词不变
+    for topic in ("跑步", "游泳", "瑜伽", "拉伸", "骑车", "跳绳"):
+        cache.add(f"{topic}有什么建议吗", "exercise", f"{topic}的建议。", [])
+    assert abs(cache.lookup(question, "diet")["similarity"] - 1.0) < 1e-9
+
+
+if __name__ == "__main__":
+    test_near_duplicate_hits_within_intent()
+    test_threshold_is_tunable()
+    test_duplicates_skipped_and_lru_eviction()
+    test_similarity_uses_current_idf()
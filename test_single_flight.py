@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test Single Flight request coalescing
+"""
+
+import asyncio
+
+from single_flight import SingleFlight
+
+
+def _source(chunks, delay=0.01, started=None, closed=None):
+    """模拟上游流：记录启动次数与是否被关闭"""
+    async def generate():
+        if started is not None:
+            started.append(1)
+        try:
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                yield chunk
+        finally:
+            if closed is not None:
+                closed.append(1)
+    return generate
+
+
+def test_call_shares_one_result():
+    """相同键的并发调用只执行一次"""
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "advice"
+
+    async def run():
+        return await asyncio.gather(*(flights.call("k", fetch) for _ in range(10)))
+
+    assert asyncio.run(run()) == ["advice"] * 10
+    assert len(calls) == 1
+    assert flights.stats()["followers"] == 9 and flights.in_flight() == 0
+
+
+def test_stream_fans_out_to_late_subscribers():
+    """流式调用共享上游：晚加入的订阅者先回放已有分块，所有人收到完整序列"""
+    flights = SingleFlight()
+    chunks = ["保持", "规律", "运动"]
+    started = []
+    source = _source(chunks, started=started)
+
+    async def consume(delay):
+        await asyncio.sleep(delay)
+        return [chunk async for chunk in flights.stream("k", source)]
+
+    async def run():
+        return await asyncio.gather(*(consume(delay) for delay in (0, 0.005, 0.015, 0.025)))
+
+    assert asyncio.run(run()) == [chunks] * 4
+    assert len(started) == 1
+    assert flights.in_flight() == 0
+    print(f"✅ 合并统计: {flights.stats()}")
+
+
+def test_stream_cancels_upstream_when_all_subscribers_leave():
+    """部分订阅者提前离开不影响其他人；全部离开时取消上游"""
+    flights = SingleFlight()
+    chunks = [str(i) for i in range(20)]
+    closed = []
+    source = _source(chunks, closed=closed)
+
+    async def take(count):
+        received = []
+        stream = flights.stream("k", source)
+        async for chunk in stream:
+            received.append(chunk)
+            if len(received) == count:
+                break
+        await stream.aclose()
+        return received
+
+    async def run():
+        early, full = await asyncio.gather(take(2), take(len(chunks)))
+        assert early == chunks[:2] and full == chunks
+        assert not closed or len(closed) == 1
+
+        closed.clear()
+        assert await take(3) == chunks[:3]
+        await asyncio.sleep(0.05)
+        assert closed == [1]
+        assert flights.in_flight() == 0
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_subscriber():
+    """上游出错时每个订阅者都收到异常"""
+    flights = SingleFlight()
+
+    async def failing():
+        yield "部分"
+        raise RuntimeError("upstream failed")
+
+    async def consume():
+        received = []
+        try:
+            async for chunk in flights.stream("k", failing):
+                received.append(chunk)
+        except RuntimeError as e:
+            return received, str(e)
+
+    async def run():
+        return await asyncio.gather(consume(), consume())
+
+    assert asyncio.run(run()) == [(["部分"], "upstream failed")] * 2
+
+
+if __name__ == "__main__":
+    test_call_shares_one_result()
+    test_stream_fans_out_to_late_subscribers()
+    test_stream_cancels_upstream_when_all_subscribers_leave()
+    test_errors_reach_every_subscriber()
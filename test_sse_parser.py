@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test incremental SSE parsing of DeepSeek streams
+"""
+
+import json
+import random
+
+import sse_parser
+from sse_parser import DeltaDecoder, SSEParser, parse_delta
+
+
+def _event(content: str) -> bytes:
+    chunk = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": content}}]}
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+CONTENTS = ["保持", "规律", "运动", "，", "均衡", "饮食", "。"]
+STREAM = b"".join(_event(content) for content in CONTENTS) + b"data: [DONE]\n\n"
+
+
+def _feed_all(decoder, pieces):
+    contents = []
+    for piece in pieces:
+        contents.extend(decoder.feed(piece))
+    return contents
+
+
+def test_arbitrary_chunk_boundaries():
+    """任意切分（包括切在多字节汉字与 \\r\\n 中间）得到相同的分块"""
+    print("🧪 测试任意切分的字节块")
+    rng = random.Random(0)
+    for stream in (STREAM, STREAM.replace(b"\n", b"\r\n"), STREAM.replace(b"\n", b"\r")):
+        assert _feed_all(DeltaDecoder(), [stream]) == CONTENTS
+        assert _feed_all(DeltaDecoder(), [stream[i:i + 1] for i in range(len(stream))]) == CONTENTS
+        for _ in range(50):
+            cuts = sorted(rng.sample(range(1, len(stream)), 8))
+            pieces = [stream[a:b] for a, b in zip([0] + cuts, cuts + [len(stream)])]
+            assert _feed_all(DeltaDecoder(), pieces) == CONTENTS
+    print(f"✅ 使用 {sse_parser.JSON_BACKEND} 解码，各种切分结果一致")
+
+
+def test_event_fields_and_multiline_data():
+    """多行 data 用换行拼接；注释、event/id 字段被忽略；没有空行结束的事件不输出"""
+    parser = SSEParser()
+    events = parser.feed(b": keep-alive\n\nevent: message\nid: 7\ndata: {\"a\":\ndata:1}\n\ndata: partial")
+    assert events == [b"{\"a\":\n1}"]
+    assert parser.feed(b"\n") == []
+    assert parser.feed(b"\n") == [b"partial"]
+
+
+def test_done_and_invalid_chunks():
+    """[DONE] 之后的数据被忽略；无效 JSON 与没有内容的分块被跳过"""
+    decoder = DeltaDecoder()
+    contents = _feed_all(decoder, [
+        b"data: not json\n\n",
+        b'data: {"choices": []}\n\n',
+        b'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n',
+        _event("好"),
+        b"data: [DONE]\n\n",
+        _event("多余"),
+    ])
+    assert contents == ["好"]
+    assert decoder.done
+    assert parse_delta(b'{"choices": [{"delta": {"content": null}}]}') is None
+    assert sse_parser._json_loads(b' {"a": 1} ') == {"a": 1}
+
+
+if __name__ == "__main__":
+    test_arbitrary_chunk_boundaries()
+    test_event_fields_and_multiline_data()
+    test_done_and_invalid_chunks()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Test Wellbeing Agent nodes against a local DeepSeek stub server
+"""
+
+import asyncio
+import time
+from contextlib import aclosing, contextmanager
+
+from langchain_core.messages import HumanMessage
+
+import wellbeing_agent
+from deepseek_llm import DeepSeekLLM
+from deepseek_stub_server import DeepSeekStubServer
+from semantic_cache import SemanticAdviceCache
+
+
+@contextmanager
+def _patched(**attributes):
+    """临时替换 wellbeing_agent 的模块级对象（llm、缓存等）"""
+    originals = {name: getattr(wellbeing_agent, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(wellbeing_agent, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(wellbeing_agent, name, value)
+
+
+def _state(question: str) -> dict:
+    return {
+        "messages": [HumanMessage(content=question)],
+        "user_intent": "diet",
+        "advice_type": "diet",
+        "user_profile": {},
+    }
+
+
+async def _collect(state: dict) -> list:
+    return [event async for event in wellbeing_agent.generate_advice_node_stream(state)]
+
+
+def test_semantic_cache_reuses_advice():
+    """近似问题复用已生成的建议，不再调用 LLM；流式接口依旧逐段输出"""
+    print("🧪 测试近似问题缓存")
+    with DeepSeekStubServer(chunks=["第一条建议。\n", "第二条建议。"]) as server:
+        llm = DeepSeekLLM(api_key="test-key", base_url=server.base_url)
+        with _patched(llm=llm, semantic_cache=SemanticAdviceCache()):
+            first = asyncio.run(wellbeing_agent.generate_advice_node(_state("我想减肥，有什么建议吗？")))
+            calls = server.request_count
+
+            cached = asyncio.run(wellbeing_agent.generate_advice_node(_state("我想减肥有什么建议吗")))
+            events = asyncio.run(_collect(_state("我想减肥，有什么建议吗")))
+        llm.close()
+
+    assert server.request_count == calls
+    assert cached["advice_result"] == first["advice_result"] == "第一条建议。\n第二条建议。"
+    assert cached["follow_up_questions"] == first["follow_up_questions"]
+    contents = [event["content"] for event in events if event["type"] == "content"]
+    assert contents == ["第一条建议。\n", "第二条建议。"]
+    assert events[-1]["type"] == "follow_up"
+    print(f"✅ 首次调用 {calls} 次 LLM，近似问题 0 次")
+
+
+def test_disconnect_cancels_upstream_stream():
+    """消费方提前关闭流式生成器时，上游请求随之取消，也不再请求后续问题"""
+    print("🧪 测试客户端断开时取消上游生成")
+    chunks = [f"第{i}段。" for i in range(20)]
+    with DeepSeekStubServer(chunks=chunks, chunk_delay=0.02) as server:
+        llm = DeepSeekLLM(api_key="test-key", base_url=server.base_url)
+
+        async def run():
+            try:
+                # 先完整读完一次，作为估算节省 token 数的基准长度
+                assert [chunk async for chunk in llm.ainvoke_stream([HumanMessage(content="你好")])] == chunks
+                stream = wellbeing_agent.generate_advice_node_stream(_state("我想减肥，有什么建议吗？"))
+                received = 0
+                async for event in stream:
+                    received += event["type"] == "content"
+                    if received == 2:
+                        break
+                await stream.aclose()
+                for _ in range(100):
+                    if server.cancelled:
+                        break
+                    await asyncio.sleep(0.01)
+            finally:
+                await llm.aclose()
+
+        skipped = wellbeing_agent.stream_metrics["follow_ups_skipped"]
+        with _patched(llm=llm, semantic_cache=None):
+            asyncio.run(run())
+
+    streams = llm.metrics()["streams"]
+    assert server.cancelled == 1
+    assert server.request_count == 2  # 没有后续问题请求
+    assert wellbeing_agent.stream_metrics["follow_ups_skipped"] == skipped + 1
+    assert streams["cancelled"] == 1 and streams["cancelled_chunks"] == 2
+    assert streams["est_tokens_saved"] == 18
+    print(f"✅ 断开后上游请求已取消，估计节省 {streams['est_tokens_saved']:.0f} 个 token")
+
+
+def test_stream_runs_graph_once():
+    """流式接口只执行一次图：建议与后续问题共用一次请求，断开时取消图中的上游请求"""
+    print("🧪 测试流式接口单次执行图")
+    chunks = [f"第{i}段。" for i in range(10)]
+    with DeepSeekStubServer(chunks=chunks, chunk_delay=0.01) as server:
+        llm = DeepSeekLLM(api_key="test-key", base_url=server.base_url)
+
+        async def run():
+            try:
+                events = [event async for event in wellbeing_agent.run_wellbeing_agent_stream("我想减肥，有什么建议吗？")]
+                requests_per_stream = server.request_count
+
+                stream = wellbeing_agent.run_wellbeing_agent_stream("我想减肥，有什么建议吗？")
+                async for event in stream:
+                    if event["type"] == "content":
+                        break
+                await stream.aclose()
+                for _ in range(100):
+                    if server.cancelled:
+                        break
+                    await asyncio.sleep(0.01)
+                return events, requests_per_stream
+            finally:
+                await llm.aclose()
+
+        with _patched(llm=llm, semantic_cache=None):
+            events, requests_per_stream = asyncio.run(run())
+
+    types = [event["type"] for event in events]
+    assert requests_per_stream == 1
+    assert types[:2] == ["step", "step"] and types[-2:] == ["follow_up", "summary"]
+    assert "".join(event["content"] for event in events if event["type"] == "content") == "".join(chunks)
+    assert server.cancelled == 1 and server.request_count == 2
+    print(f"✅ 每个流式请求 {requests_per_stream} 次 LLM 调用，断开后上游请求已取消")
+
+
+def test_upstream_error_is_not_a_disconnect():
+    """上游返回错误时消费方在 error 事件处停止读取，不计为客户端断开"""
+    print("🧪 测试上游错误不计为断开")
+    with DeepSeekStubServer(failures=1, failure_status=400) as server:
+        llm = DeepSeekLLM(api_key="test-key", base_url=server.base_url, coalesce=False)
+
+        async def run():
+            events = []
+            try:
+                # 与 production_server 相同：收到 error 事件后 break，aclosing 关闭生成器
+                async with aclosing(wellbeing_agent.run_wellbeing_agent_stream("我想减肥，有什么建议吗？")) as stream:
+                    async for event in stream:
+                        events.append(event)
+                        if event["type"] == "error":
+                            break
+                return events
+            finally:
+                await llm.aclose()
+
+        disconnects = wellbeing_agent.stream_metrics["disconnects"]
+        with _patched(llm=llm, semantic_cache=None):
+            events = asyncio.run(run())
+
+    assert events[-1]["type"] == "error"
+    assert wellbeing_agent.stream_metrics["disconnects"] == disconnects
+    print("✅ 错误结束的流没有计为断开")
+
+
+def test_fused_and_separate_follow_up_modes():
+    """合并模式从建议流的尾部解析后续问题，只请求一次；分开模式再异步请求一次"""
+    print("🧪 测试后续问题的合并与分开模式")
+    chunks = ["每天快走30分钟。", "\n<<<FOLL", 'OW_UP>>>\n["您每周', '能运动几次？", "有没有关节不适？"]']
+    with DeepSeekStubServer(chunks=chunks) as server:
+        llm = DeepSeekLLM(api_key="test-key", base_url=server.base_url, coalesce=False)
+
+        async def run():
+            try:
+                fused = await _collect(_state("我想减肥，有什么建议吗？"))
+                fused_requests = server.request_count
+                with _patched(follow_up_mode="separate"):
+                    separate = await _collect(_state("我想减肥，有什么建议吗？"))
+                return fused, fused_requests, separate
+            finally:
+                await llm.aclose()
+
+        with _patched(llm=llm, follow_up_llm=llm, semantic_cache=None, follow_up_mode="fused"):
+            fused, fused_requests, separate = asyncio.run(run())
+
+    advice = "".join(event["content"] for event in fused if event["type"] == "content")
+    assert fused_requests == 1
+    assert advice == "每天快走30分钟。\n"
+    assert fused[-1] == {"type": "follow_up", "questions": ["您每周能运动几次？", "有没有关节不适？"],
+                         "message": "🤔 为了更好地帮助您，请考虑以下问题："}
+    # 分开模式下正文原样输出，第二次请求返回的同一段文本里也能解析出问题
+    assert server.request_count == fused_requests + 2
+    assert "".join(event["content"] for event in separate if event["type"] == "content") == "".join(chunks)
+    assert separate[-1]["questions"] == fused[-1]["questions"]
+    print(f"✅ 合并模式 {fused_requests} 次请求，分开模式 2 次")
+
+
+def test_follow_up_failure_keeps_advice():
+    """只有后续问题请求失败时保留建议、使用默认问题，不产生 error 事件"""
+    print("🧪 测试后续问题请求失败时的回退")
+    chunks = ["每天快走30分钟。", "控制总热量。"]
+    with DeepSeekStubServer(chunks=chunks) as server, \
+            DeepSeekStubServer(failures=10, failure_status=400) as follow_up_server:
+        llm = DeepSeekLLM(api_key="test-key", base_url=server.base_url, coalesce=False)
+        follow_up_llm = DeepSeekLLM(api_key="test-key", base_url=follow_up_server.base_url, coalesce=False)
+
+        async def run():
+            try:
+                results = []
+                for mode in ("separate", "concurrent"):
+                    with _patched(follow_up_mode=mode):
+                        results.append(await _collect(_state("我想减肥，有什么建议吗？")))
+                return results
+            finally:
+                await llm.aclose()
+                await follow_up_llm.aclose()
+
+        with _patched(llm=llm, follow_up_llm=follow_up_llm, semantic_cache=None, follow_up_start_chars=0):
+            results = asyncio.run(run())
+
+    assert follow_up_server.request_count == 2
+    for events in results:
+        assert all(event["type"] != "error" for event in events)
+        assert "".join(event["content"] for event in events if event["type"] == "content") == "".join(chunks)
+        assert events[-1]["type"] == "follow_up"
+        assert events[-1]["questions"] == list(wellbeing_agent.DEFAULT_FOLLOW_UP_QUESTIONS)
+    print("✅ 后续问题请求失败时建议照常输出")
+
+
+def test_concurrent_follow_up_overlaps_advice():
+    """并发模式在建议累积到阈值后就发出后续问题请求，建议结束时问题已经就绪"""
+    print("🧪 测试后续问题与建议并发生成")
+    chunks = ["每天快走30分钟。", "控制总热量。", "保证睡眠。", "多喝水。", '["您每周能运动几次？"]']
+    # 第一个请求是建议流（每块间隔 0.05s），第二个是后续问题请求（0.15s 后返回）
+    with DeepSeekStubServer(chunks=chunks, chunk_delay=0.05, response_delays=[0.0, 0.15]) as server:
+        llm = DeepSeekLLM(api_key="test-key", base_url=server.base_url, coalesce=False)
+
+        async def run():
+            try:
+                return await _collect(_state("我想减肥，有什么建议吗？"))
+            finally:
+                await llm.aclose()
+
+        with _patched(llm=llm, follow_up_llm=llm, semantic_cache=None,
+                      follow_up_mode="concurrent", follow_up_start_chars=len(chunks[0])):
+            events = asyncio.run(run())
+
+    # 后续问题请求在建议流结束之前就已发出，两个请求同时在服务端处理
+    assert server.request_count == 2 and server.max_active == 2
+    assert events[-1]["type"] == "follow_up" and events[-1]["questions"] == ["您每周能运动几次？"]
+    print("✅ 后续问题请求与建议流重叠")
+
+
+def test_disconnect_cancels_concurrent_follow_up():
+    """并发模式下消费方断开时，进行中的后续问题请求在生成器关闭前被取消并等待结束"""
+    print("🧪 测试断开时取消并发的后续问题请求")
+    chunks = [f"第{i}段。" for i in range(10)]
+    # 第一个请求是建议流，第二个是 1s 后才返回的后续问题请求
+    with DeepSeekStubServer(chunks=chunks, chunk_delay=0.05, response_delays=[0.0, 1.0]) as server:
+        llm = DeepSeekLLM(api_key="test-key", base_url=server.base_url, coalesce=False)
+
+        async def run():
+            try:
+                stream = wellbeing_agent.generate_advice_node_stream(_state("我想减肥，有什么建议吗？"))
+                received = 0
+                async for event in stream:
+                    received += event["type"] == "content"
+                    if received == 3:
+                        break
+                await stream.aclose()
+                # 关闭生成器时后续问题任务已经结束，没有遗留的任务
+                return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            finally:
+                await llm.aclose()
+
+        with _patched(llm=llm, follow_up_llm=llm, semantic_cache=None,
+                      follow_up_mode="concurrent", follow_up_start_chars=len(chunks[0])):
+            pending = asyncio.run(run())
+        for _ in range(100):
+            if server.cancelled == 2:
+                break
+            time.sleep(0.01)
+
+    assert pending == []
+    assert server.request_count == 2 and server.cancelled == 2
+    print("✅ 建议流与后续问题请求都已取消")
+
+
+def test_advice_prompt_builder():
+    """提示词按建议类型预先渲染，请求只拼入意图与用户画像；紧凑模式不缩进、不转义中文"""
+    print("🧪 测试预渲染的建议提示词")
+    profile = {"goals": "减重 improvement", "preferences": "none specified"}
+    builder = wellbeing_agent.AdvicePromptBuilder()
+    compact = wellbeing_agent.AdvicePromptBuilder(compact=True)
+
+    prompt = builder.build("exercise", "exercise", profile, fused=True).content
+    assert "User Intent: exercise\n" in prompt and "Advice Type: exercise\n" in prompt
+    assert "Diet Guidelines: Not applicable" in prompt and '"cardio": {' in prompt
+    assert wellbeing_agent.FOLLOW_UP_MARKER in prompt
+    assert wellbeing_agent.FOLLOW_UP_MARKER not in builder.build("exercise", "exercise", profile, fused=False).content
+    # 同一类型的模板只渲染一次，之后的请求复用
+    assert builder._template("exercise", True) is builder._template("exercise", True)
+
+    compact_prompt = compact.build("both", "diet", profile, fused=True).content
+    verbose_prompt = builder.build("both", "diet", profile, fused=True).content
+    assert '"goals":"减重 improvement"' in compact_prompt and "\\u" in verbose_prompt
+    assert len(compact_prompt) < len(verbose_prompt)
+    # 未预先渲染的类型在首次使用时渲染
+    assert "Advice Type: sleep" in builder.build("sleep", "sleep", {}, fused=False).content
+    print(f"✅ 紧凑提示词 {len(compact_prompt)} 字符，缩进版 {len(verbose_prompt)} 字符")
+
+
+if __name__ == "__main__":
+    test_semantic_cache_reuses_advice()
+    test_disconnect_cancels_upstream_stream()
+    test_stream_runs_graph_once()
+    test_upstream_error_is_not_a_disconnect()
+    test_fused_and_separate_follow_up_modes()
+    test_follow_up_failure_keeps_advice()
+    test_concurrent_follow_up_overlaps_advice()
+    test_disconnect_cancels_concurrent_follow_up()
+    test_advice_prompt_builder()
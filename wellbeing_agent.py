@@ -7,14 +7,19 @@ Provides personalized diet and exercise advice based on user intent.
 import os
 import json
 import asyncio
-from typing import Dict, List, Any, TypedDict, Annotated, Optional, AsyncGenerator
+from contextlib import aclosing
+from typing import Dict, List, Any, TypedDict, Annotated, Optional, AsyncGenerator, Tuple
 from dotenv import load_dotenv
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langgraph.graph import StateGraph, END, START
+from langgraph.types import StreamWriter
 
 # Import DeepSeek LLM
 from deepseek_llm import create_deepseek_llm, create_fallback_llm
+from semantic_cache import SemanticAdviceCache
+from provider_router import CircuitBreaker, ProviderRouter
+from follow_up_trailer import FOLLOW_UP_MARKER, TrailerSplitter, parse_follow_up_questions
 
 # Load environment variables
 load_dotenv()
@@ -46,24 +51,59 @@ class WellbeingState(TypedDict):
     advice_result: Annotated[Optional[str], "Generated health advice"]
     follow_up_questions: Annotated[Optional[List], "Follow-up questions for better advice"]
     
-# Initialize the LLM
+# Initialize the LLM providers; requests fail over between them at runtime
+providers = []
 try:
     api_key = os.getenv("DEEPSEEK_API_KEY")
     if api_key and api_key.strip():
-        llm = create_deepseek_llm()
+        providers.append(("deepseek", create_deepseek_llm()))
         print("🤖 Using DeepSeek LLM")
     else:
         raise ValueError("DEEPSEEK_API_KEY is empty or not set")
 except Exception as e:
     print(f"⚠️  DeepSeek LLM initialization failed: {e}")
-    print("🔄 Falling back to OpenAI LLM...")
-    llm = create_fallback_llm()
-    if llm:
-        print("✅ OpenAI fallback LLM initialized")
-    else:
-        print("❌ No LLM available. Please check your API keys.")
-        print("   Set either DEEPSEEK_API_KEY or OPENAI_API_KEY in .env file")
-        raise Exception("No LLM available. Please check your API keys.")
+
+fallback_llm = create_fallback_llm()
+if fallback_llm:
+    providers.append(("openai", fallback_llm))
+    print("✅ OpenAI fallback LLM initialized")
+
+if not providers:
+    print("❌ No LLM available. Please check your API keys.")
+    print("   Set either DEEPSEEK_API_KEY or OPENAI_API_KEY in .env file")
+    raise Exception("No LLM available. Please check your API keys.")
+
+# Circuit breaker per provider: a degraded provider is skipped until half-open probes succeed
+llm = ProviderRouter(providers, breaker_factory=CircuitBreaker.from_env)
+
+# Streaming request counters, reported by /api/metrics
+stream_metrics = {"streams": 0, "disconnects": 0, "follow_ups_skipped": 0}
+
+# Near-duplicate advice cache (disabled unless SEMANTIC_CACHE=true)
+semantic_cache = SemanticAdviceCache.from_env()
+if semantic_cache is not None:
+    print(f"🧠 Semantic advice cache enabled (threshold={semantic_cache.threshold})")
+
+# Follow-up questions: "fused" reads them from a trailer of the advice stream (one LLM call),
+# "separate" asks for them in a second call after the advice, "concurrent" starts that second
+# call while the advice is still streaming
+follow_up_mode = os.getenv("ADVICE_FOLLOW_UP_MODE", "fused").strip().lower()
+if follow_up_mode not in ("fused", "separate", "concurrent"):
+    print(f"⚠️  Unknown ADVICE_FOLLOW_UP_MODE={follow_up_mode!r}, using fused")
+    follow_up_mode = "fused"
+# Concurrent mode: advice characters to wait for before asking; 0 asks from the question and intent alone
+follow_up_start_chars = int(os.getenv("FOLLOW_UP_START_CHARS", "200"))
+
+# The separate follow-up call may use a different (e.g. smaller, faster) DeepSeek model.
+# It shares the advice client's concurrency limiter and the providers' circuit breakers,
+# so follow-ups stay within the same upstream budget and 429 back-off.
+follow_up_llm = llm
+follow_up_model = os.getenv("FOLLOW_UP_MODEL", "").strip()
+if follow_up_model and providers[0][0] == "deepseek":
+    follow_up_llm = llm.with_client(
+        "deepseek", create_deepseek_llm(model=follow_up_model, limiter=providers[0][1].limiter)
+    )
+    print(f"🤔 Follow-up questions use {follow_up_model}")
 
 # Health and wellness knowledge base
 class WellnessKnowledge:
@@ -132,27 +172,41 @@ class WellnessKnowledge:
             ]
         }
 
-def start_node(state: WellbeingState) -> WellbeingState:
+def _discard_event(event: Dict[str, Any]) -> None:
+    """Default stream writer for nodes called outside a streaming graph run."""
+
+async def start_node(state: WellbeingState, writer: StreamWriter = _discard_event) -> WellbeingState:
     """Initialize the wellbeing agent state."""
     print("🌱 Wellbeing Agent starting...")
+    writer({
+        'type': 'step',
+        'step': 'start',
+        'message': '🌱 开始分析您的健康需求...'
+    })
     return {
         **state,
         "current_step": "analyze_intent"
     }
 
-def analyze_intent_node(state: WellbeingState) -> WellbeingState:
+async def analyze_intent_node(state: WellbeingState, writer: StreamWriter = _discard_event) -> WellbeingState:
     """Analyze user's health and wellness intent using new intent router."""
     from intent_analysis_node import analyze_intent_node as new_analyze_intent_node
     
-    # Use the new intent analysis node
-    result = new_analyze_intent_node(state)
+    # Use the new intent analysis node; the router is CPU-bound, keep it off the event loop
+    result = await asyncio.to_thread(new_analyze_intent_node, state)
+    advice_type = result.get("advice_type", "general")
+    writer({
+        'type': 'step',
+        'step': 'analyze_intent',
+        'message': f'📊 分析完成！检测到您需要 {advice_type} 方面的建议'
+    })
     
     # Convert the result to match the expected format
     return {
         **state,
         "current_step": "generate_advice",
         "user_intent": result.get("user_intent", "wellness"),
-        "advice_type": result.get("advice_type", "general"),
+        "advice_type": advice_type,
         "user_profile": {
             "goals": f"{result.get('intent_description', 'general')} improvement",
             "preferences": "none specified",
@@ -161,170 +215,213 @@ def analyze_intent_node(state: WellbeingState) -> WellbeingState:
         }
     }
 
-def generate_advice_node(state: WellbeingState) -> WellbeingState:
-    """Generate personalized health and wellness advice."""
-    user_intent = state.get("user_intent", "wellness")
-    advice_type = state.get("advice_type", "general")
-    user_profile = state.get("user_profile", {})
-    messages = state["messages"]
-    
-    # Get relevant knowledge
-    knowledge = WellnessKnowledge()
+async def generate_advice_node(state: WellbeingState, writer: StreamWriter = _discard_event) -> WellbeingState:
+    """Generate personalized health and wellness advice, streaming each event as it is produced."""
+    advice_chunks = []
+    follow_up_questions = []
+    error = None
+    async with aclosing(generate_advice_node_stream(state)) as advice_stream:
+        async for message_chunk in advice_stream:
+            writer(message_chunk)
+            if message_chunk['type'] == 'content':
+                advice_chunks.append(message_chunk['content'])
+            elif message_chunk['type'] == 'follow_up':
+                follow_up_questions = message_chunk['questions']
+            elif message_chunk['type'] == 'error':
+                error = message_chunk['error']
     
-    if advice_type == "diet" or advice_type == "both":
-        diet_info = knowledge.get_diet_guidelines()
-    else:
-        diet_info = {}
-    
-    if advice_type == "exercise" or advice_type == "both":
-        exercise_info = knowledge.get_exercise_guidelines()
-    else:
-        exercise_info = {}
-    
-    health_tips = knowledge.get_health_tips()
-    
-    # Generate personalized advice
-    advice_prompt = SystemMessage(content=f"""
+    return {
+        **state,
+        "current_step": "end",
+        "advice_result": f"Error generating advice: {error}" if error is not None else "".join(advice_chunks),
+        "follow_up_questions": follow_up_questions
+    }
+
+def _content_event(content: str, advice_type: str, user_intent: str) -> Dict[str, Any]:
+    return {
+        'type': 'content',
+        'content': content,
+        'advice_type': advice_type,
+        'user_intent': user_intent
+    }
+
+FOLLOW_UP_PROMPT = SystemMessage(content="""
+Based on the advice given, generate 2-3 follow-up questions to better understand the user's needs and provide more personalized recommendations.
+
+Questions should be:
+- Specific and actionable
+- Related to their health goals
+- Helpful for future advice customization
+
+Return as a JSON array of questions.
+""")
+
+FOLLOW_UP_TRAILER_PROMPT = f"""
+After the advice, write a line containing only {FOLLOW_UP_MARKER} and then the 2-3 follow-up questions
+as a JSON array of strings, for example:
+{FOLLOW_UP_MARKER}
+["First question?", "Second question?"]
+Do not write anything after the JSON array, and do not repeat the questions in the advice itself.
+"""
+
+DEFAULT_FOLLOW_UP_QUESTIONS = [
+    "How did you find implementing these recommendations?",
+    "What specific challenges are you facing with your health goals?",
+    "Would you like more detailed guidance on any particular aspect?"
+]
+
+class AdvicePromptBuilder:
+    """Advice system prompts rendered once per advice type; each request only splices in its intent and profile."""
+
+    ADVICE_TYPES = ("diet", "exercise", "both", "mental_health", "general")
+
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+        # (advice_type, fused follow-ups) -> text around the per-request intent and profile
+        self._templates: Dict[Tuple[str, bool], Tuple[str, str, str]] = {}
+        for advice_type in self.ADVICE_TYPES:
+            for fused in (True, False):
+                self._template(advice_type, fused)
+
+    @classmethod
+    def from_env(cls) -> "AdvicePromptBuilder":
+        """Read ADVICE_PROMPT_COMPACT."""
+        return cls(compact=os.getenv("ADVICE_PROMPT_COMPACT", "false").lower() in ("1", "true", "yes"))
+
+    def _dumps(self, value: Any) -> str:
+        if self.compact:
+            # No indentation or escaped CJK: far fewer prompt tokens for the same content
+            return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        return json.dumps(value, indent=2)
+
+    def _template(self, advice_type: str, fused: bool) -> Tuple[str, str, str]:
+        key = (advice_type, fused)
+        template = self._templates.get(key)
+        if template is None:
+            # Advice types outside ADVICE_TYPES are rendered on first use
+            template = self._templates[key] = self._render(advice_type, fused)
+        return template
+
+    def _render(self, advice_type: str, fused: bool) -> Tuple[str, str, str]:
+        knowledge = WellnessKnowledge()
+        diet_info = knowledge.get_diet_guidelines() if advice_type in ("diet", "both") else {}
+        exercise_info = knowledge.get_exercise_guidelines() if advice_type in ("exercise", "both") else {}
+        health_tips = knowledge.get_health_tips()
+        
+        head = """
     You are a certified health and wellness coach. Generate personalized, actionable advice based on the user's intent.
     
-    User Intent: {user_intent}
+    User Intent: """
+        middle = f"""
     Advice Type: {advice_type}
-    User Profile: {json.dumps(user_profile, indent=2)}
+    User Profile: """
+        tail = f"""
     
     Available Knowledge:
-    Diet Guidelines: {json.dumps(diet_info, indent=2) if diet_info else "Not applicable"}
-    Exercise Guidelines: {json.dumps(exercise_info, indent=2) if exercise_info else "Not applicable"}
-    Health Tips: {json.dumps(health_tips, indent=2)}
+    Diet Guidelines: {self._dumps(diet_info) if diet_info else "Not applicable"}
+    Exercise Guidelines: {self._dumps(exercise_info) if exercise_info else "Not applicable"}
+    Health Tips: {self._dumps(health_tips)}
     
     Provide:
     1. Specific, actionable recommendations
     2. Evidence-based advice
     3. Practical tips that fit their lifestyle
     4. Safety considerations if applicable
-    5. 2-3 follow-up questions to better understand their needs
+    5. 2-3 follow-up questions to better understand their needs{" (in the trailer below)" if fused else ""}
     
     Format your response as a helpful, encouraging health coach would.
-    """)
-    
-    try:
-        advice_response = llm.invoke([advice_prompt, messages[-1]])
-        
-        # Extract follow-up questions
-        follow_up_prompt = SystemMessage(content="""
-        Based on the advice given, generate 2-3 follow-up questions to better understand the user's needs and provide more personalized recommendations.
-        
-        Questions should be:
-        - Specific and actionable
-        - Related to their health goals
-        - Helpful for future advice customization
-        
-        Return as a JSON array of questions.
-        """)
-        
-        follow_up_response = llm.invoke([follow_up_prompt, advice_response])
-        
-        try:
-            follow_up_questions = json.loads(follow_up_response.content)
-        except json.JSONDecodeError:
-            follow_up_questions = [
-                "How did you find implementing these recommendations?",
-                "What specific challenges are you facing with your health goals?",
-                "Would you like more detailed guidance on any particular aspect?"
-            ]
-        
-        return {
-            **state,
-            "current_step": "end",
-            "advice_result": advice_response.content,
-            "follow_up_questions": follow_up_questions
-        }
-    except Exception as error:
-        return {
-            **state,
-            "current_step": "end",
-            "advice_result": f"Error generating advice: {str(error)}",
-            "follow_up_questions": []
-        }
+    {FOLLOW_UP_TRAILER_PROMPT if fused else ""}
+    """
+        return head, middle, tail
+
+    def build(self, advice_type: str, user_intent: str, user_profile: Dict[str, Any], fused: bool) -> SystemMessage:
+        head, middle, tail = self._template(advice_type, fused)
+        return SystemMessage(content=f"{head}{user_intent}{middle}{self._dumps(user_profile)}{tail}")
+
+advice_prompts = AdvicePromptBuilder.from_env()
+
+async def _generate_follow_up_questions(question: str, user_intent: str, advice: str) -> Optional[List[str]]:
+    """Ask follow_up_llm for questions about the (possibly partial) advice, or about the question alone."""
+    if advice:
+        context = AIMessage(content=advice)
+    else:
+        context = HumanMessage(content=f"User Intent: {user_intent}\nQuestion: {question}")
+    follow_up_response = await follow_up_llm.ainvoke([FOLLOW_UP_PROMPT, context])
+    return parse_follow_up_questions(follow_up_response.content)
 
 async def generate_advice_node_stream(state: WellbeingState) -> AsyncGenerator[Dict[str, Any], None]:
-    """Generate personalized health and wellness advice with streaming output."""
+    """Generate personalized health and wellness advice as content, follow_up and error events."""
     user_intent = state.get("user_intent", "wellness")
     advice_type = state.get("advice_type", "general")
     user_profile = state.get("user_profile", {})
     messages = state["messages"]
     
-    # Get relevant knowledge
-    knowledge = WellnessKnowledge()
-    
-    if advice_type == "diet" or advice_type == "both":
-        diet_info = knowledge.get_diet_guidelines()
-    else:
-        diet_info = {}
-    
-    if advice_type == "exercise" or advice_type == "both":
-        exercise_info = knowledge.get_exercise_guidelines()
-    else:
-        exercise_info = {}
-    
-    health_tips = knowledge.get_health_tips()
+    # Reuse advice for a near-duplicate question, replayed line by line so the client still streams
+    cached = semantic_cache.lookup(messages[-1].content, user_intent) if semantic_cache is not None else None
+    if cached:
+        for line in cached["advice_result"].splitlines(keepends=True):
+            yield _content_event(line, advice_type, user_intent)
+        yield {
+            'type': 'follow_up',
+            'questions': cached["follow_up_questions"],
+            'message': '🤔 为了更好地帮助您，请考虑以下问题：'
+        }
+        return
     
     # Generate personalized advice with streaming
-    advice_prompt = SystemMessage(content=f"""
-    You are a certified health and wellness coach. Generate personalized, actionable advice based on the user's intent.
-    
-    User Intent: {user_intent}
-    Advice Type: {advice_type}
-    User Profile: {json.dumps(user_profile, indent=2)}
-    
-    Available Knowledge:
-    Diet Guidelines: {json.dumps(diet_info, indent=2) if diet_info else "Not applicable"}
-    Exercise Guidelines: {json.dumps(exercise_info, indent=2) if exercise_info else "Not applicable"}
-    Health Tips: {json.dumps(health_tips, indent=2)}
-    
-    Provide:
-    1. Specific, actionable recommendations
-    2. Evidence-based advice
-    3. Practical tips that fit their lifestyle
-    4. Safety considerations if applicable
-    5. 2-3 follow-up questions to better understand their needs
-    
-    Format your response as a helpful, encouraging health coach would.
-    """)
+    advice_prompt = advice_prompts.build(advice_type, user_intent, user_profile, fused=follow_up_mode == "fused")
     
+    question = messages[-1].content
+    follow_up_task = None
     try:
-        # Use streaming LLM call
+        # Use streaming LLM call; closing this generator closes the upstream HTTP stream
         full_response = ""
-        async for chunk in llm.ainvoke_stream([advice_prompt, messages[-1]]):
-            full_response += chunk
-            yield {
-                'type': 'content',
-                'content': chunk,
-                'advice_type': advice_type,
-                'user_intent': user_intent
-            }
-        
-        # Generate follow-up questions
-        follow_up_prompt = SystemMessage(content="""
-        Based on the advice given, generate 2-3 follow-up questions to better understand the user's needs and provide more personalized recommendations.
-        
-        Questions should be:
-        - Specific and actionable
-        - Related to their health goals
-        - Helpful for future advice customization
-        
-        Return as a JSON array of questions.
-        """)
+        # Fused mode: text after the marker is the follow-up trailer and never reaches the client
+        splitter = TrailerSplitter() if follow_up_mode == "fused" else None
+        # Concurrent mode: the follow-up call overlaps the advice stream once enough advice has arrived
+        overlap = follow_up_mode == "concurrent"
+        if overlap and follow_up_start_chars <= 0:
+            follow_up_task = asyncio.create_task(_generate_follow_up_questions(question, user_intent, ""))
+        try:
+            async with aclosing(llm.ainvoke_stream([advice_prompt, messages[-1]])) as advice_stream:
+                async for chunk in advice_stream:
+                    if splitter is not None:
+                        chunk = splitter.feed(chunk)
+                        if not chunk:
+                            continue
+                    full_response += chunk
+                    if overlap and follow_up_task is None and len(full_response) >= follow_up_start_chars:
+                        follow_up_task = asyncio.create_task(
+                            _generate_follow_up_questions(question, user_intent, full_response)
+                        )
+                    yield _content_event(chunk, advice_type, user_intent)
+                if splitter is not None:
+                    chunk = splitter.finish()
+                    if chunk:
+                        full_response += chunk
+                        yield _content_event(chunk, advice_type, user_intent)
+        except (GeneratorExit, asyncio.CancelledError):
+            # Consumer went away mid-advice: the follow-up questions are never generated
+            stream_metrics["follow_ups_skipped"] += 1
+            raise
         
-        follow_up_response = llm.invoke([follow_up_prompt, AIMessage(content=full_response)])
+        if splitter is not None:
+            follow_up_questions = parse_follow_up_questions(splitter.trailer)
+        else:
+            # Generate follow-up questions (already in flight in concurrent mode unless the advice was short)
+            if follow_up_task is None:
+                follow_up_task = asyncio.create_task(_generate_follow_up_questions(question, user_intent, full_response))
+            try:
+                follow_up_questions = await follow_up_task
+            except Exception as error:
+                # The advice has already been streamed: a failed follow-up call only falls back to the default questions
+                print(f"⚠️  Follow-up question generation failed: {error}")
+                follow_up_questions = None
+        if follow_up_questions is None:
+            follow_up_questions = list(DEFAULT_FOLLOW_UP_QUESTIONS)
         
-        try:
-            follow_up_questions = json.loads(follow_up_response.content)
-        except json.JSONDecodeError:
-            follow_up_questions = [
-                "How did you find implementing these recommendations?",
-                "What specific challenges are you facing with your health goals?",
-                "Would you like more detailed guidance on any particular aspect?"
-            ]
+        if semantic_cache is not None:
+            semantic_cache.add(question, user_intent, full_response, follow_up_questions)
         
         # Send follow-up questions
         yield {
@@ -333,25 +430,27 @@ async def generate_advice_node_stream(state: WellbeingState) -> AsyncGenerator[D
             'message': '🤔 为了更好地帮助您，请考虑以下问题：'
         }
         
-        # Update state
-        state.update({
-            "current_step": "end",
-            "advice_result": full_response,
-            "follow_up_questions": follow_up_questions
-        })
-        
     except Exception as error:
         yield {
             'type': 'error',
+            'error': str(error),
             'message': f'生成建议时出现错误: {str(error)}'
         }
-        state.update({
-            "current_step": "end",
-            "advice_result": f"Error generating advice: {str(error)}",
-            "follow_up_questions": []
-        })
+    finally:
+        # Advice failed or the consumer left: stop a follow-up call that is still in flight
+        # and wait for it, so it finishes before this generator closes and its error is retrieved
+        if follow_up_task is not None:
+            follow_up_task.cancel()
+            try:
+                await follow_up_task
+            except asyncio.CancelledError:
+                # Propagate only a cancellation aimed at this task, not the one requested above
+                if asyncio.current_task().cancelling():
+                    raise
+            except Exception:
+                pass
 
-def end_node(state: WellbeingState) -> WellbeingState:
+async def end_node(state: WellbeingState, writer: StreamWriter = _discard_event) -> WellbeingState:
     """Finalize the wellbeing agent processing."""
     print("✅ Wellbeing Agent finished processing")
     
@@ -365,6 +464,11 @@ def end_node(state: WellbeingState) -> WellbeingState:
     else:
         print("🌱 Provided general wellness advice")
     
+    writer({
+        'type': 'summary',
+        'advice_type': advice_type,
+        'message': f'✅ {advice_type} 建议生成完成！'
+    })
     return state
 
 # Create the graph
@@ -406,63 +510,32 @@ async def run_wellbeing_agent(user_input: str) -> Dict[str, Any]:
     return result
 
 async def run_wellbeing_agent_stream(user_input: str):
-    """Run the wellbeing agent with streaming output and LangSmith tracing."""
-    print(f"\n👤 User: {user_input}")
-    
-    # Start LangSmith tracing in background
-    import asyncio
-    tracing_task = asyncio.create_task(
-        app.ainvoke({
-            "messages": [HumanMessage(content=user_input)]
-        })
-    )
-    
-    # Initialize state for immediate streaming
-    state = {
-        "messages": [HumanMessage(content=user_input)],
-        "current_step": "start"
-    }
-    
+    """Run the wellbeing agent graph once, streaming the step, content, follow_up and summary events its nodes emit.
 
-    # Start the workflow - immediately yield start message
-    yield {
-        'type': 'step',
-        'step': 'start',
-        'message': '🌱 开始分析您的健康需求...'
-    }
-    
-    # Analyze intent - run synchronously for immediate response
-    state = analyze_intent_node(state)
-    advice_type = state.get("advice_type", "general")
-    yield {
-        'type': 'step',
-        'step': 'analyze_intent',
-        'message': f'📊 分析完成！检测到您需要 {advice_type} 方面的建议'
-    }
-    
-    # Generate advice with streaming - use the original streaming function
-    async for message_chunk in generate_advice_node_stream(state):
-        if message_chunk['type'] == 'content':
-            yield message_chunk
-            await asyncio.sleep(0.02)  # Small delay for streaming effect
-        elif message_chunk['type'] == 'follow_up':
-            yield message_chunk
-            break  # Stop streaming after follow-up questions
-        elif message_chunk['type'] == 'error':
-            yield message_chunk
-            break  # Stop streaming on error
-    # Final summary
-    yield {
-        'type': 'summary',
-        'advice_type': state.get("advice_type", "general"),
-        'message': f'✅ {state.get("advice_type", "general")} 建议生成完成！'
-    }
+    The single graph execution is also the LangSmith trace of the request.
+    """
+    print(f"\n👤 User: {user_input}")
     
-    # Wait for tracing to complete (this won't block the stream)
+    stream_metrics["streams"] += 1
+    # Consumers stop reading at an error event; closing the stream after one is a normal end, not a disconnect
+    failed = False
     try:
-        await tracing_task
-    except Exception as e:
-        print(f"LangSmith tracing error: {e}")
+        graph_stream = app.astream(
+            {"messages": [HumanMessage(content=user_input)]},
+            stream_mode="custom"
+        )
+        async with aclosing(graph_stream) as events:
+            async for message_chunk in events:
+                failed = message_chunk['type'] == 'error'
+                yield message_chunk
+                if message_chunk['type'] == 'content':
+                    await asyncio.sleep(0.02)  # Small delay for streaming effect
+    except (GeneratorExit, asyncio.CancelledError):
+        # The client disconnected: closing the graph stream cancels the running node and its upstream LLM stream
+        if not failed:
+            stream_metrics["disconnects"] += 1
+            print("🔌 Client disconnected, upstream generation cancelled")
+        raise
 
 async def interactive_mode():
     """Run the wellbeing agent in interactive mode."""